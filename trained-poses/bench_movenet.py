@@ -0,0 +1,252 @@
+"""
+Per-stage microbenchmark of movenet.Movenet
+
+Usage:
+    python bench_movenet.py [--per-pose 2] [--repeats 50]
+                            [--output bench_results/movenet_<commit>.json]
+                            [--compare bench_results/movenet_<old>.json]
+
+Movenet.detect() is timed stage by stage over a fixed sample of
+yoga_poses/test images (the first --per-pose images of every pose, sorted
+by name) and over synthetic 480p, 720p and 1080p frames:
+
+    crop_and_resize   Movenet._crop_and_resize and the uint8 conversion
+    set_tensor        copying the crop into the interpreter
+    invoke            the MoveNet forward pass
+    get_tensor        reading the keypoints back
+    remap             Movenet._remap_keypoints, crop to image coordinates
+    crop_region       Movenet._determine_crop_region for the next frame
+    person            data.person_from_keypoints_with_scores
+    detect            the whole Movenet.detect() call
+
+Every stage reports p50/p95/p99 microseconds and the bytes it allocates per
+call, measured with tracemalloc in a separate pass so the tracing does not
+skew the timings. Memory allocated inside the TFLite runtime is not visible
+to tracemalloc. The results are written as JSON named after the git commit;
+--compare prints the p50 change of every stage against an earlier run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from data import person_from_keypoints_with_scores
+
+TEST_FOLDER = 'yoga_poses/test'
+RESULTS_FOLDER = 'bench_results'
+SYNTHETIC_SIZES = {'480p': (480, 854), '720p': (720, 1280), '1080p': (1080, 1920)}
+STAGES = ['crop_and_resize', 'set_tensor', 'invoke', 'get_tensor', 'remap',
+          'crop_region', 'person', 'detect']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def git_commit():
+    """Short hash of HEAD, with '-dirty' for local changes, or None"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--', '.'],
+                                        stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + '-dirty' if dirty else commit
+
+
+def sample_test_images(folder=TEST_FOLDER, per_pose=2):
+    """The first per_pose images of every pose folder, as RGB arrays"""
+    images = []
+    if not os.path.isdir(folder):
+        return images
+    for pose in sorted(os.listdir(folder)):
+        pose_dir = os.path.join(folder, pose)
+        if not os.path.isdir(pose_dir):
+            continue
+        names = sorted(n for n in os.listdir(pose_dir)
+                       if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:per_pose]:
+            image = cv2.imread(os.path.join(pose_dir, name))
+            if image is not None:
+                images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return images
+
+
+def synthetic_frames(count=4, seed=0):
+    """Reproducible random RGB frames of every SYNTHETIC_SIZES resolution"""
+    rng = np.random.default_rng(seed)
+    return {name: [rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+                   for _ in range(count)]
+            for name, (height, width) in SYNTHETIC_SIZES.items()}
+
+
+def run_stages(movenet, image, clock):
+    """One detect() of a still image, split into its stages.
+
+    Mirrors Movenet.detect() and Movenet._run_detector(). clock() is called
+    before the first and after every stage.
+    """
+    interpreter = movenet._interpreter
+    image_height, image_width, _ = image.shape
+    crop_region = movenet.init_crop_region(image_height, image_width)
+    clock(None)
+    input_image = movenet._crop_and_resize(
+        image, crop_region, crop_size=(movenet._input_height, movenet._input_width))
+    input_image = input_image.astype(dtype=np.uint8)
+    clock('crop_and_resize')
+    interpreter.set_tensor(movenet._input_index, np.expand_dims(input_image, axis=0))
+    clock('set_tensor')
+    interpreter.invoke()
+    clock('invoke')
+    keypoints_with_scores = interpreter.get_tensor(movenet._output_index)
+    clock('get_tensor')
+    keypoints_with_scores = movenet._remap_keypoints(
+        np.squeeze(keypoints_with_scores), crop_region)
+    clock('remap')
+    movenet._determine_crop_region(keypoints_with_scores, image_height, image_width)
+    clock('crop_region')
+    person_from_keypoints_with_scores(keypoints_with_scores, image_height, image_width)
+    clock('person')
+    movenet.detect(image, reset_crop_region=True)
+    clock('detect')
+
+
+class StageTimer(object):
+    """clock() for run_stages() collecting the seconds of every stage"""
+
+    def __init__(self):
+        self.timings = {stage: [] for stage in STAGES}
+        self._last = None
+
+    def __call__(self, stage):
+        now = time.perf_counter()
+        if stage is not None:
+            self.timings[stage].append(now - self._last)
+        # Exclude the clock's own bookkeeping from the next stage
+        self._last = time.perf_counter()
+
+
+class AllocationTracer(object):
+    """clock() for run_stages() recording the peak traced bytes of every stage"""
+
+    def __init__(self):
+        self.allocations = {stage: [] for stage in STAGES}
+        self._start = 0
+
+    def __call__(self, stage):
+        if stage is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            self.allocations[stage].append(peak - self._start)
+        tracemalloc.reset_peak()
+        self._start = tracemalloc.get_traced_memory()[0]
+
+
+def benchmark(movenet, images, repeats=50, warmup=3):
+    """Per-stage statistics of repeated detections over a set of images"""
+    for image in images[:warmup]:
+        run_stages(movenet, image, lambda stage: None)
+
+    timer = StageTimer()
+    for _ in range(repeats):
+        for image in images:
+            run_stages(movenet, image, timer)
+
+    tracer = AllocationTracer()
+    tracemalloc.start()
+    try:
+        for image in images:
+            run_stages(movenet, image, tracer)
+    finally:
+        tracemalloc.stop()
+
+    results = {}
+    for stage in STAGES:
+        micros = np.array(timer.timings[stage]) * 1e6
+        results[stage] = {
+            'calls': len(micros),
+            'mean_us': float(micros.mean()),
+            'p50_us': float(np.percentile(micros, 50)),
+            'p95_us': float(np.percentile(micros, 95)),
+            'p99_us': float(np.percentile(micros, 99)),
+            'alloc_bytes': int(np.median(tracer.allocations[stage])),
+        }
+    return results
+
+
+def print_results(name, results, baseline=None):
+    print(f"{name}:")
+    for stage, stats in results.items():
+        line = (f"  {stage:>15}: p50 {stats['p50_us']:9.1f}us  "
+                f"p95 {stats['p95_us']:9.1f}us  p99 {stats['p99_us']:9.1f}us  "
+                f"{stats['alloc_bytes'] / 1024:8.1f} KiB/call")
+        old = (baseline or {}).get(name, {}).get(stage)
+        if old and old['p50_us'] > 0:
+            line += f"  ({100 * (stats['p50_us'] / old['p50_us'] - 1):+.1f}% p50)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the stages of Movenet.detect()')
+    parser.add_argument('--model', default='movenet_thunder')
+    parser.add_argument('--per-pose', type=int, default=2,
+                        help='test images sampled from every pose folder')
+    parser.add_argument('--synthetic', type=int, default=4,
+                        help='synthetic frames of every resolution')
+    parser.add_argument('--repeats', type=int, default=50,
+                        help='passes over every image set')
+    parser.add_argument('--output', default=None,
+                        help=f'JSON file (default: {RESULTS_FOLDER}/movenet_<commit>.json)')
+    parser.add_argument('--compare', default=None,
+                        help='earlier JSON result to compare the p50 against')
+    args = parser.parse_args(argv)
+
+    from live_keypoints import load_movenet
+
+    movenet = load_movenet(args.model)
+    image_sets = {}
+    test_images = sample_test_images(per_pose=args.per_pose)
+    if test_images:
+        image_sets['test_images'] = test_images
+    else:
+        print(f"No images in {TEST_FOLDER}, benchmarking synthetic frames only")
+    image_sets.update(synthetic_frames(args.synthetic))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': args.model,
+        'repeats': args.repeats,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'inputs': {name: {'images': len(images),
+                          'sizes': sorted({f'{image.shape[1]}x{image.shape[0]}'
+                                           for image in images})}
+                   for name, images in image_sets.items()},
+        'results': {},
+    }
+    for name, images in image_sets.items():
+        report['results'][name] = benchmark(movenet, images, args.repeats)
+        print_results(name, report['results'][name], baseline)
+
+    output = args.output or os.path.join(RESULTS_FOLDER, f"movenet_{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
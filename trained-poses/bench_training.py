@@ -0,0 +1,310 @@
+"""
+Benchmark of the training pipeline at growing dataset sizes
+
+Usage:
+    python bench_training.py [--sizes 1000 10000 100000 1000000]
+                             [--config training_config.json] [--batch-size 16]
+                             [--output bench_results/training_<commit>.json]
+                             [--memory-limit-mb 64 --max-growth-mb 50]
+
+For every size a synthetic keypoint CSV with that many rows is written,
+resampled from train_data.csv with a little jitter (random keypoints when it
+is missing), and the stages of pose_training.py run on it:
+
+    load_csv          the CSV to float keypoints and registry labels
+    preprocess_data   the landmark embedding
+    fit               one epoch of model.fit
+    evaluate          model.evaluate over the same rows
+
+Each size runs in a fresh process, so memory left over from a smaller size
+does not hide the growth. Every stage reports its seconds, rows per second
+and the peak resident memory of the process while it ran (sampled every
+10ms from /proc, or the process high-water mark where that is missing). A
+stage that fails, e.g. out of memory, is reported with its error and the
+remaining stages of that size are skipped.
+
+With --memory-limit-mb the streamed stages of pose_training.py run instead
+(data.memory_limit_mb in the config): embed_csv reads and embeds the CSV in
+blocks into .npy files, fit and evaluate read their batches from them.
+--max-growth-mb then checks that the peak RSS of every stage at the largest
+size is at most that much above the smallest size and exits with status 1
+otherwise, e.g. 1k to 100k rows:
+
+    python bench_training.py --sizes 1000 100000 --memory-limit-mb 64 --max-growth-mb 50
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from bench_movenet import RESULTS_FOLDER, git_commit
+from live_keypoints import keypoint_header
+from pose_config import ClassRegistry, DEFAULT_CONFIG_PATH, chunk_rows, load_config
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+STAGES = ['load_csv', 'preprocess_data', 'fit', 'evaluate']
+STREAMED_STAGES = ['embed_csv', 'fit', 'evaluate']
+CHUNK_ROWS = 100000
+
+
+def current_rss():
+    """Resident bytes of this process, None where /proc is missing"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def max_rss():
+    """High-water mark of the resident bytes of this process"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssMonitor(object):
+    """Samples the resident memory in a thread while a stage runs"""
+
+    def __init__(self, interval=0.01):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.start_bytes = 0
+        self.peak_bytes = 0
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is None:
+            rss = max_rss()
+        self.peak_bytes = max(self.peak_bytes, rss)
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_bytes = self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def write_synthetic_csv(path, rows, registry, source_csv=None, seed=0):
+    """Writes a keypoint CSV of `rows` rows in the layout of train_data.csv"""
+    rng = np.random.default_rng(seed)
+    columns = keypoint_header()
+    if source_csv and os.path.exists(source_csv):
+        source = pd.read_csv(source_csv)
+        keypoints = source[columns[1:-2]].to_numpy(dtype=np.float64)
+        names = source['class_name'].str.lower().to_numpy()
+    else:
+        keypoints = rng.uniform(0, 256, (len(registry), 51))
+        keypoints[:, 2::3] = rng.uniform(0, 1, (len(registry), 17))
+        names = np.array(registry.names)
+
+    written = 0
+    with open(path, 'w', newline='') as f:
+        while written < rows:
+            count = min(CHUNK_ROWS, rows - written)
+            picks = rng.integers(0, len(keypoints), count)
+            chunk = keypoints[picks].copy()
+            # Jitter the coordinates so the rows are not exact duplicates
+            chunk[:, 0::3] += rng.normal(0, 2, (count, 17))
+            chunk[:, 1::3] += rng.normal(0, 2, (count, 17))
+            frame = pd.DataFrame(chunk, columns=columns[1:-2])
+            frame.insert(0, 'filename', [f"synthetic/{written + i}.jpg" for i in range(count)])
+            frame['class_no'] = [registry.index(name) for name in names[picks]]
+            frame['class_name'] = names[picks]
+            frame.to_csv(f, header=written == 0, index=False)
+            written += count
+
+
+def run_size(csv_path, rows, config, batch_size):
+    """Runs the pipeline stages on one CSV, in a worker process"""
+    if config['data'].get('memory_limit_mb'):
+        return run_size_streamed(csv_path, rows, config, batch_size)
+    from tensorflow import keras
+    from pose_training import build_model, load_csv, preprocess_data
+
+    registry = ClassRegistry.from_config(config)
+    state = {}
+
+    def load():
+        state['X'], state['y'], _ = load_csv(csv_path, registry)
+
+    def embed():
+        state['X'] = preprocess_data(state['X'])
+        state['y'] = keras.utils.to_categorical(state['y'], len(registry))
+
+    def fit():
+        state['model'] = build_model(len(registry), **config['model'])
+        state['model'].fit(state['X'], state['y'], epochs=1,
+                           batch_size=batch_size, verbose=0)
+
+    def evaluate():
+        state['model'].evaluate(state['X'], state['y'], batch_size=batch_size, verbose=0)
+
+    return measure_stages(zip(STAGES, [load, embed, fit, evaluate]), rows)
+
+
+def run_size_streamed(csv_path, rows, config, batch_size):
+    """The streamed stages on one CSV, in a worker process"""
+    from pose_training import (EmbeddedBatches, NpyRows, build_model,
+                               split_indices, stream_embed_csv)
+
+    registry = ClassRegistry.from_config(config)
+    folder = os.path.splitext(csv_path)[0]
+    state = {}
+
+    def embed():
+        stream_embed_csv(csv_path, registry, folder, chunk_rows(config))
+        indices, _ = split_indices(rows, 0.0)
+        state['batches'] = EmbeddedBatches(
+            NpyRows(os.path.join(folder, 'X.npy')), NpyRows(os.path.join(folder, 'y.npy')),
+            len(registry), batch_size, indices, shuffle=True)
+
+    def fit():
+        state['model'] = build_model(len(registry), **config['model'])
+        state['model'].fit(state['batches'], epochs=1, verbose=0)
+
+    def evaluate():
+        state['model'].evaluate(state['batches'], verbose=0)
+
+    return measure_stages(zip(STREAMED_STAGES, [embed, fit, evaluate]), rows)
+
+
+def measure_stages(stages, rows):
+    """Runs (name, function) stages in order, stopping at the first error"""
+    results = {}
+    for stage, function in stages:
+        start = time.perf_counter()
+        try:
+            with RssMonitor() as rss:
+                function()
+        except Exception as e:
+            results[stage] = {'error': f"{type(e).__name__}: {e}"}
+            break
+        seconds = time.perf_counter() - start
+        results[stage] = {
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds else 0.0,
+            'peak_rss_mb': rss.peak_bytes / 2**20,
+            'rss_growth_mb': (rss.peak_bytes - rss.start_bytes) / 2**20,
+        }
+    return results
+
+
+def measure_size(folder, rows, config, batch_size):
+    """Writes a CSV of `rows` rows into folder and runs the stages on it in a fresh process"""
+    registry = ClassRegistry.from_config(config)
+    csv_path = os.path.join(folder, f"synthetic_{rows}.csv")
+    write_synthetic_csv(csv_path, rows, registry, config['data']['train_csv'])
+    try:
+        with ProcessPoolExecutor(max_workers=1,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = executor.submit(run_size, csv_path, rows, config, batch_size).result()
+    except BrokenProcessPool as e:
+        # The worker was killed, usually by the out-of-memory killer
+        results = {'worker': {'error': f"{type(e).__name__}: {e}"}}
+    finally:
+        os.remove(csv_path)
+        shutil.rmtree(os.path.splitext(csv_path)[0], ignore_errors=True)
+    return results
+
+
+def print_results(rows, results):
+    print(f"{rows} rows:")
+    for stage, stats in results.items():
+        if 'error' in stats:
+            print(f"  {stage:>15}: failed, {stats['error']}")
+            continue
+        print(f"  {stage:>15}: {stats['seconds']:8.2f}s  "
+              f"{stats['rows_per_second']:12.0f} rows/s  "
+              f"peak RSS {stats['peak_rss_mb']:8.1f} MB "
+              f"(+{stats['rss_growth_mb']:.1f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the training pipeline stages')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='synthetic dataset sizes in keypoint rows')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='fit and evaluate batch size (default: from the config)')
+    parser.add_argument('--output', default=None,
+                        help=f'JSON file (default: {RESULTS_FOLDER}/training_<commit>.json)')
+    parser.add_argument('--memory-limit-mb', type=float, default=None,
+                        help='benchmark the streamed stages with this memory limit')
+    parser.add_argument('--max-growth-mb', type=float, default=None,
+                        help='fail when a stage peaks this much higher at the '
+                             'largest size than at the smallest')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    config['data']['memory_limit_mb'] = args.memory_limit_mb
+    batch_size = args.batch_size or config['training']['batch_size']
+
+    commit = git_commit()
+    report = {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'batch_size': batch_size, 'model': config['model'],
+              'memory_limit_mb': args.memory_limit_mb, 'results': {}}
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in sorted(args.sizes):
+            results = measure_size(folder, rows, config, batch_size)
+            report['results'][str(rows)] = results
+            print_results(rows, results)
+
+    output = args.output or os.path.join(RESULTS_FOLDER, f"training_{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.max_growth_mb is not None:
+        failed = check_growth(report['results'], args.max_growth_mb)
+        if failed:
+            raise SystemExit(1)
+
+
+def check_growth(results, max_growth_mb):
+    """Stages whose peak RSS grew more than max_growth_mb across the sizes"""
+    sizes = sorted(results, key=int)
+    smallest, largest = results[sizes[0]], results[sizes[-1]]
+    failed = []
+    for stage, stats in smallest.items():
+        peak = largest.get(stage, {}).get('peak_rss_mb')
+        if 'error' in stats or peak is None:
+            print(f"{stage}: did not run at every size")
+            failed.append(stage)
+            continue
+        growth = peak - stats['peak_rss_mb']
+        ok = growth <= max_growth_mb
+        print(f"{stage}: peak RSS {stats['peak_rss_mb']:.1f} MB at {sizes[0]} rows, "
+              f"{peak:.1f} MB at {sizes[-1]} rows ({growth:+.1f} MB) "
+              f"{'ok' if ok else 'FAILED'}")
+        if not ok:
+            failed.append(stage)
+    return failed
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""
+Threaded webcam capture shared by the data collection scripts
+
+The collectors used to read, annotate, show and write every frame (plus its
+flipped copy) in one loop, sleeping between samples. JPEG encoding and disk
+writes stalled the preview and the camera buffer filled with stale frames.
+CaptureEngine splits this up:
+
+    grabber thread -> bounded frame queue -> UI loop -> writer pool
+
+The grabber keeps only the newest frames, dropping the oldest when the UI
+loop falls behind, and the writer pool encodes and writes samples in the
+background. Both count what they drop so a session can report it.
+
+With a live_keypoints.KeypointExtractor an analyzer thread runs MoveNet
+between the grabber and the UI loop, samples are then also (or only) written
+as keypoint rows. Keypoints also allow rejecting frames that are near
+duplicates of samples already collected for the pose.
+
+    engine = CaptureEngine(cap)
+    collected = capture_samples(engine, pose_dir, 'tree_train', 50,
+                                'Tree Pose - TRAIN')
+"""
+
+import collections
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+WINDOW_NAME = 'Data Collection'
+
+
+def next_sample_index(pose_dir):
+    """Index of the next sample, every sample is saved with a flipped copy"""
+    if not os.path.exists(pose_dir):
+        return 0
+    return len([f for f in os.listdir(pose_dir) if f.endswith('.jpg')]) // 2
+
+
+class CaptureEngine(object):
+    """Grabs camera frames and writes samples on background threads"""
+
+    def __init__(self, cap, queue_size=2, writers=2, max_pending_writes=16,
+                 extractor=None, save_images=True, min_distance=0.0,
+                 saturation=0.95):
+        """
+        Args:
+          cap: An opened cv2.VideoCapture.
+          queue_size: Frames buffered between the grabber and the UI loop.
+          writers: Threads encoding and writing images.
+          max_pending_writes: Samples waiting for a writer before new ones are
+            refused, bounds the memory held by unwritten frames.
+          extractor: Optional live_keypoints.KeypointExtractor, detects the
+            pose of every frame and records the keypoints of saved samples.
+          save_images: Whether samples are written as JPEG images.
+          min_distance: Minimum pose embedding distance of a new sample to
+            the samples of the pose collected so far, 0 keeps duplicates.
+          saturation: Stop once this fraction of the recent candidates were
+            duplicates, see live_keypoints.DiversityIndex.
+        """
+        if not save_images and extractor is None:
+            raise ValueError("Nothing to save, enable images or live keypoints")
+        if min_distance and extractor is None:
+            raise ValueError("Duplicate rejection needs live keypoints")
+        self.min_distance = min_distance
+        self.saturation = saturation
+        self._cap = cap
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._analyzed = queue.Queue(maxsize=queue_size)
+        self.extractor = extractor
+        self._save_images = save_images
+        self._writers = writers
+        self._write_slots = threading.BoundedSemaphore(max_pending_writes)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._grabber = None
+        self._analyzer = None
+        self._pool = None
+        self.camera_failed = False
+        self.stats = {}
+
+    def start(self):
+        self.stats = {'grabbed': 0, 'dropped': 0, 'written': 0,
+                      'write_refused': 0, 'write_errors': 0,
+                      'keypoint_rows': 0}
+        self.camera_failed = False
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self._writers)
+        self._grabber = threading.Thread(target=self._grab, daemon=True)
+        self._grabber.start()
+        if self.extractor is not None:
+            self.extractor.reset()
+            self._analyzer = threading.Thread(target=self._analyze, daemon=True)
+            self._analyzer.start()
+        return self
+
+    def stop(self):
+        """Stops grabbing and waits for the pending writes"""
+        self._stop.set()
+        for thread in (self._grabber, self._analyzer):
+            if thread is not None:
+                thread.join()
+        self._grabber = self._analyzer = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        for frames in (self._frames, self._analyzed):
+            while not frames.empty():
+                frames.get_nowait()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _grab(self):
+        while not self._stop.is_set():
+            ret, frame = self._cap.read()
+            if not ret:
+                self.camera_failed = True
+                break
+            self._count('grabbed')
+            self._put_newest(self._frames, (frame, None))
+
+    def _put_newest(self, frames, item):
+        try:
+            frames.put_nowait(item)
+        except queue.Full:
+            # Keep the preview live, the oldest frame is the stale one
+            try:
+                frames.get_nowait()
+                self._count('dropped')
+            except queue.Empty:
+                pass
+            frames.put_nowait(item)
+
+    def _analyze(self):
+        while not self._stop.is_set():
+            try:
+                frame, _ = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                if self.camera_failed:
+                    break
+                continue
+            self._put_newest(self._analyzed, (frame, self.extractor.detect(frame)))
+
+    def read(self, timeout=1.0):
+        """Newest (frame, person) pair, or None once the camera stopped.
+
+        person is the detected Person when the engine has an extractor,
+        otherwise None.
+        """
+        frames = self._frames if self.extractor is None else self._analyzed
+        while True:
+            try:
+                return frames.get(timeout=timeout)
+            except queue.Empty:
+                if self.camera_failed or self._grabber is None:
+                    return None
+
+    def save(self, frame, pose_dir, stem, person=None, flip=True):
+        """Queues a sample (and its mirror image) for writing.
+
+        The sample is written as images and, with an extractor, as keypoint
+        rows of the person detected in it to the CSV of its split and pose,
+        taken from the yoga_poses/<split>/<pose> directory.
+
+        Returns False if the writers are too far behind, the sample is then
+        not saved and should not be counted.
+        """
+        if not self._write_slots.acquire(blocking=False):
+            self._count('write_refused')
+            return False
+        self._pool.submit(self._write, frame, pose_dir, stem, person, flip)
+        return True
+
+    def _write(self, frame, pose_dir, stem, person, flip):
+        try:
+            if person is not None and self.extractor is not None:
+                split = os.path.basename(os.path.dirname(os.path.normpath(pose_dir)))
+                pose = os.path.basename(os.path.normpath(pose_dir))
+                self._count('keypoint_rows', self.extractor.append(
+                    split, pose, stem, person, frame.shape[1], mirror=flip))
+            if not self._save_images:
+                return
+            os.makedirs(pose_dir, exist_ok=True)
+            images = [(f"{stem}.jpg", frame)]
+            if flip:
+                images.append((f"{stem}_flipped.jpg", cv2.flip(frame, 1)))
+            for filename, image in images:
+                if cv2.imwrite(os.path.join(pose_dir, filename), image):
+                    self._count('written')
+                else:
+                    self._count('write_errors')
+        finally:
+            self._write_slots.release()
+
+    def report(self):
+        stats = self.stats
+        return (f"{stats['grabbed']} frames grabbed, {stats['dropped']} dropped, "
+                f"{stats['written']} images written, "
+                f"{stats['keypoint_rows']} keypoint rows, "
+                f"{stats['write_refused']} samples refused while writers were busy, "
+                f"{stats['write_errors']} write errors")
+
+
+def add_capture_arguments(parser):
+    """Command line options of the collectors for the engine"""
+    parser.add_argument('--live-keypoints', action='store_true',
+                        help='run MoveNet while collecting and append the keypoints '
+                             'to the training CSVs')
+    parser.add_argument('--no-images', action='store_true',
+                        help='only record keypoints, requires --live-keypoints')
+    parser.add_argument('--min-distance', type=float, default=0.0,
+                        help='reject samples closer than this pose embedding distance '
+                             'to a collected one (e.g. 0.05), requires --live-keypoints')
+    parser.add_argument('--saturation', type=float, default=0.95,
+                        help='stop a capture once this fraction of recent frames '
+                             'were duplicates')
+    from live_keypoints import add_quality_arguments
+    add_quality_arguments(parser)
+
+
+def capture_options(args):
+    """CaptureEngine keyword arguments for the parsed command line"""
+    if (args.no_images or args.min_distance) and not args.live_keypoints:
+        raise ValueError("--no-images and --min-distance require --live-keypoints")
+    extractor = None
+    if args.live_keypoints:
+        from live_keypoints import KeypointExtractor, quality_gate
+        extractor = KeypointExtractor(gate=quality_gate(args))
+    return {'extractor': extractor, 'save_images': not args.no_images,
+            'min_distance': args.min_distance, 'saturation': args.saturation}
+
+
+def draw_overlay(frame, lines, person=None, weak_joints=()):
+    """Draws (text, color) lines at the top left of a copy of frame.
+
+    With a person, its joints are marked green, or red when listed in
+    weak_joints.
+    """
+    display_frame = frame.copy()
+    if person is not None:
+        for keypoint in person.keypoints:
+            color = (0, 0, 255) if keypoint.body_part in weak_joints else (0, 255, 0)
+            cv2.circle(display_frame, tuple(keypoint.coordinate), 4, color, -1)
+    for i, (text, color) in enumerate(lines):
+        cv2.putText(display_frame, text, (10, 30 + 30 * i),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+    return display_frame
+
+
+def capture_samples(engine, pose_dir, prefix, num_samples, title,
+                    interval=0.2, auto_start=False, window_name=WINDOW_NAME):
+    """Previews the camera and saves up to num_samples samples.
+
+    Samples are spaced by interval seconds instead of sleeping, so the
+    preview keeps running between them. SPACE toggles capturing unless
+    auto_start is set, 'q' stops early. With live keypoints, frames refused
+    by the extractor's quality gate are not saved, the reason is shown in
+    the preview, and the new rows are merged into the combined CSV of the
+    split afterwards.
+    With a min_distance on the engine, near duplicates of the samples of the
+    pose (including earlier sessions) are skipped and the capture ends early
+    once the pose stops varying.
+
+    Returns:
+      The number of samples saved, or None if the camera failed.
+    """
+    extractor = engine.extractor
+    split = os.path.basename(os.path.dirname(os.path.normpath(pose_dir)))
+    pose = os.path.basename(os.path.normpath(pose_dir))
+    start_idx = next_sample_index(pose_dir)
+    if extractor is not None:
+        start_idx = max(start_idx, extractor.next_sample_index(split, pose))
+    index = None
+    if engine.min_distance:
+        from live_keypoints import DiversityIndex, load_pose_keypoints
+        index = DiversityIndex(engine.min_distance, engine.saturation)
+        index.add(load_pose_keypoints(split, pose), mirror=False)
+    collected = 0
+    capturing = auto_start
+    last_capture = 0.0
+    duplicate = False
+    refused = collections.Counter()
+
+    with engine:
+        while collected < num_samples:
+            sample = engine.read()
+            if sample is None:
+                print("Error reading from camera")
+                return None
+            frame, person = sample
+
+            now = time.monotonic()
+            rejection = None
+            if person is not None:
+                rejection = extractor.check(person, frame)
+            if capturing and rejection is not None:
+                refused[rejection[0]] += 1
+            if capturing and rejection is None and now - last_capture >= interval:
+                # Duplicates count as candidates too, so saturation is
+                # measured at the capture interval, not the camera rate
+                last_capture = now
+                keypoints = None
+                if index is not None:
+                    from numpy_classifier import person_to_keypoints
+                    keypoints = person_to_keypoints(person)
+                    duplicate = not index.is_novel(keypoints)
+                stem = f"{prefix}_{start_idx + collected:04d}"
+                if not duplicate and engine.save(frame, pose_dir, stem, person):
+                    collected += 1
+                    if index is not None:
+                        index.add(keypoints, frame.shape[1])
+                if index is not None and index.saturated:
+                    print(f"\nPose variety saturated after {collected} samples")
+                    break
+
+            if capturing and rejection is not None:
+                status = (rejection[1], (0, 165, 255))
+            elif capturing and duplicate:
+                status = ("Too similar to a saved sample - vary the pose", (0, 165, 255))
+            elif capturing:
+                status = ("CAPTURING - Hold the pose!", (0, 0, 255))
+            else:
+                status = ("Press SPACE to start, 'q' to quit", (255, 0, 0))
+            weak_joints = extractor.gate.weak_joints(person) if person is not None else ()
+            cv2.imshow(window_name, draw_overlay(frame, [
+                (title, (0, 255, 0)),
+                (f"Collected: {collected}/{num_samples}", (0, 255, 0)),
+                status,
+            ], person, weak_joints))
+
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord(' ') and not auto_start:
+                capturing = not capturing
+            elif key == ord('q'):
+                print(f"\nStopped early at {collected} samples")
+                break
+
+    print(f"  {engine.report()}")
+    if refused:
+        print("  Frames refused by the quality gate: " +
+              ', '.join(f"{count} {reason}" for reason, count in refused.most_common()))
+    if index is not None:
+        print(f"  {index.rejected} near duplicates skipped, "
+              f"{len(index)} {pose} poses indexed")
+    if extractor is not None:
+        from live_keypoints import merge_live_rows
+        print(f"  {merge_live_rows(split)} keypoint rows added to the {split} CSV")
+    return collected
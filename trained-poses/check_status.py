@@ -4,6 +4,8 @@ Check current system status for manual poses
 
 import os
 
+from dataset_stats import DatasetStats
+
 def main():
     print("MANUAL POSES STATUS CHECK")
     print("="*50)
@@ -16,16 +18,14 @@ def main():
         print("   Need to run: python proprocessing.py")
         return
     
-    # Check what poses are in training data
-    with open('train_data.csv', 'r') as f:
-        content = f.read().lower()
-    
-    found_poses = []
-    for pose in manual_poses:
-        if pose in content:
-            found_poses.append(pose)
+    # Check what poses are in training data, from the dataset index
+    stats = DatasetStats.load()
+    found_poses = [pose for pose in manual_poses if stats.rows('train', pose)]
     
     print(f"✅ Training data exists for: {found_poses}")
+    for pose in found_poses:
+        print(f"   {pose}: {stats.rows('train', pose)} train rows, "
+              f"{stats.rows('test', pose)} test rows")
     
     if not found_poses:
         print("❌ No manual poses found in training data")
@@ -42,6 +42,11 @@ def main():
             print(f"✅ {file} exists")
         else:
             print(f"❌ {file} missing")
+    if stats.model:
+        untrained = [pose for pose in found_poses if pose not in stats.model['classes']]
+        print(f"   Model version {stats.model['version']}")
+        if untrained:
+            print(f"   ❌ Not in the exported model yet: {untrained}")
     
     print("\n3. Checking frontend files...")
     frontend_files = ['../frontend/src/pages/EnhancedYoga/EnhancedYoga.js']
@@ -0,0 +1,337 @@
+"""
+Label every frame of recorded videos with the pose classifier
+
+Usage:
+    python classify_video.py session.mp4 [more.mp4 ...] [--format csv|jsonl]
+                             [--output-dir video_labels] [--queue-size 8]
+                             [--batch 32] [--classifier numpy|tflite] [--jobs 2]
+                             [--motion-threshold 0.02] [--refresh-every 15]
+                             [--trace trace.json] [--trace-summary]
+
+Decoding, MoveNet, the landmark embedding and the classifier run as
+concurrent stages, each a thread joined to the next by a bounded queue, so
+a frame is decoded while the previous one is in MoveNet and the one before
+is being classified. MoveNet and OpenCV release the GIL, which is where the
+time goes. The embedding and classifier stages take whatever frames are
+queued (up to --batch) in one call. While the pose holds still the
+classifier is skipped, see motion_gate.py; those frames are marked reused.
+
+Every video gets <output-dir>/<video name>.csv (or .jsonl) with the frame
+index, timestamp, label and confidence of each frame. The report prints the
+end-to-end FPS and the occupancy of each stage, the share of the wall time
+it was busy; the stage near 100% is the bottleneck. MoveNet tracks the
+crop region frame to frame, so the frames of one video go through it in
+order; --jobs classifies several videos at once on a MovenetPool.
+"""
+
+import argparse
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from motion_gate import MotionGate, add_gate_arguments, gate_options
+from numpy_classifier import landmarks_to_embedding, person_to_keypoints
+from pose_config import DEFAULT_CONFIG_PATH, load_config
+from pose_server import load_classifier
+from profiling import add_trace_arguments, print_summary, tracer_from_args
+
+# Marks the end of the stream on every queue
+_END = object()
+# TFLite interpreters are not thread safe, --jobs share one classifier
+_tflite_lock = threading.Lock()
+
+
+class PipelineStage(object):
+    """A thread applying a function to the items of one queue into the next.
+
+    With batch > 1 the function gets a list of all queued items (at most
+    batch) and returns a list of results.
+    """
+
+    def __init__(self, name, function, inputs, outputs, batch=1):
+        self.name = name
+        self._function = function
+        self._inputs = inputs
+        self._outputs = outputs
+        self._batch = batch
+        self.items = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def join(self):
+        self._thread.join()
+
+    def _take(self):
+        items = [self._inputs.get()]
+        while len(items) < self._batch and items[-1] is not _END:
+            try:
+                items.append(self._inputs.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        done = False
+        while not done:
+            items = self._take()
+            if items[-1] is _END:
+                items.pop()
+                done = True
+            if items and self.error is None:
+                start = time.perf_counter()
+                try:
+                    if self._batch > 1:
+                        results = self._function(items)
+                    else:
+                        results = [self._function(items[0])]
+                except Exception as e:
+                    # Keep draining so upstream stages do not block forever
+                    self.error = e
+                    results = []
+                self.busy_seconds += time.perf_counter() - start
+                self.calls += 1
+                self.items += len(items)
+                for result in results:
+                    self._outputs.put(result)
+        self._outputs.put(_END)
+
+
+def decode_frames(cap, frames):
+    """Decode stage, puts (index, seconds, RGB frame) on frames.
+
+    Returns:
+      The seconds spent decoding, not waiting for room on the queue.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    busy_seconds = 0.0
+    while True:
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        busy_seconds += time.perf_counter() - start
+        frames.put((index, index / fps, frame))
+        index += 1
+    return busy_seconds
+
+
+def classify_video(video_path, movenet, classifier, writer, queue_size=8, batch=32,
+                   gate=None):
+    """Runs the stage pipeline over one video.
+
+    Args:
+      video_path: Video file to label.
+      movenet: Movenet (or MovenetPool) used with a TrackerState of this video.
+      classifier: NumpyClassifier or TFLiteClassifier.
+      writer: Function called with the result dict of every frame, in order.
+      queue_size: Capacity of each queue between stages.
+      batch: Most frames the embedding and classifier stages take per call.
+      gate: MotionGate of this video, frames it passes reuse the previous
+        frame's result instead of running the classifier.
+
+    Returns:
+      A dict with the frame count, wall seconds, FPS and per stage stats.
+    """
+    from movenet import TrackerState
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    tracker = TrackerState()
+    class_names = classifier.class_names
+    # NumpyClassifier takes embeddings, the TFLite one raw keypoints
+    takes_embeddings = hasattr(classifier, 'predict')
+
+    def detect(item):
+        index, seconds, frame = item
+        person = movenet.detect(frame, state=tracker)
+        return index, seconds, person_to_keypoints(person), person.score
+
+    def embed(items):
+        keypoints = np.stack([item[2] for item in items])
+        embeddings = landmarks_to_embedding(keypoints)
+        # The gate runs here since this stage sees the frames in order
+        reuse = np.zeros(len(items), dtype=bool)
+        if gate is not None:
+            reuse = np.array([gate.reuse(embedding) for embedding in embeddings])
+        inputs = embeddings if takes_embeddings else keypoints
+        return [(items, inputs[~reuse], reuse)]
+
+    # Probabilities of the last classified frame, for the reused ones
+    last = [None]
+
+    def classify(batches):
+        results = []
+        for items, inputs, reuse in batches:
+            if not len(inputs):
+                probabilities = inputs
+            elif takes_embeddings:
+                probabilities = classifier.predict(inputs)
+            else:
+                with _tflite_lock:
+                    probabilities = classifier.predict_keypoints(inputs)
+            classified = iter(probabilities)
+            for (index, seconds, _, person_score), reused in zip(items, reuse):
+                if not reused:
+                    last[0] = next(classified)
+                row = last[0]
+                i = int(row.argmax())
+                results.append({'frame': index, 'time': round(seconds, 3),
+                                'label': class_names[i],
+                                'confidence': float(row[i]),
+                                'person_score': float(person_score),
+                                'reused': bool(reused)})
+        return results
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(4)]
+    stages = [
+        PipelineStage('detect', detect, queues[0], queues[1]),
+        PipelineStage('embed', embed, queues[1], queues[2], batch),
+        PipelineStage('classify', classify, queues[2], queues[3], batch),
+    ]
+
+    start = time.perf_counter()
+    for stage in stages:
+        stage.start()
+    decode_seconds = [0.0]
+
+    def run_decode():
+        try:
+            decode_seconds[0] = decode_frames(cap, queues[0])
+        finally:
+            queues[0].put(_END)
+
+    decode = threading.Thread(target=run_decode, name='decode', daemon=True)
+    decode.start()
+
+    frames = 0
+    write_seconds = 0.0
+    while True:
+        result = queues[3].get()
+        if result is _END:
+            break
+        begin = time.perf_counter()
+        writer(result)
+        write_seconds += time.perf_counter() - begin
+        frames += 1
+    decode.join()
+    for stage in stages:
+        stage.join()
+    cap.release()
+    seconds = time.perf_counter() - start
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+    occupancy = {'decode': decode_seconds[0] / seconds}
+    occupancy.update({stage.name: stage.busy_seconds / seconds for stage in stages})
+    occupancy['write'] = write_seconds / seconds
+    return {'video': video_path, 'frames': frames, 'seconds': seconds,
+            'fps': frames / seconds if seconds else 0.0, 'occupancy': occupancy,
+            'batches': {stage.name: stage.items / max(stage.calls, 1)
+                        for stage in stages},
+            'gate': gate.report() if gate is not None else None}
+
+
+class ResultWriter(object):
+    """Writes the per frame results as CSV or JSONL"""
+
+    FIELDS = ['frame', 'time', 'label', 'confidence', 'person_score', 'reused']
+
+    def __init__(self, path, output_format='csv'):
+        self._file = open(path, 'w', newline='')
+        self._format = output_format
+        if output_format == 'csv':
+            self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDS,
+                                          extrasaction='ignore')
+            self._writer.writeheader()
+
+    def __call__(self, result):
+        if self._format == 'csv':
+            self._writer.writerow(result)
+        else:
+            self._file.write(json.dumps(result) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+def print_report(report):
+    print(f"  {report['frames']} frames in {report['seconds']:.1f}s, "
+          f"{report['fps']:.1f} FPS")
+    for name, share in report['occupancy'].items():
+        print(f"  {name:>10}: {100 * share:5.1f}% busy")
+    if report['gate'] is not None:
+        gate = report['gate']
+        print(f"  classifier skipped on {gate['reused']} of {gate['frames']} frames "
+              f"({100 * gate['reuse_rate']:.0f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Classify the poses in videos')
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--output-dir', default='video_labels')
+    parser.add_argument('--format', default='csv', choices=['csv', 'jsonl'])
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--classifier', default='numpy', choices=['numpy', 'tflite'])
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help='capacity of the queues between the stages')
+    parser.add_argument('--batch', type=int, default=32,
+                        help='most frames embedded and classified per call')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='videos classified at once, sharing that many MoveNets')
+    add_gate_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from live_keypoints import download_movenet
+    from movenet import MovenetPool
+
+    classifier = load_classifier(load_config(args.config), args.classifier)
+    download_movenet()
+    tracer = tracer_from_args(args)
+    movenet = MovenetPool('movenet_thunder', args.jobs, tracer)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def run(video_path):
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        output_path = os.path.join(args.output_dir, f"{name}.{args.format}")
+        writer = ResultWriter(output_path, args.format)
+        try:
+            return output_path, classify_video(video_path, movenet, classifier,
+                                               writer, args.queue_size, args.batch,
+                                               MotionGate(**gate_options(args)))
+        finally:
+            writer.close()
+
+    with ThreadPoolExecutor(args.jobs) as executor:
+        futures = {executor.submit(run, video_path): video_path
+                   for video_path in args.videos}
+        for future in as_completed(futures):
+            try:
+                output_path, report = future.result()
+            except Exception as e:
+                print(f"{futures[future]}: failed, {e}")
+                continue
+            print(f"{futures[future]} -> {output_path}")
+            print_report(report)
+    tracer.close()
+    print_summary(tracer)
+
+
+if __name__ == '__main__':
+    main()
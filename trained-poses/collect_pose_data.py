@@ -1,15 +1,19 @@
+import argparse
 import cv2
 import os
 import time
 import numpy as np
-from datetime import datetime
+
+from capture_engine import (CaptureEngine, add_capture_arguments, capture_options,
+                            capture_samples)
 
 # List of manual poses to collect data for
 MANUAL_POSES = ['mountain', 'child', 'bridge', 'plank', 'cat_cow']
 
 class PoseDataCollector:
-    def __init__(self, output_dir='yoga_poses'):
+    def __init__(self, output_dir='yoga_poses', capture_options=None):
         self.output_dir = output_dir
+        self.capture_options = capture_options or {}
         self.train_dir = os.path.join(output_dir, 'train')
         self.test_dir = os.path.join(output_dir, 'test')
         
@@ -56,59 +60,9 @@ class PoseDataCollector:
     def _collect_samples(self, cap, pose_name, base_dir, num_samples, data_type):
         """Collect samples for either training or test"""
         pose_dir = os.path.join(base_dir, pose_name)
-        
-        # Get existing file count to continue numbering
-        existing_files = [f for f in os.listdir(pose_dir) if f.endswith('.jpg')]
-        start_idx = len(existing_files) // 2  # Divide by 2 because we save flipped versions too
-        
-        collected = 0
-        capturing = False
-        
-        while collected < num_samples:
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            
-            # Display info on frame
-            display_frame = frame.copy()
-            cv2.putText(display_frame, f"Pose: {pose_name.upper()} ({data_type})", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.putText(display_frame, f"Collected: {collected}/{num_samples}", 
-                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            if capturing:
-                cv2.putText(display_frame, "CAPTURING... Hold the pose!", 
-                           (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                
-                # Save frame
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{pose_name}_{data_type}_{start_idx + collected:04d}.jpg"
-                filepath = os.path.join(pose_dir, filename)
-                
-                # Save original
-                cv2.imwrite(filepath, frame)
-                
-                # Save flipped version for data augmentation
-                flipped_frame = cv2.flip(frame, 1)
-                flipped_filename = f"{pose_name}_{data_type}_{start_idx + collected:04d}_flipped.jpg"
-                flipped_filepath = os.path.join(pose_dir, flipped_filename)
-                cv2.imwrite(flipped_filepath, flipped_frame)
-                
-                collected += 1
-                
-                # Small delay between captures
-                time.sleep(0.1)
-            else:
-                cv2.putText(display_frame, "Press SPACE to start capturing", 
-                           (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-            
-            cv2.imshow('Pose Data Collection', display_frame)
-            
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord(' '):
-                capturing = not capturing
-            elif key == ord('q'):
-                break
+        capture_samples(CaptureEngine(cap, **self.capture_options), pose_dir, f"{pose_name}_{data_type}",
+                        num_samples, f"Pose: {pose_name.upper()} ({data_type})",
+                        interval=0.1, window_name='Pose Data Collection')
     
     def collect_all_poses(self):
         """Collect data for all manual poses"""
@@ -131,7 +85,9 @@ class PoseDataCollector:
         print("2. Run training.py to retrain the model with new poses")
 
 if __name__ == "__main__":
-    collector = PoseDataCollector()
+    parser = argparse.ArgumentParser(description='Collect training data for manual poses')
+    add_capture_arguments(parser)
+    collector = PoseDataCollector(capture_options=capture_options(parser.parse_args()))
     
     print("\nOptions:")
     print("1. Collect data for all manual poses")
@@ -6,7 +6,8 @@ This will do everything needed to make manual poses work with AI detection
 import os
 import subprocess
 import time
-import shutil
+
+from stage_runner import StageRunner, pose_pipeline, print_report, succeeded
 
 def run_step(command, description, timeout=None):
     """Run a setup step with progress tracking"""
@@ -117,43 +118,14 @@ def main():
         print("⚠️ Skipping data collection")
         print("Note: Without new training data, manual poses won't work")
     
-    # Step 3: Process images
-    print(f"\n🔍 STEP 3: Processing images")
-    success = run_step("python proprocessing.py", 
-                      "Processing images to extract keypoints", timeout=600)  # 10 min
-    if not success:
-        print("❌ Image processing failed")
-        return
-    
-    # Step 4: Train model
-    print(f"\n🤖 STEP 4: Training AI model")
-    success = run_step("python training_all_poses.py", 
-                      "Training pose classification model", timeout=1800)  # 30 min
-    if not success:
-        print("❌ Model training failed")
-        return
-    
-    # Step 5: Update frontend
-    print(f"\n📱 STEP 5: Updating frontend")
-    success = run_step("python enable_manual_poses.py", 
-                      "Enabling manual poses in frontend", timeout=60)
-    if not success:
-        print("❌ Frontend update failed")
-        return
-    
-    # Step 6: Copy model files
-    print(f"\n📁 STEP 6: Copying model files")
-    try:
-        frontend_public = "../frontend/public"
-        if os.path.exists(frontend_public):
-            shutil.copy("model/model.json", f"{frontend_public}/model.json")
-            shutil.copy("model/group1-shard1of1.bin", f"{frontend_public}/group1-shard1of1.bin")
-            print("✅ Model files copied to frontend")
-        else:
-            print(f"❌ Frontend directory not found: {frontend_public}")
-            return
-    except Exception as e:
-        print(f"❌ Error copying files: {e}")
+    # Steps 3-6: Process images, train, update frontend, copy model files.
+    # Stages whose inputs did not change since their last run are skipped.
+    print(f"\n🔍 STEPS 3-6: Processing, training and updating the frontend")
+    report = StageRunner(pose_pipeline()).run()
+    print_report(report)
+    if not succeeded(report):
+        failed = report[-1][0]
+        print(f"❌ Stage '{failed}' failed")
         return
     
     # Success!
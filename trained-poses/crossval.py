@@ -0,0 +1,182 @@
+"""
+Stratified k-fold cross validation of the pose classifier
+
+Usage:
+    python crossval.py [--config training_config.json] [--folds 5]
+                       [--workers 5] [--threads-per-worker 1]
+                       [--output crossval_results.csv]
+
+A single train/validation split of a few hundred rows per class gives a
+noisy accuracy, and classes with only a handful of rows may not show up in
+the validation split at all. This trains one model per fold in parallel
+worker processes on the cached embeddings (shared memory, see
+shared_arrays.py) and reports the mean and spread of the recall and F1
+score of every class over the folds, using the model and training settings
+of the config.
+"""
+
+import argparse
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from pose_config import DEFAULT_CONFIG_PATH, load_config
+from shared_arrays import init_worker, release, share_arrays, shared
+
+
+def train_fold(fold, train_index, test_index, num_classes, config):
+    """Trains on one fold of the shared arrays, returns per class metrics"""
+    from sklearn.metrics import precision_recall_fscore_support
+    from sklearn.model_selection import train_test_split
+    from tensorflow import keras
+    from pose_training import build_model
+
+    training = config['training']
+    X, y = shared['X'], shared['y']
+
+    # Early stopping watches a split of the training folds, the held out
+    # fold is only used for scoring
+    fit_index, val_index = train_test_split(
+        train_index, test_size=config['data']['validation_split'],
+        random_state=config['data']['seed'])
+
+    model = build_model(num_classes, **config['model'])
+    earlystopping = keras.callbacks.EarlyStopping(monitor='val_accuracy',
+                                                  patience=training['patience'],
+                                                  restore_best_weights=True)
+    history = model.fit(X[fit_index], keras.utils.to_categorical(y[fit_index], num_classes),
+                        epochs=training['epochs'],
+                        batch_size=training['batch_size'],
+                        validation_data=(X[val_index],
+                                         keras.utils.to_categorical(y[val_index], num_classes)),
+                        callbacks=[earlystopping],
+                        verbose=0)
+
+    y_true = y[test_index]
+    y_pred = model.predict(X[test_index], verbose=0).argmax(axis=1)
+    with warnings.catch_warnings():
+        # Classes missing from a fold have an undefined precision
+        warnings.simplefilter('ignore')
+        _, recall, f1, support = precision_recall_fscore_support(
+            y_true, y_pred, labels=range(num_classes), zero_division=np.nan)
+
+    return {
+        'fold': fold,
+        'accuracy': float((y_true == y_pred).mean()),
+        'recall': recall.tolist(),
+        'f1': f1.tolist(),
+        'support': support.tolist(),
+        'epochs_run': len(history.history['val_accuracy']),
+    }
+
+
+def summarize(results, class_names):
+    """Mean and standard deviation of every class metric over the folds"""
+    recall = np.array([r['recall'] for r in results], dtype=np.float64)
+    f1 = np.array([r['f1'] for r in results], dtype=np.float64)
+    support = np.array([r['support'] for r in results]).sum(axis=0)
+    with warnings.catch_warnings():
+        # A class that is in no test fold has no metrics at all
+        warnings.simplefilter('ignore', RuntimeWarning)
+        summary = pd.DataFrame({
+            'class': class_names,
+            'rows': support,
+            'folds_present': np.sum(~np.isnan(recall), axis=0),
+            'recall_mean': np.nanmean(recall, axis=0),
+            'recall_std': np.nanstd(recall, axis=0),
+            'f1_mean': np.nanmean(f1, axis=0),
+            'f1_std': np.nanstd(f1, axis=0),
+        })
+    accuracy = np.array([r['accuracy'] for r in results])
+    overall = pd.DataFrame([{
+        'class': 'overall',
+        'rows': int(support.sum()),
+        'folds_present': len(results),
+        'recall_mean': accuracy.mean(),
+        'recall_std': accuracy.std(),
+        'f1_mean': np.nanmean(summary['f1_mean']),
+        'f1_std': np.nan,
+    }])
+    return pd.concat([summary, overall], ignore_index=True)
+
+
+def run_crossval(config, folds=5, workers=None, threads_per_worker=1):
+    """Trains one model per fold in parallel, returns the per class summary"""
+    from sklearn.model_selection import StratifiedKFold
+    from pose_training import TrainingPipeline, load_embedded
+
+    pipeline = TrainingPipeline(config)
+    load_key, load_path = pipeline.load()
+    _, embed_path = pipeline.embed(load_key, load_path)
+    X, y, _, _ = load_embedded(embed_path)
+
+    counts = np.bincount(y, minlength=len(pipeline.registry))
+    for name, count in zip(pipeline.registry.names, counts):
+        if count < folds:
+            print(f"Warning: {name} has {count} rows, fewer than {folds} folds")
+
+    # Shuffled because the CSVs are grouped by class
+    seed = config['data']['seed']
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True,
+                               random_state=0 if seed is None else seed)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        splits = list(splitter.split(X, y))
+
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    workers = min(workers, folds)
+    print(f"Cross validating {len(y)} rows in {folds} folds on {workers} workers "
+          f"x {threads_per_worker} threads")
+
+    blocks, specs = share_arrays({'X': X, 'y': y})
+    results = []
+    try:
+        # spawn so that workers do not inherit an initialised TF runtime
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker,
+                                 initargs=(threads_per_worker, specs)) as executor:
+            futures = [executor.submit(train_fold, fold, train_index, test_index,
+                                       len(pipeline.registry), config)
+                       for fold, (train_index, test_index) in enumerate(splits)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"  [{len(results)}/{folds}] fold {result['fold']}: "
+                      f"accuracy {result['accuracy']:.4f} "
+                      f"after {result['epochs_run']} epochs")
+    finally:
+        release(blocks)
+
+    return summarize(sorted(results, key=lambda r: r['fold']),
+                     pipeline.registry.names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stratified k-fold cross validation')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: cores / threads per worker)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='TensorFlow threads per worker')
+    parser.add_argument('--output', default='crossval_results.csv',
+                        help='where to write the per class summary')
+    args = parser.parse_args(argv)
+
+    summary = run_crossval(load_config(args.config), args.folds, args.workers,
+                           args.threads_per_worker)
+    summary.to_csv(args.output, index=False)
+
+    print('-----------------CROSS VALIDATION----------------')
+    print(summary.to_string(index=False, float_format='%.4f'))
+    print('summary saved at ', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Small index of the dataset, kept up to date by the dataset build
+
+The status and diagnosis scripts used to read all of train_data.csv and
+search the text for pose names ("cat" matched any filename containing it)
+and to list every pose folder. dataset_stats.json instead holds per split
+the row count of every class in the combined CSV and the image count of
+every pose folder, with the size and modification time they were counted
+at, plus the version and classes of the last exported model.
+
+proprocessing.py, live_keypoints.merge_live_rows and the training export
+update it. Readers only stat the files to find stale entries, so an
+up to date index is answered without reading the CSV:
+
+    stats = DatasetStats.load()
+    stats.rows('train', 'cat_cow')
+"""
+
+import json
+import os
+import time
+
+import pandas as pd
+
+STATS_PATH = 'dataset_stats.json'
+SPLITS = {
+    'train': ('train_data.csv', os.path.join('yoga_poses', 'train')),
+    'test': ('test_data.csv', os.path.join('yoga_poses', 'test')),
+}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def file_stat(path):
+    """[size, mtime_ns] of a file or folder, None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def count_rows(csv_path):
+    """Rows per class_name of a combined CSV, reading only that column"""
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return {}
+    counts = pd.read_csv(csv_path, usecols=['class_name'])['class_name'].value_counts()
+    return {str(name): int(count) for name, count in counts.items()}
+
+
+def count_images(pose_dir):
+    return sum(1 for name in os.listdir(pose_dir)
+               if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+class DatasetStats(object):
+    """Row and image counts per split and class, and the exported model"""
+
+    def __init__(self, data=None, path=STATS_PATH):
+        self.path = path
+        self._data = data or {'splits': {}, 'model': None}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path=STATS_PATH, refresh=True):
+        """Reads the index, recounting (and saving) whatever is stale"""
+        data = None
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+        stats = cls(data, path)
+        if refresh:
+            stats.refresh()
+        return stats
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def _split(self, split):
+        csv_path, images_folder = SPLITS[split]
+        return self._data['splits'].setdefault(split, {
+            'csv': csv_path, 'csv_stat': None, 'rows': {},
+            'images_folder': images_folder, 'images': {},
+        })
+
+    def update_rows(self, split):
+        """Recounts the class rows of a split's CSV"""
+        entry = self._split(split)
+        entry['csv_stat'] = file_stat(entry['csv'])
+        entry['rows'] = count_rows(entry['csv'])
+        entry['updated'] = time.time()
+        self._dirty = True
+
+    def add_rows(self, split, counts, previous_stat):
+        """Adds the class counts of rows appended to a split's CSV.
+
+        previous_stat is the file_stat() of the CSV before the append. When it
+        does not match the index, the CSV changed in between and is recounted.
+        """
+        entry = self._split(split)
+        if entry['csv_stat'] != previous_stat:
+            self.update_rows(split)
+            return
+        for name, count in counts.items():
+            entry['rows'][name] = entry['rows'].get(name, 0) + int(count)
+        entry['csv_stat'] = file_stat(entry['csv'])
+        entry['updated'] = time.time()
+        self._dirty = True
+
+    def update_images(self, split):
+        """Recounts the images of the pose folders whose mtime changed"""
+        entry = self._split(split)
+        folder = entry['images_folder']
+        poses = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+        images = {}
+        for pose in poses:
+            pose_dir = os.path.join(folder, pose)
+            if not os.path.isdir(pose_dir):
+                continue
+            stat = file_stat(pose_dir)
+            known = entry['images'].get(pose)
+            if known and known['stat'] == stat:
+                images[pose] = known
+            else:
+                images[pose] = {'count': count_images(pose_dir), 'stat': stat}
+                self._dirty = True
+        if set(images) != set(entry['images']):
+            self._dirty = True
+        entry['images'] = images
+
+    def update_model(self, version, classes, model_dir):
+        """Records the model the export just wrote"""
+        self._data['model'] = {'version': version, 'classes': list(classes),
+                               'dir': model_dir, 'exported': time.time()}
+        self._dirty = True
+
+    def refresh(self):
+        """Recounts the stale entries, saving the index if anything changed"""
+        for split, (csv_path, _) in SPLITS.items():
+            entry = self._data['splits'].get(split)
+            if entry is None or entry['csv_stat'] != file_stat(csv_path):
+                self.update_rows(split)
+            self.update_images(split)
+        if self._dirty:
+            self.save()
+
+    def rows(self, split, pose=None):
+        """Rows of a class in a split's CSV, or all of its rows"""
+        counts = self._split(split)['rows']
+        if pose is None:
+            return sum(counts.values())
+        return counts.get(pose.lower(), 0)
+
+    def classes(self, split):
+        """Classes with at least one row in a split's CSV"""
+        return sorted(name for name, count in self._split(split)['rows'].items()
+                      if count)
+
+    def images(self, split, pose):
+        entry = self._split(split)['images'].get(pose.lower())
+        return entry['count'] if entry else 0
+
+    def has_csv(self, split):
+        return self._split(split)['csv_stat'] is not None
+
+    @property
+    def model(self):
+        """version, classes, dir and exported time of the last export, or None"""
+        return self._data['model']
+
+    def updated(self, split):
+        """Time the rows of a split were last counted, None if never"""
+        return self._split(split).get('updated')
+
+
+def update_dataset_stats(splits=tuple(SPLITS), path=STATS_PATH):
+    """Recounts the rows and images of the splits after a dataset build"""
+    stats = DatasetStats.load(path, refresh=False)
+    for split in splits:
+        stats.update_rows(split)
+        stats.update_images(split)
+    stats.save()
+    return stats
+
+
+def main():
+    stats = update_dataset_stats()
+    for split in SPLITS:
+        print(f"{split}: {stats.rows(split)} rows")
+        for pose in stats.classes(split):
+            print(f"  {pose:>16}: {stats.rows(split, pose):6d} rows "
+                  f"{stats.images(split, pose):6d} images")
+    if stats.model:
+        exported = time.strftime('%Y-%m-%d %H:%M',
+                                 time.localtime(stats.model['exported']))
+        print(f"model {stats.model['version']} exported {exported}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,31 +3,46 @@ Enable Manual Poses for AI Detection
 
 This script will:
 1. Add manual poses to the aiSupportedPoses array in EnhancedYoga.js
-2. Update the CLASS_NO mapping for the new poses
+2. Update the CLASS_NO mapping from the class registry exported with the model
 3. Only enable poses that have training data
 """
 
 import os
 import re
 
+from dataset_stats import DatasetStats
+from pose_config import ClassRegistry, load_config
+
+REGISTRY_PATH = 'model/classes.json'
+
 def check_training_data():
     """Check which manual poses have training data"""
     manual_poses = ['Mountain', 'Child', 'Bridge', 'Plank', 'Cat-Cow']
     trained_poses = []
     
-    # Check CSV file for pose data
-    if os.path.exists('train_data.csv'):
-        with open('train_data.csv', 'r') as f:
-            content = f.read().lower()
-            for pose in manual_poses:
-                # Check various naming formats
-                pose_variants = [pose.lower(), pose.lower().replace('-', '_'), pose.lower().replace('cat-cow', 'cat_cow')]
-                if any(variant in content for variant in pose_variants):
-                    trained_poses.append(pose)
+    # Row counts of the dataset index, not a substring search of the CSV
+    stats = DatasetStats.load()
+    for pose in manual_poses:
+        if stats.rows('train', pose.lower().replace('-', '_')):
+            trained_poses.append(pose)
     
     return trained_poses
 
-def update_enhanced_yoga(trained_poses):
+def load_registry():
+    """Class registry the current model was exported with"""
+    if os.path.exists(REGISTRY_PATH):
+        return ClassRegistry.load(REGISTRY_PATH)
+    return ClassRegistry.from_config(load_config())
+
+def class_no_replacement(registry):
+    """JS CLASS_NO object literal matching the model's class indices"""
+    class_no_lines = []
+    for label, class_no in registry.label_map().items():
+        key = label if re.fullmatch(r'[A-Za-z_$][\w$]*', label) else f"'{label}'"
+        class_no_lines.append(f"    {key}: {class_no}")
+    return "const CLASS_NO = {\n" + ',\n'.join(class_no_lines) + "\n  }"
+
+def update_enhanced_yoga(trained_poses, registry):
     """Update EnhancedYoga.js to include newly trained poses"""
     file_path = '../frontend/src/pages/EnhancedYoga/EnhancedYoga.js'
     
@@ -45,26 +60,15 @@ def update_enhanced_yoga(trained_poses):
     
     # Update aiSupportedPoses array
     ai_poses_pattern = r'const aiSupportedPoses = \[(.*?)\]'
-    ai_poses_replacement = f"const aiSupportedPoses = [\n  {', '.join([f\"'{pose}'\" for pose in all_supported])}\n]"
+    quoted_poses = ', '.join(f"'{pose}'" for pose in all_supported)
+    ai_poses_replacement = f"const aiSupportedPoses = [\n  {quoted_poses}\n]"
     
     content = re.sub(ai_poses_pattern, ai_poses_replacement, content, flags=re.DOTALL)
     
-    # Create CLASS_NO mapping for all poses
-    class_mapping = {}
-    for i, pose in enumerate(all_supported):
-        # Handle special naming for Cat-Cow
-        key = "'Cat-Cow'" if pose == 'Cat-Cow' else pose
-        class_mapping[key] = i
-    
     # Update CLASS_NO mapping
-    class_no_lines = []
-    for pose, class_no in class_mapping.items():
-        class_no_lines.append(f"    {pose}: {class_no}")
-    
     class_no_pattern = r'const CLASS_NO = \{(.*?)\}'
-    class_no_replacement = f"const CLASS_NO = {{\n{',\\n'.join(class_no_lines)},\n    No_Pose: {len(all_supported)}\n  }}"
-    
-    content = re.sub(class_no_pattern, class_no_replacement, content, flags=re.DOTALL)
+    content = re.sub(class_no_pattern, lambda _: class_no_replacement(registry),
+                     content, flags=re.DOTALL)
     
     # Write the updated file
     with open(file_path, 'w') as f:
@@ -73,7 +77,7 @@ def update_enhanced_yoga(trained_poses):
     print(f"✅ Updated EnhancedYoga.js with {len(trained_poses)} new AI poses")
     return True
 
-def update_yoga_classic(trained_poses):
+def update_yoga_classic(trained_poses, registry):
     """Update classic Yoga.js as well"""
     file_path = '../frontend/src/pages/Yoga/Yoga.js'
     
@@ -91,25 +95,15 @@ def update_yoga_classic(trained_poses):
     
     # Update poseList array
     pose_list_pattern = r'let poseList = \[(.*?)\]'
-    pose_list_replacement = f"let poseList = [\n  {', '.join([f\"'{pose}'\" for pose in all_poses])}\n]"
+    quoted_poses = ', '.join(f"'{pose}'" for pose in all_poses)
+    pose_list_replacement = f"let poseList = [\n  {quoted_poses}\n]"
     
     content = re.sub(pose_list_pattern, pose_list_replacement, content, flags=re.DOTALL)
     
-    # Create CLASS_NO mapping
-    class_mapping = {}
-    for i, pose in enumerate(all_poses):
-        key = "'Cat-Cow'" if pose == 'Cat-Cow' else pose
-        class_mapping[key] = i
-    
     # Update CLASS_NO mapping
-    class_no_lines = []
-    for pose, class_no in class_mapping.items():
-        class_no_lines.append(f"    {pose}: {class_no}")
-    
     class_no_pattern = r'const CLASS_NO = \{(.*?)\}'
-    class_no_replacement = f"const CLASS_NO = {{\n{',\\n'.join(class_no_lines)},\n    No_Pose: {len(all_poses)}\n  }}"
-    
-    content = re.sub(class_no_pattern, class_no_replacement, content, flags=re.DOTALL)
+    content = re.sub(class_no_pattern, lambda _: class_no_replacement(registry),
+                     content, flags=re.DOTALL)
     
     # Write the updated file
     with open(file_path, 'w') as f:
@@ -130,7 +124,7 @@ def main():
         print("2. Process images: python proprocessing.py")
         print("3. Train model: python training_all_poses.py")
         print("4. Then run this script")
-        return
+        return False
     
     # Check which poses have training data
     trained_poses = check_training_data()
@@ -142,15 +136,17 @@ def main():
         print("1. Collect training data for these poses")
         print("2. Retrain the model")
         print("3. Then run this script")
-        return
+        # Nothing to enable is a valid state, the pipeline carries on
+        return True
     
     print(f"✅ Found training data for: {', '.join(trained_poses)}")
     
     # Update frontend files
     print(f"\n📱 Updating frontend to enable AI detection for new poses...")
     
-    success1 = update_enhanced_yoga(trained_poses)
-    success2 = update_yoga_classic(trained_poses)
+    registry = load_registry()
+    success1 = update_enhanced_yoga(trained_poses, registry)
+    success2 = update_yoga_classic(trained_poses, registry)
     
     if success1 and success2:
         print("\n" + "="*50)
@@ -173,9 +169,11 @@ def main():
         
         print("\n💡 Note:")
         print("Make sure your model files are up to date in frontend/public/")
+        return True
         
     else:
         print("❌ Failed to update frontend files")
+        return False
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Export the trained classifier for the NumPy runtime
+
+Usage:
+    python export_numpy.py [--checkpoint weights.best.all_poses.hdf5]
+                           [--output model/classifier.npz]
+
+Dumps the dense layer weights of a Keras checkpoint into a compressed .npz
+that numpy_classifier.NumpyClassifier loads without TensorFlow, then checks
+that both produce the same probabilities on the test set.
+tests/test_numpy_parity.py checks the same without an export.
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from numpy_classifier import NumpyClassifier
+from pose_config import ClassRegistry, DEFAULT_CONFIG_PATH, load_config
+
+PARITY_TOLERANCE = 1e-4
+
+
+def export_npz(model, path, registry):
+    """Writes the weights and activations of every weighted layer"""
+    arrays = {}
+    activations = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            # Input, dropout and reshape layers do nothing at inference
+            continue
+        if len(weights) != 2 or weights[0].ndim != 2:
+            raise ValueError(f"Layer '{layer.name}' is not a dense layer, "
+                             f"the NumPy runtime only supports dense layers")
+        i = len(activations)
+        arrays[f'kernel_{i}'] = weights[0].astype(np.float32)
+        arrays[f'bias_{i}'] = weights[1].astype(np.float32)
+        activations.append(layer.activation.__name__)
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    np.savez_compressed(path, activations=np.array(activations),
+                        class_names=np.array(registry.names), **arrays)
+    return path
+
+
+def check_parity(model, classifier, keypoints, embeddings):
+    """Largest absolute difference between Keras and NumPy probabilities"""
+    expected = model.predict(embeddings, verbose=0)
+    actual = classifier.predict_keypoints(keypoints)
+    return float(np.abs(expected - actual).max())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the classifier for the NumPy runtime')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--checkpoint', default=None,
+                        help='Keras checkpoint (default: training.checkpoint from the config)')
+    parser.add_argument('--output', default=os.path.join('model', 'classifier.npz'))
+    args = parser.parse_args(argv)
+
+    from pose_training import load_csv, load_model, preprocess_data
+
+    config = load_config(args.config)
+    registry = ClassRegistry.from_config(config)
+    model = load_model(args.checkpoint or config['training']['checkpoint'])
+
+    export_npz(model, args.output, registry)
+    print(f"NumPy classifier saved at {args.output} "
+          f"({os.path.getsize(args.output)} bytes)")
+
+    X_test, _, _ = load_csv(config['data']['test_csv'], registry)
+    difference = check_parity(model, NumpyClassifier.load(args.output),
+                              X_test.to_numpy(), preprocess_data(X_test))
+    print(f"Max difference to Keras on {len(X_test)} test rows: {difference:.2e}")
+    if difference > PARITY_TOLERANCE:
+        raise SystemExit(f"Parity check failed, tolerance is {PARITY_TOLERANCE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Export the pose classifier as a TFLite model
+
+Usage:
+    python export_tflite.py [--checkpoint weights.best.all_poses.hdf5]
+                            [--output model/classifier.tflite]
+                            [--no-fuse] [--int8]
+
+By default the model is fused with the landmark normalization, so it takes
+the raw [n, 17, 3] keypoints like the tfjs keypoint model. With --int8 the
+weights and activations are quantized, using the training set as
+calibration data. tflite_classifier.TFLiteClassifier runs the result on the
+same interpreter as movenet.Movenet.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from pose_config import ClassRegistry, DEFAULT_CONFIG_PATH, load_config
+from pose_training import (TrainingPipeline, build_keypoint_model, load_model,
+                           preprocess_data)
+
+CALIBRATION_SAMPLES = 500
+
+# Ops of the landmark normalization (and softmax) that stay float when
+# quantizing: int8 kernels for the pixel-range norm math lose too much
+# precision and fail to allocate, only the dense layers are quantized.
+FLOAT_OPS = ['ADD', 'DIV', 'EXPAND_DIMS', 'GATHER', 'MAXIMUM', 'MUL',
+             'REDUCE_MAX', 'RESHAPE', 'SOFTMAX', 'SQRT', 'STRIDED_SLICE',
+             'SUB', 'SUM']
+
+
+def export_tflite(classifier, path, fused=True, calibration_data=None):
+    """Converts the classifier, int8 quantized when calibration data is given.
+
+    Args:
+      classifier: Trained Keras classifier on 34 float embeddings.
+      path: Where to write the .tflite file.
+      fused: Whether to include the landmark normalization, the model then
+        takes [n, 17, 3] keypoints instead of [n, 34] embeddings.
+      calibration_data: Inputs in the model's input layout used to calibrate
+        int8 quantization, or None for a float model.
+
+    Returns:
+      The size of the written model in bytes.
+    """
+    model = build_keypoint_model(classifier) if fused else classifier
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if calibration_data is None:
+        tflite_model = converter.convert()
+    else:
+        # The CSVs are grouped by class, sample across all of them
+        rng = np.random.default_rng(0)
+        indices = rng.permutation(len(calibration_data))[:CALIBRATION_SAMPLES]
+
+        def representative_dataset():
+            for i in indices:
+                yield [np.expand_dims(calibration_data[i], 0).astype(np.float32)]
+
+        # Inputs and outputs stay float32
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        debugger = tf.lite.experimental.QuantizationDebugger(
+            converter=converter, debug_dataset=representative_dataset,
+            debug_options=tf.lite.experimental.QuantizationDebugOptions(
+                denylisted_ops=FLOAT_OPS))
+        tflite_model = debugger.get_nondebug_quantized_model()
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+
+def calibration_inputs(keypoints, fused):
+    """Training keypoints in the input layout of the exported model"""
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if fused:
+        return keypoints.reshape(-1, 17, 3)
+    return preprocess_data(keypoints)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the classifier as TFLite')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--checkpoint', default=None,
+                        help='Keras checkpoint (default: training.checkpoint from the config)')
+    parser.add_argument('--output', default=os.path.join('model', 'classifier.tflite'))
+    parser.add_argument('--no-fuse', action='store_true',
+                        help='export the classifier on 34 float embeddings only')
+    parser.add_argument('--int8', action='store_true',
+                        help='int8 quantization calibrated on the training set')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    registry = ClassRegistry.from_config(config)
+    model = load_model(args.checkpoint or config['training']['checkpoint'])
+    fused = not args.no_fuse
+
+    calibration_data = None
+    if args.int8:
+        pipeline = TrainingPipeline(config)
+        _, load_path = pipeline.load()
+        calibration_data = calibration_inputs(
+            pipeline.calibration_keypoints(load_path), fused)
+
+    size = export_tflite(model, args.output, fused, calibration_data)
+    registry.save(os.path.join(os.path.dirname(args.output),
+                               config['export']['classes_file']))
+    print(f"TFLite classifier saved at {args.output} ({size} bytes)")
+
+
+if __name__ == '__main__':
+    main()
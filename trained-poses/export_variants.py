@@ -0,0 +1,199 @@
+"""
+Size optimized TensorFlow.js exports of the pose classifier
+
+Usage:
+    python export_variants.py [--checkpoint weights.best.all_poses.hdf5]
+                              [--quantize float32 float16 uint8]
+                              [--prune 0 0.5] [--tolerance 0.01]
+
+Exports one tfjs model per combination of weight quantization and
+magnitude pruning into model_variants/<name>/ and writes a report with the
+test accuracy and artifact bytes of every variant. The accuracy is measured
+on a Keras model with the same rounding applied to its weights as the tfjs
+converter applies when writing them. The smallest variant within the
+tolerance of the float32 baseline is recommended.
+
+There is no latency column: tfjs dequantizes the weights to float32 when it
+loads the model and runs pruned kernels as dense ones, so all variants run
+the same float32 graph and only differ in download size and accuracy.
+"""
+
+import argparse
+import gzip
+import json
+import os
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from tensorflow import keras
+
+from pose_config import DEFAULT_CONFIG_PATH, load_config
+from pose_training import TrainingPipeline, load_embedded, load_model
+
+QUANTIZATIONS = ('float32', 'float16', 'uint8')
+
+
+def quantize_weights(weights, dtype):
+    """Rounds weights the way tfjs stores them, returns float32 again"""
+    if dtype == 'float32':
+        return weights
+    if dtype == 'float16':
+        return weights.astype(np.float16).astype(np.float32)
+    if dtype == 'uint8':
+        # Affine per tensor quantization that keeps 0 exactly representable
+        low, high = min(weights.min(), 0.0), max(weights.max(), 0.0)
+        scale = (high - low) / 255 or 1.0
+        zero_point = np.round(-low / scale)
+        quantized = np.clip(np.round(weights / scale) + zero_point, 0, 255)
+        return ((quantized - zero_point) * scale).astype(np.float32)
+    raise ValueError(f"Unknown quantization '{dtype}', use one of {QUANTIZATIONS}")
+
+
+def _copy_model(model):
+    copy = keras.models.clone_model(model)
+    copy.set_weights(model.get_weights())
+    return copy
+
+
+def prune_model(model, sparsity, X_train=None, y_train=None, epochs=0,
+                batch_size=16):
+    """Zeroes the smallest kernel weights, optionally fine-tuning with the mask"""
+    pruned = _copy_model(model)
+    masks = {}
+    for layer in pruned.layers:
+        weights = layer.get_weights()
+        if not weights or weights[0].ndim != 2:
+            continue
+        kernel = weights[0]
+        threshold = np.quantile(np.abs(kernel), sparsity)
+        masks[layer.name] = (np.abs(kernel) > threshold).astype(kernel.dtype)
+        layer.set_weights([kernel * masks[layer.name]] + weights[1:])
+
+    def apply_masks(batch, logs=None):
+        for layer in pruned.layers:
+            if layer.name in masks:
+                weights = layer.get_weights()
+                layer.set_weights([weights[0] * masks[layer.name]] + weights[1:])
+
+    if epochs:
+        pruned.compile(optimizer='adam', loss='categorical_crossentropy',
+                       metrics=['accuracy'])
+        pruned.fit(X_train, y_train, epochs=epochs, batch_size=batch_size,
+                   verbose=0,
+                   callbacks=[keras.callbacks.LambdaCallback(
+                       on_train_batch_end=apply_masks)])
+    return pruned
+
+
+def _directory_bytes(path):
+    total, compressed = 0, 0
+    for name in os.listdir(path):
+        with open(os.path.join(path, name), 'rb') as f:
+            content = f.read()
+        total += len(content)
+        compressed += len(gzip.compress(content))
+    return total, compressed
+
+
+def export_variant(model, output_dir, quantization):
+    """Writes a tfjs layers model with the given weight quantization"""
+    import tensorflowjs as tfjs
+
+    dtype_map = None if quantization == 'float32' else {quantization: True}
+    tfjs.converters.save_keras_model(model, output_dir,
+                                     quantization_dtype_map=dtype_map)
+
+
+def evaluate_variant(model, quantization, X_test, y_test):
+    """Test accuracy of a model after weight rounding"""
+    rounded = _copy_model(model)
+    rounded.set_weights([quantize_weights(w, quantization)
+                         for w in model.get_weights()])
+    rounded.compile(optimizer='adam', loss='categorical_crossentropy',
+                    metrics=['accuracy'])
+    _, accuracy = rounded.evaluate(X_test, y_test, verbose=0)
+    return float(accuracy)
+
+
+def choose_variant(report, tolerance):
+    """Smallest variant whose accuracy is within tolerance of float32"""
+    baseline = max(v['accuracy'] for v in report
+                   if v['quantization'] == 'float32' and v['sparsity'] == 0)
+    accepted = [v for v in report if v['accuracy'] >= baseline - tolerance]
+    return min(accepted, key=lambda v: (v['bytes'], v['gzip_bytes']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Quantized and pruned tfjs exports')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--checkpoint', default=None,
+                        help='Keras checkpoint (default: training.checkpoint from the config)')
+    parser.add_argument('--output-dir', default='model_variants')
+    parser.add_argument('--quantize', nargs='+', default=list(QUANTIZATIONS),
+                        choices=QUANTIZATIONS)
+    parser.add_argument('--prune', nargs='+', type=float, default=[0.0],
+                        help='kernel sparsity levels, e.g. 0 0.5 0.8')
+    parser.add_argument('--prune-epochs', type=int, default=10,
+                        help='fine-tuning epochs after pruning')
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='accepted accuracy drop from the float32 model')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    pipeline = TrainingPipeline(config)
+    load_key, load_path = pipeline.load()
+    _, embed_path = pipeline.embed(load_key, load_path)
+    num_classes = len(pipeline.registry)
+    X, y, X_test, y_test = load_embedded(embed_path)
+    y = keras.utils.to_categorical(y, num_classes)
+    y_test = keras.utils.to_categorical(y_test, num_classes)
+    X_train, _, y_train, _ = train_test_split(
+        X, y, test_size=config['data']['validation_split'],
+        random_state=config['data']['seed'])
+
+    model = load_model(args.checkpoint or config['training']['checkpoint'])
+    sparsities = sorted(set([0.0] + args.prune))
+    quantizations = sorted(set(['float32'] + args.quantize), key=QUANTIZATIONS.index)
+
+    report = []
+    for sparsity in sparsities:
+        variant_model = model if sparsity == 0 else prune_model(
+            model, sparsity, X_train, y_train, args.prune_epochs,
+            config['training']['batch_size'])
+        for quantization in quantizations:
+            name = quantization if sparsity == 0 else \
+                f"{quantization}_pruned{int(sparsity * 100)}"
+            variant_dir = os.path.join(args.output_dir, name)
+            export_variant(variant_model, variant_dir, quantization)
+            pipeline.registry.save(os.path.join(variant_dir,
+                                                config['export']['classes_file']))
+
+            accuracy = evaluate_variant(variant_model, quantization, X_test, y_test)
+            total, compressed = _directory_bytes(variant_dir)
+            report.append({
+                'name': name,
+                'quantization': quantization,
+                'sparsity': sparsity,
+                'accuracy': accuracy,
+                'bytes': total,
+                'gzip_bytes': compressed,
+                'path': variant_dir,
+            })
+            print(f"{name:>20}: accuracy {accuracy:.4f}, {total} bytes "
+                  f"({compressed} gzipped)")
+
+    chosen = choose_variant(report, args.tolerance)
+    report_path = os.path.join(args.output_dir, 'report.json')
+    with open(report_path, 'w') as f:
+        json.dump({'tolerance': args.tolerance, 'recommended': chosen['name'],
+                   'note': 'tfjs runs every variant as the same float32 graph, '
+                           'they differ only in size and accuracy',
+                   'variants': report}, f, indent=2)
+
+    print(f"\nRecommended: {chosen['name']} ({chosen['bytes']} bytes, "
+          f"accuracy {chosen['accuracy']:.4f})")
+    print('report saved at ', report_path)
+
+
+if __name__ == '__main__':
+    main()
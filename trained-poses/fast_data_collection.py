@@ -3,11 +3,15 @@ FAST Data Collection for Manual Poses
 Optimized version that collects data much faster with better guidance
 """
 
+import argparse
 import cv2
 import os
 import time
 import numpy as np
 
+from capture_engine import (CaptureEngine, add_capture_arguments, capture_options,
+                            capture_samples)
+
 # Poses with detailed instructions for quick setup
 POSES_GUIDE = {
     'mountain': {
@@ -43,8 +47,9 @@ POSES_GUIDE = {
 }
 
 class FastPoseCollector:
-    def __init__(self):
+    def __init__(self, capture_options=None):
         self.cap = None
+        self.capture_options = capture_options or {}
         
     def initialize_camera(self):
         """Initialize camera with optimal settings"""
@@ -93,11 +98,6 @@ class FastPoseCollector:
     def _fast_capture(self, pose_key, data_type, num_samples):
         """Fast auto-capture with countdown"""
         base_dir = f'yoga_poses/{data_type}/{pose_key}'
-        os.makedirs(base_dir, exist_ok=True)
-        
-        # Get existing files count
-        existing = [f for f in os.listdir(base_dir) if f.endswith('.jpg')]
-        start_idx = len(existing) // 2
         
         print(f"\nGet into {POSES_GUIDE[pose_key]['name']}")
         print("Auto-capture will start in 5 seconds...")
@@ -109,47 +109,16 @@ class FastPoseCollector:
         
         print("CAPTURING - Hold the pose and move slightly for variation!")
         
-        collected = 0
-        while collected < num_samples:
-            ret, frame = self.cap.read()
-            if not ret:
-                print("Camera error")
-                return False
-            
-            # Show progress
-            display_frame = frame.copy()
-            cv2.putText(display_frame, f"{POSES_GUIDE[pose_key]['name']} - {data_type.upper()}", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(display_frame, f"Captured: {collected}/{num_samples}", 
-                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(display_frame, "Auto-capturing... Hold pose!", 
-                       (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            
-            cv2.imshow('Fast Data Collection', display_frame)
-            
-            # Save every 3rd frame for variety
-            if collected * 3 < num_samples * 3:
-                filename = f"{pose_key}_{data_type}_{start_idx + collected:04d}.jpg"
-                filepath = os.path.join(base_dir, filename)
-                cv2.imwrite(filepath, frame)
-                
-                # Save flipped version
-                flipped = cv2.flip(frame, 1)
-                flipped_filename = f"{pose_key}_{data_type}_{start_idx + collected:04d}_flipped.jpg"
-                flipped_filepath = os.path.join(base_dir, flipped_filename)
-                cv2.imwrite(flipped_filepath, flipped)
-                
-                collected += 1
-                print(f"  Captured {collected}/{num_samples}")
-            
-            # Small delay between captures for variety
-            time.sleep(0.3)
-            
-            # Allow early exit
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                print(f"\nStopped early at {collected} samples")
-                break
-        
+        # Samples are spaced 0.3s apart for variety
+        collected = capture_samples(CaptureEngine(self.cap, **self.capture_options), base_dir,
+                                    f"{pose_key}_{data_type}", num_samples,
+                                    f"{POSES_GUIDE[pose_key]['name']} - {data_type.upper()}",
+                                    interval=0.3, auto_start=True,
+                                    window_name='Fast Data Collection')
+        if collected is None:
+            print("Camera error")
+            return False
+        print(f"  Captured {collected}/{num_samples}")
         return True
     
     def collect_all_poses(self):
@@ -218,7 +187,9 @@ class FastPoseCollector:
         return len(completed_poses) > 0
 
 def main():
-    collector = FastPoseCollector()
+    parser = argparse.ArgumentParser(description='Fast data collection for manual poses')
+    add_capture_arguments(parser)
+    collector = FastPoseCollector(capture_options(parser.parse_args()))
     
     print("FAST POSE DATA COLLECTION")
     print("="*50)
@@ -10,6 +10,8 @@ This script will:
 import os
 import json
 
+from dataset_stats import DatasetStats
+
 def check_current_state():
     """Check the current state of the system"""
     print("🔍 DIAGNOSING CURRENT SYSTEM STATE...")
@@ -22,15 +24,16 @@ def check_current_state():
     train_dir = 'yoga_poses/train'
     
     print("📊 Checking training data...")
+    stats = DatasetStats.load()
     missing_poses = []
     for pose in manual_poses:
         pose_dir = os.path.join(train_dir, pose)
         if not os.path.exists(pose_dir):
             missing_poses.append(pose)
         else:
-            files = [f for f in os.listdir(pose_dir) if f.endswith('.jpg')]
-            if len(files) < 10:
-                missing_poses.append(f"{pose} (only {len(files)} images)")
+            images = stats.images('train', pose)
+            if images < 10:
+                missing_poses.append(f"{pose} (only {images} images)")
     
     if missing_poses:
         print(f"❌ Missing training data for: {', '.join(missing_poses)}")
@@ -40,14 +43,12 @@ def check_current_state():
     
     # Check 2: CSV files contain manual poses
     print("\n📋 Checking processed training data...")
-    if os.path.exists('train_data.csv'):
-        with open('train_data.csv', 'r') as f:
-            content = f.read()
-            if any(pose in content for pose in manual_poses):
-                print("✅ Manual poses found in training CSV")
-            else:
-                print("❌ Manual poses NOT found in training CSV")
-                issues.append("Manual poses not processed into CSV")
+    if stats.has_csv('train'):
+        if any(stats.rows('train', pose) for pose in manual_poses):
+            print("✅ Manual poses found in training CSV")
+        else:
+            print("❌ Manual poses NOT found in training CSV")
+            issues.append("Manual poses not processed into CSV")
     else:
         print("❌ train_data.csv not found")
         issues.append("Training data not processed")
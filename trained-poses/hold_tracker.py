@@ -0,0 +1,239 @@
+"""
+Pose hold tracking over a stream of classifications
+
+Usage:
+    python hold_tracker.py video_labels/*.csv [--target tree]
+                           [--hold-enter 0.97] [--hold-exit 0.9]
+                           [--hold-grace 0.5]
+
+The frontend decides on every prediction whether the user is holding the
+pose (confidence above 0.97) and times the hold. HoldTracker does the same
+for server-side and offline scoring: it takes one (label, confidence,
+timestamp) event at a time and keeps the current hold, the best streak and
+the transitions in constant time and memory per frame.
+
+Unlike the frontend it has hysteresis, so a hold is not broken by a single
+shaky frame: it starts when the pose is classified with at least `enter`
+confidence, continues while the confidence stays above `exit`, and only
+ends after the pose was lost for `grace` seconds. The hold then ends at the
+last frame that still showed the pose.
+
+HoldSessions keeps one tracker per session id, for a server scoring many
+streams in one process. The command line scores the per frame output of
+classify_video.py.
+"""
+
+import argparse
+import csv
+import json
+import os
+
+
+class HoldTracker(object):
+    """Hold state of one stream"""
+
+    __slots__ = ('target', 'enter_confidence', 'exit_confidence', 'grace',
+                 'label', 'hold_start', 'last_held', 'best_streak',
+                 'best_label', 'total_held', 'holds', 'transitions',
+                 'frames', 'first_time', 'last_time', '_last_label')
+
+    def __init__(self, target=None, enter_confidence=0.97, exit_confidence=0.9,
+                 grace=0.5):
+        """
+        Args:
+          target: Pose to track, or None to track a hold of any pose but
+            no_pose.
+          enter_confidence: Confidence a frame needs to start a hold.
+          exit_confidence: Confidence that keeps a started hold going.
+          grace: Seconds the pose may be lost before the hold ends.
+        """
+        if exit_confidence > enter_confidence:
+            raise ValueError('exit_confidence has to be at most enter_confidence')
+        self.target = target.lower() if target else None
+        self.enter_confidence = enter_confidence
+        self.exit_confidence = exit_confidence
+        self.grace = grace
+        # Pose of the current hold, None when not holding
+        self.label = None
+        self.hold_start = None
+        self.last_held = None
+        self.best_streak = 0.0
+        self.best_label = None
+        self.total_held = 0.0
+        self.holds = 0
+        self.transitions = 0
+        self.frames = 0
+        self.first_time = None
+        self.last_time = None
+        self._last_label = None
+
+    @property
+    def holding(self):
+        return self.label is not None
+
+    @property
+    def duration(self):
+        """Seconds of the current hold, 0 when not holding"""
+        if self.label is None:
+            return 0.0
+        return self.last_held - self.hold_start
+
+    def _trackable(self, label):
+        if self.target is not None:
+            return label == self.target
+        return label != 'no_pose'
+
+    def _end_hold(self):
+        streak = self.last_held - self.hold_start
+        self.total_held += streak
+        if streak > self.best_streak:
+            self.best_streak = streak
+            self.best_label = self.label
+        self.label = None
+        self.hold_start = None
+        self.last_held = None
+
+    def update(self, label, confidence, timestamp):
+        """Feeds one classified frame.
+
+        Returns:
+          'start' or 'end' when a hold started or ended with this frame,
+          otherwise None. A frame that ends one hold and starts another
+          returns 'start'.
+        """
+        label = label.lower()
+        self.frames += 1
+        if self.first_time is None:
+            self.first_time = timestamp
+        self.last_time = timestamp
+        if label != self._last_label:
+            if self._last_label is not None:
+                self.transitions += 1
+            self._last_label = label
+
+        event = None
+        if self.label is not None:
+            if label == self.label and confidence >= self.exit_confidence:
+                self.last_held = timestamp
+                return None
+            if timestamp - self.last_held <= self.grace and \
+                    not (self._trackable(label) and confidence >= self.enter_confidence):
+                return None
+            self._end_hold()
+            event = 'end'
+
+        if self._trackable(label) and confidence >= self.enter_confidence:
+            self.label = label
+            self.hold_start = timestamp
+            self.last_held = timestamp
+            self.holds += 1
+            event = 'start'
+        return event
+
+    def summary(self):
+        """Counts and times of the stream, including an open hold"""
+        best_streak, best_label = self.best_streak, self.best_label
+        if self.label is not None and self.duration > best_streak:
+            best_streak, best_label = self.duration, self.label
+        elapsed = 0.0
+        if self.first_time is not None:
+            elapsed = self.last_time - self.first_time
+        return {
+            'frames': self.frames,
+            'seconds': elapsed,
+            'holds': self.holds,
+            'held_seconds': self.total_held + self.duration,
+            'best_streak': best_streak,
+            'best_label': best_label,
+            'holding': self.label,
+            'current_hold': self.duration,
+            'transitions': self.transitions,
+        }
+
+
+class HoldSessions(object):
+    """HoldTrackers of many concurrent streams, created on their first frame"""
+
+    def __init__(self, **tracker_options):
+        self._options = tracker_options
+        self._trackers = {}
+
+    def __len__(self):
+        return len(self._trackers)
+
+    def update(self, session_id, label, confidence, timestamp, target=None):
+        tracker = self._trackers.get(session_id)
+        if tracker is None:
+            tracker = HoldTracker(target, **self._options)
+            self._trackers[session_id] = tracker
+        return tracker.update(label, confidence, timestamp)
+
+    def get(self, session_id):
+        return self._trackers.get(session_id)
+
+    def close(self, session_id):
+        """Forgets a session, returning its summary (None if unknown)"""
+        tracker = self._trackers.pop(session_id, None)
+        return tracker.summary() if tracker is not None else None
+
+    def summaries(self):
+        return {session_id: tracker.summary()
+                for session_id, tracker in self._trackers.items()}
+
+
+def add_hold_arguments(parser):
+    """Command line options of the HoldTracker"""
+    parser.add_argument('--hold-enter', type=float, default=0.97,
+                        help='confidence that starts a hold')
+    parser.add_argument('--hold-exit', type=float, default=0.9,
+                        help='confidence that keeps a hold going')
+    parser.add_argument('--hold-grace', type=float, default=0.5,
+                        help='seconds the pose may be lost within a hold')
+
+
+def hold_options(args):
+    return {'enter_confidence': args.hold_enter,
+            'exit_confidence': args.hold_exit, 'grace': args.hold_grace}
+
+
+def read_labels(path):
+    """(label, confidence, time) rows of a classify_video.py output file"""
+    with open(path, 'r', newline='') as f:
+        if path.endswith('.jsonl'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            yield row['label'], float(row['confidence']), float(row['time'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score pose holds in classified videos')
+    parser.add_argument('labels', nargs='+',
+                        help='CSV or JSONL files written by classify_video.py')
+    parser.add_argument('--target', default=None,
+                        help='pose to score (default: any pose but no_pose)')
+    add_hold_arguments(parser)
+    parser.add_argument('--output', default=None,
+                        help='also write the summaries to this JSON file')
+    args = parser.parse_args(argv)
+
+    sessions = HoldSessions(**hold_options(args))
+    for path in args.labels:
+        session_id = os.path.splitext(os.path.basename(path))[0]
+        for label, confidence, timestamp in read_labels(path):
+            sessions.update(session_id, label, confidence, timestamp, args.target)
+
+    summaries = sessions.summaries()
+    for session_id, summary in summaries.items():
+        print(f"{session_id}: {summary['holds']} holds, "
+              f"{summary['held_seconds']:.1f}s of {summary['seconds']:.1f}s held, "
+              f"best {summary['best_streak']:.1f}s ({summary['best_label']}), "
+              f"{summary['transitions']} transitions")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Extract pose keypoints from video files
+
+Usage:
+    python ingest_videos.py videos/tree/*.mp4 [--pose tree] [--split train]
+                            [--stride 10 | --every 0.5 | --motion 8]
+                            [--workers 4] [--threads-per-worker 1]
+                            [--save-images] [--min-distance 0.05]
+
+Recorded videos are an easier source of training data than holding a pose
+in front of the webcam. Every video is decoded headless in its own worker
+process with its own MoveNet, sampling frames either every --stride frames,
+every --every seconds of video time or whenever the image changed by more
+than --motion (mean absolute difference of a small grayscale thumbnail,
+0-255) since the last sample. Skipped frames are only grabbed, not decoded,
+unless motion sampling needs them. The cores are split between the workers'
+MoveNet interpreters, so the default of one worker per core runs one
+inference thread each.
+
+The keypoints go through the same checks as live collection (quality gate,
+optional near duplicate rejection) and are written to the
+per pose live CSVs, then merged into the split CSV. The pose defaults to the
+name of the folder a video is in.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from live_keypoints import (DiversityIndex, SPLIT_CSVS, append_rows,
+                            add_quality_arguments, download_movenet,
+                            keypoint_rows, live_csv_path, merge_live_rows,
+                            quality_gate)
+from numpy_classifier import person_to_keypoints
+from pose_config import ClassRegistry, DEFAULT_CONFIG_PATH, load_config
+
+THUMBNAIL_SIZE = (64, 36)
+
+# MoveNet of this worker process, loaded by the first video it gets
+_extractor = None
+
+
+def _thumbnail(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def sample_frames(cap, stride=None, every=None, motion=None):
+    """Yields (frame index, frame) of the sampled frames of a video"""
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    next_time = 0.0
+    last_thumbnail = None
+    index = -1
+    while cap.grab():
+        index += 1
+        if stride is not None:
+            if index % stride:
+                continue
+        elif every is not None:
+            # Frame time from the index, container timestamps are unreliable
+            if index / fps < next_time:
+                continue
+            while next_time <= index / fps:
+                next_time += every
+
+        ret, frame = cap.retrieve()
+        if not ret:
+            continue
+        if motion is not None:
+            thumbnail = _thumbnail(frame)
+            if last_thumbnail is not None and \
+                    np.abs(thumbnail - last_thumbnail).mean() < motion:
+                continue
+            last_thumbnail = thumbnail
+        yield index, frame
+
+
+def ingest_video(video_path, pose, split, sampling, save_images, min_distance,
+                 gate=None, num_threads=1):
+    """Samples one video and detects the pose in the sampled frames.
+
+    num_threads are the MoveNet interpreter threads of this worker process.
+
+    Returns:
+      A dict of counts and the per pose CSV rows of the accepted frames.
+    """
+    global _extractor
+    if _extractor is None:
+        from live_keypoints import KeypointExtractor, load_movenet
+        _extractor = KeypointExtractor(load_movenet(num_threads=num_threads))
+    if gate is not None:
+        _extractor.gate = gate
+    _extractor.reset()
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    pose_dir = os.path.join('yoga_poses', split, pose)
+    index = DiversityIndex(min_distance) if min_distance else None
+    result = {'video': video_path, 'pose': pose, 'sampled': 0, 'accepted': 0,
+              'low_quality': 0, 'duplicates': 0, 'rows': []}
+
+    start = time.perf_counter()
+    try:
+        for frame_index, frame in sample_frames(cap, **sampling):
+            result['sampled'] += 1
+            person = _extractor.detect(frame)
+            if _extractor.check(person, frame) is not None:
+                result['low_quality'] += 1
+                continue
+            keypoints = person_to_keypoints(person)
+            if index is not None:
+                if not index.is_novel(keypoints):
+                    result['duplicates'] += 1
+                    continue
+                index.add(keypoints, frame.shape[1])
+
+            stem = f"{pose}_{split}_{video_name}_{frame_index:06d}"
+            result['rows'] += keypoint_rows(stem, keypoints, frame.shape[1])
+            result['accepted'] += 1
+            if save_images:
+                os.makedirs(pose_dir, exist_ok=True)
+                cv2.imwrite(os.path.join(pose_dir, f"{stem}.jpg"), frame)
+                cv2.imwrite(os.path.join(pose_dir, f"{stem}_flipped.jpg"),
+                            cv2.flip(frame, 1))
+    finally:
+        cap.release()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract pose keypoints from videos')
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--pose', default=None,
+                        help='pose class of all videos (default: their folder name)')
+    parser.add_argument('--split', default='train', choices=sorted(SPLIT_CSVS))
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument('--stride', type=int, default=None,
+                          help='sample every Nth frame')
+    sampling.add_argument('--every', type=float, default=None,
+                          help='sample every N seconds of video')
+    sampling.add_argument('--motion', type=float, default=None,
+                          help='sample when the image changed by this much (0-255)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='videos processed in parallel (default: cores)')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='MoveNet threads of every worker (default: cores / workers)')
+    parser.add_argument('--save-images', action='store_true',
+                        help='also save the sampled frames to yoga_poses/')
+    parser.add_argument('--min-distance', type=float, default=0.0,
+                        help='skip frames this close to an earlier one of the video')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    add_quality_arguments(parser)
+    args = parser.parse_args(argv)
+
+    sampling = {'stride': args.stride, 'every': args.every, 'motion': args.motion}
+    if not any(value is not None for value in sampling.values()):
+        sampling['every'] = 0.5
+
+    registry = ClassRegistry.from_config(load_config(args.config))
+    jobs = []
+    for video_path in args.videos:
+        pose = (args.pose or
+                os.path.basename(os.path.dirname(os.path.abspath(video_path)))).lower()
+        registry.index(pose)
+        jobs.append((video_path, pose))
+
+    # Once here instead of a download race in the workers
+    download_movenet()
+    workers = min(args.workers or os.cpu_count() or 1, len(jobs))
+    # One interpreter per worker, more threads than cores only adds contention
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Ingesting {len(jobs)} videos on {workers} workers x {threads} threads")
+    totals = {'sampled': 0, 'accepted': 0, 'low_quality': 0, 'duplicates': 0}
+    # spawn so that workers do not inherit an initialised TF runtime
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(ingest_video, video_path, pose, args.split,
+                                   sampling, args.save_images, args.min_distance,
+                                   quality_gate(args), threads):
+                   video_path for video_path, pose in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"  {futures[future]}: failed, {e}")
+                continue
+            # Only this process writes the CSVs
+            append_rows(live_csv_path(args.split, result['pose']), result['rows'])
+            for key in totals:
+                totals[key] += result[key]
+            print(f"  {result['video']}: {result['accepted']}/{result['sampled']} "
+                  f"frames kept ({result['low_quality']} low quality, "
+                  f"{result['duplicates']} duplicates) in {result['seconds']:.1f}s")
+
+    added = merge_live_rows(args.split, class_registry=registry)
+    print(f"{totals['accepted']} of {totals['sampled']} sampled frames kept, "
+          f"{added} rows added to {SPLIT_CSVS[args.split]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,10 @@ This script will:
 
 import os
 import subprocess
-import shutil
 import sys
 
+from stage_runner import StageRunner, pose_pipeline, print_report, succeeded
+
 def run_command(cmd, description):
     """Run a command and show progress"""
     print(f"\n{'='*50}")
@@ -74,32 +75,13 @@ def main():
     else:
         print("✅ Training data found for all manual poses")
     
-    # Step 2: Process images to extract keypoints
-    print("\n🔍 Processing images to extract pose keypoints...")
-    if not run_command("python proprocessing.py", "Processing images"):
-        return
-    
-    # Step 3: Train the model with all poses
-    print("\n🤖 Training AI model with all poses...")
-    if not run_command("python training_all_poses.py", "Training model"):
-        return
-    
-    # Step 4: Copy model files to frontend
-    print("\n📁 Copying model files to frontend...")
-    
-    frontend_public = "../frontend/public"
-    if not os.path.exists(frontend_public):
-        print(f"❌ Frontend directory not found: {frontend_public}")
-        print("Please check your project structure")
-        return
-    
-    try:
-        # Copy model files
-        shutil.copy("model/model.json", f"{frontend_public}/model.json")
-        shutil.copy("model/group1-shard1of1.bin", f"{frontend_public}/group1-shard1of1.bin")
-        print("✅ Model files copied to frontend")
-    except Exception as e:
-        print(f"❌ Error copying model files: {e}")
+    # Steps 2-4: process images, train incrementally and copy the model to
+    # the frontend, skipping the stages that are already up to date
+    print("\n🔍 Processing images, training the model and copying it to the frontend...")
+    report = StageRunner(pose_pipeline(incremental=True)).run(['copy_model'])
+    print_report(report)
+    if not succeeded(report):
+        print(f"❌ Error: stage '{report[-1][0]}' failed")
         return
     
     # Step 5: Success message
@@ -0,0 +1,341 @@
+"""
+MoveNet keypoint extraction while collecting pose data
+
+With live extraction the collectors run MoveNet on every accepted sample and
+append its keypoints to a per pose CSV, so a capture session does not have to
+be followed by a proprocessing.py run over all the images (and saving the
+images becomes optional). The mirrored copy that the image collectors save
+for augmentation is recorded as mirrored keypoints instead of a second
+detection.
+
+Rows go to csv_per_pose/live/<split>/<pose>.csv in the per pose CSV format
+of proprocessing.Preprocessor and are merged into train_data.csv or
+test_data.csv with merge_live_rows(), which proprocessing.py also calls after
+rebuilding those files.
+"""
+
+import collections
+import csv
+import os
+import threading
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from data import BodyPart
+from dataset_stats import DatasetStats, file_stat
+from numpy_classifier import landmarks_to_embedding, person_to_keypoints
+from pose_config import ClassRegistry, load_config
+
+MOVENET_URL = ('https://tfhub.dev/google/lite-model/movenet/singlepose/thunder/'
+               'tflite/float16/4?lite-format=tflite')
+LIVE_CSV_FOLDER = os.path.join('csv_per_pose', 'live')
+SPLIT_CSVS = {'train': 'train_data.csv', 'test': 'test_data.csv'}
+
+# Same minimum keypoint score proprocessing.Preprocessor keeps images at
+DETECTION_THRESHOLD = 0.1
+
+# Index of the mirrored body part, left and right swap in a flipped image
+MIRRORED_PARTS = [0, 2, 1, 4, 3, 6, 5, 8, 7, 10, 9, 12, 11, 14, 13, 16, 15]
+
+
+def download_movenet(model_name='movenet_thunder'):
+    """Downloads the thunder model like proprocessing.py, unless present"""
+    if not os.path.exists(model_name + '.tflite'):
+        import wget
+        wget.download(MOVENET_URL, model_name + '.tflite')
+
+
+def load_movenet(model_name='movenet_thunder', num_threads=4):
+    from movenet import Movenet
+
+    download_movenet(model_name)
+    return Movenet(model_name, num_threads=num_threads)
+
+
+def keypoint_header():
+    """Column names of the combined keypoint CSVs"""
+    header = ['filename']
+    for bodypart in BodyPart:
+        header += [bodypart.name + '_x', bodypart.name + '_y',
+                   bodypart.name + '_score']
+    return header + ['class_no', 'class_name']
+
+
+def mirror_keypoints(keypoints, image_width):
+    """Keypoints of the horizontally flipped image, as [17, 3] (x, y, score)"""
+    mirrored = keypoints[MIRRORED_PARTS].copy()
+    mirrored[:, 0] = image_width - mirrored[:, 0]
+    return mirrored
+
+
+def live_csv_path(split, pose, csv_folder=LIVE_CSV_FOLDER):
+    return os.path.join(csv_folder, split, pose + '.csv')
+
+
+def keypoint_rows(stem, keypoints, image_width, mirror=True):
+    """Per pose CSV rows of one sample, and of its mirror image"""
+    rows = [[f"{stem}.jpg"] + keypoints.flatten().astype(str).tolist()]
+    if mirror:
+        mirrored = mirror_keypoints(keypoints, image_width)
+        rows.append([f"{stem}_flipped.jpg"] +
+                    mirrored.flatten().astype(str).tolist())
+    return rows
+
+
+def append_rows(csv_path, rows):
+    """Appends rows to a per pose CSV, creating its folder"""
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    with open(csv_path, 'a', newline='') as csv_out_file:
+        csv.writer(csv_out_file, delimiter=',',
+                   quoting=csv.QUOTE_MINIMAL).writerows(rows)
+
+
+class QualityGate(object):
+    """Refuses detections that would make poor training samples.
+
+    check() returns why a person is refused as (reason, message), or None.
+    The reasons are checked from the most to the least basic: no person at
+    all, joints MoveNet is unsure about, a body cut off at the image border
+    and a person too small in the frame.
+    """
+
+    def __init__(self, min_person_score=0.3,
+                 min_keypoint_score=DETECTION_THRESHOLD, edge_margin=0.0,
+                 min_size=0.0):
+        """
+        Args:
+          min_person_score: Minimum Person.score, the mean of the confident
+            keypoint scores.
+          min_keypoint_score: Minimum score of every joint, the default is the
+            threshold proprocessing.py keeps images at.
+          edge_margin: Refuse keypoints closer than this fraction of the
+            image size to its border.
+          min_size: Minimum diagonal of the keypoint bounding box as a
+            fraction of the image diagonal.
+        """
+        self.min_person_score = min_person_score
+        self.min_keypoint_score = min_keypoint_score
+        self.edge_margin = edge_margin
+        self.min_size = min_size
+
+    def weak_joints(self, person):
+        return [keypoint.body_part for keypoint in person.keypoints
+                if keypoint.score < self.min_keypoint_score]
+
+    def check(self, person, image_height, image_width):
+        # The score is NaN when no keypoint is above the detection threshold
+        if not person.score >= self.min_person_score:
+            return ('no_person',
+                    f"No clear person in view (score {np.nan_to_num(person.score):.2f})")
+
+        weak = self.weak_joints(person)
+        if weak:
+            names = ', '.join(part.name.lower().replace('_', ' ') for part in weak[:3])
+            more = f" +{len(weak) - 3}" if len(weak) > 3 else ''
+            return 'weak_joints', f"Joints not visible: {names}{more}"
+
+        if self.edge_margin:
+            margin_x = self.edge_margin * image_width
+            margin_y = self.edge_margin * image_height
+            for keypoint in person.keypoints:
+                x, y = keypoint.coordinate
+                if not (margin_x <= x <= image_width - margin_x and
+                        margin_y <= y <= image_height - margin_y):
+                    return 'edge', "Body at the edge of the frame - step back"
+
+        if self.min_size:
+            start, end = person.bounding_box
+            size = np.hypot(end.x - start.x, end.y - start.y) / \
+                np.hypot(image_width, image_height)
+            if size < self.min_size:
+                return 'too_small', "Too far from the camera - move closer"
+        return None
+
+
+def add_quality_arguments(parser):
+    """Command line options of the QualityGate"""
+    parser.add_argument('--min-person-score', type=float, default=0.3,
+                        help='minimum MoveNet person score of a sample')
+    parser.add_argument('--min-keypoint-score', type=float, default=DETECTION_THRESHOLD,
+                        help='minimum score of every joint of a sample')
+    parser.add_argument('--edge-margin', type=float, default=0.0,
+                        help='refuse joints within this fraction of the image border')
+    parser.add_argument('--min-size', type=float, default=0.0,
+                        help='minimum pose size as a fraction of the image diagonal')
+
+
+def quality_gate(args):
+    return QualityGate(args.min_person_score, args.min_keypoint_score,
+                       args.edge_margin, args.min_size)
+
+
+class KeypointExtractor(object):
+    """Runs MoveNet on camera frames and appends the keypoints to CSVs"""
+
+    def __init__(self, movenet=None, gate=None, csv_folder=LIVE_CSV_FOLDER):
+        from movenet import TrackerState
+
+        self._movenet = movenet if movenet is not None else load_movenet()
+        self._tracker = TrackerState()
+        self.gate = gate if gate is not None else QualityGate()
+        self._csv_folder = csv_folder
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forgets the crop region, call when a new capture starts"""
+        self._tracker.reset()
+
+    def detect(self, frame):
+        """Person detected in a BGR camera frame"""
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return self._movenet.detect(rgb, state=self._tracker)
+
+    def check(self, person, frame):
+        """Why the quality gate refuses a detection, or None to keep it"""
+        return self.gate.check(person, frame.shape[0], frame.shape[1])
+
+    def csv_path(self, split, pose):
+        return live_csv_path(split, pose, self._csv_folder)
+
+    def next_sample_index(self, split, pose):
+        """Samples recorded so far, mirrored rows are part of their sample"""
+        path = self.csv_path(split, pose)
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r') as f:
+            return sum(1 for line in f if line.strip() and
+                       not line.split(',', 1)[0].endswith('_flipped.jpg'))
+
+    def append(self, split, pose, stem, person, image_width, mirror=True):
+        """Appends the keypoint rows of one sample (and its mirror image)"""
+        rows = keypoint_rows(stem, person_to_keypoints(person), image_width,
+                             mirror)
+        with self._lock:
+            append_rows(self.csv_path(split, pose), rows)
+        return len(rows)
+
+
+def merge_live_rows(split, csv_path=None, class_registry=None,
+                    csv_folder=LIVE_CSV_FOLDER):
+    """Appends live keypoint rows that are not in a combined CSV yet.
+
+    Rows are matched on the "pose/image" filename, so samples whose images
+    were saved and later processed by proprocessing.py are not duplicated.
+
+    Returns:
+      The number of rows appended.
+    """
+    if csv_path is None:
+        csv_path = SPLIT_CSVS[split]
+    if class_registry is None:
+        class_registry = ClassRegistry.from_config(load_config())
+    live_folder = os.path.join(csv_folder, split)
+    if not os.path.isdir(live_folder):
+        return 0
+
+    header = keypoint_header()
+    existing = set()
+    if os.path.exists(csv_path):
+        existing = set(pd.read_csv(csv_path, usecols=['filename'])['filename'])
+
+    frames = []
+    for csv_name in sorted(os.listdir(live_folder)):
+        if not csv_name.endswith('.csv'):
+            continue
+        class_name = csv_name[:-len('.csv')]
+        per_class_df = pd.read_csv(os.path.join(live_folder, csv_name),
+                                   header=None, names=header[:-2])
+        per_class_df['filename'] = class_name + '/' + per_class_df['filename']
+        per_class_df = per_class_df.drop_duplicates('filename')
+        per_class_df = per_class_df[~per_class_df['filename'].isin(existing)].copy()
+        per_class_df['class_no'] = class_registry.index(class_name)
+        per_class_df['class_name'] = class_name
+        frames.append(per_class_df)
+
+    new_rows = pd.concat(frames) if frames else pd.DataFrame(columns=header)
+    if len(new_rows):
+        previous_stat = file_stat(csv_path)
+        new_rows.to_csv(csv_path, mode='a', index=False,
+                        header=not os.path.exists(csv_path))
+        if csv_path == SPLIT_CSVS[split]:
+            stats = DatasetStats.load(refresh=False)
+            stats.add_rows(split, new_rows['class_name'].value_counts(), previous_stat)
+            stats.save()
+    return len(new_rows)
+
+
+def load_pose_keypoints(split, pose, csv_path=None):
+    """[n, 17, 3] keypoints of the rows of one pose in a combined CSV"""
+    if csv_path is None:
+        csv_path = SPLIT_CSVS[split]
+    if not os.path.exists(csv_path):
+        return np.empty((0, 17, 3), dtype=np.float32)
+    df = pd.read_csv(csv_path)
+    rows = df[df['class_name'].str.lower() == pose.lower()]
+    keypoints = rows[keypoint_header()[1:-2]].to_numpy(dtype=np.float32)
+    return keypoints.reshape(-1, 17, 3)
+
+
+class DiversityIndex(object):
+    """Pose embeddings of the samples of one pose, to reject near duplicates.
+
+    A candidate is a duplicate when the L2 distance of its embedding (see
+    pose_training.landmarks_to_embedding) to the nearest indexed sample is
+    below min_distance. The index is saturated once almost every recent
+    candidate was a duplicate, i.e. the person is no longer producing new
+    variations of the pose.
+    """
+
+    def __init__(self, min_distance, saturation=0.95, window=100):
+        self.min_distance = min_distance
+        self._saturation = saturation
+        self._embeddings = np.empty((256, 34), dtype=np.float32)
+        self._size = 0
+        self._recent = collections.deque(maxlen=window)
+        self.rejected = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, keypoints, image_width=0, mirror=True):
+        """Indexes [17, 3] or [n, 17, 3] keypoints, and their mirror images"""
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, 17, 3)
+        if mirror:
+            keypoints = np.concatenate(
+                [keypoints] + [mirror_keypoints(k, image_width)[np.newaxis]
+                               for k in keypoints])
+        embeddings = landmarks_to_embedding(keypoints)
+
+        needed = self._size + len(embeddings)
+        if needed > len(self._embeddings):
+            grown = np.empty((max(needed, 2 * len(self._embeddings)), 34),
+                             dtype=np.float32)
+            grown[:self._size] = self._embeddings[:self._size]
+            self._embeddings = grown
+        self._embeddings[self._size:needed] = embeddings
+        self._size = needed
+
+    def nearest_distance(self, keypoints):
+        """Distance of a pose to the closest indexed sample"""
+        if not self._size:
+            return np.inf
+        embedding = landmarks_to_embedding(keypoints)[0]
+        return float(np.sqrt(np.min(np.sum(
+            (self._embeddings[:self._size] - embedding) ** 2, axis=1))))
+
+    def is_novel(self, keypoints):
+        """Whether a candidate pose differs enough from the indexed ones"""
+        novel = self.nearest_distance(keypoints) >= self.min_distance
+        self._recent.append(novel)
+        if not novel:
+            self.rejected += 1
+        return novel
+
+    @property
+    def saturated(self):
+        if len(self._recent) < self._recent.maxlen:
+            return False
+        duplicates = len(self._recent) - sum(self._recent)
+        return duplicates >= self._saturation * len(self._recent)
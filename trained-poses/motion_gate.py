@@ -0,0 +1,83 @@
+"""
+Skip the classifier while the pose does not change
+
+During a hold consecutive MoveNet results barely differ, yet the embedding
+and classifier ran on every frame. A MotionGate compares the normalized
+keypoints (the classifier's landmark embedding) of a frame with those of
+the last classified frame of the stream. When no joint moved more than
+`threshold` (a fraction of the pose size) the previous classification is
+reused, but at least every `refresh_every` frames the classifier runs
+anyway.
+
+    gate = MotionGate(threshold=0.02, refresh_every=15)
+    if not gate.reuse(embedding):
+        probabilities = classifier.predict(embedding)
+"""
+
+import numpy as np
+
+
+class MotionGate(object):
+    """Decides per frame of one stream whether the last result still holds"""
+
+    __slots__ = ('threshold', 'refresh_every', 'frames', 'reused',
+                 '_reference', '_since_refresh')
+
+    def __init__(self, threshold=0.02, refresh_every=15):
+        """
+        Args:
+          threshold: Largest joint movement, in units of the pose size, that
+            reuses the previous classification. 0 disables the gate.
+          refresh_every: Frames after which the classifier runs regardless.
+        """
+        self.threshold = threshold
+        self.refresh_every = refresh_every
+        self.frames = 0
+        self.reused = 0
+        self._reference = None
+        self._since_refresh = 0
+
+    def distance(self, embedding):
+        """Largest joint movement since the last classified frame"""
+        if self._reference is None:
+            return np.inf
+        moved = np.asarray(embedding, dtype=np.float32).reshape(17, 2) - self._reference
+        return float(np.sqrt((moved * moved).sum(axis=1)).max())
+
+    def reuse(self, embedding):
+        """True to reuse the last classification for this frame.
+
+        Returning False makes the frame the new reference, the caller has to
+        classify it.
+        """
+        self.frames += 1
+        self._since_refresh += 1
+        if self.threshold > 0 and self._since_refresh < self.refresh_every and \
+                self.distance(embedding) < self.threshold:
+            self.reused += 1
+            return True
+        self._reference = np.asarray(embedding, dtype=np.float32).reshape(17, 2)
+        self._since_refresh = 0
+        return False
+
+    def reset(self):
+        self._reference = None
+        self._since_refresh = 0
+
+    def report(self):
+        """Frames seen, reused and the share of classifier calls skipped"""
+        return {'frames': self.frames, 'reused': self.reused,
+                'reuse_rate': self.reused / self.frames if self.frames else 0.0}
+
+
+def add_gate_arguments(parser):
+    """Command line options of the MotionGate"""
+    parser.add_argument('--motion-threshold', type=float, default=0.02,
+                        help='reuse the last label while no joint moved more than '
+                             'this fraction of the pose size (0: classify every frame)')
+    parser.add_argument('--refresh-every', type=int, default=15,
+                        help='classify at least every this many frames')
+
+
+def gate_options(args):
+    return {'threshold': args.motion_threshold, 'refresh_every': args.refresh_every}
@@ -16,13 +16,16 @@
 """Code to run a pose estimation with a TFLite MoveNet model."""
 
 import os
-from typing import Dict, List
+import queue
+import threading
+from typing import Dict, List, Optional
 
 import cv2
 from data import BodyPart
 from data import Person
 from data import person_from_keypoints_with_scores
 import numpy as np
+from profiling import NULL_TRACER
 
 # pylint: disable=g-import-not-at-top
 try:
@@ -35,6 +38,23 @@ except ImportError:
 # pylint: enable=g-import-not-at-top
 
 
+class TrackerState(object):
+  """Crop region tracked across the frames of one video stream.
+
+  Keeping it out of Movenet lets one interpreter serve many streams: each
+  stream passes its own TrackerState to Movenet.detect().
+  """
+
+  __slots__ = ('crop_region',)
+
+  def __init__(self) -> None:
+    self.crop_region = None
+
+  def reset(self) -> None:
+    """Starts over from the full image on the next frame."""
+    self.crop_region = None
+
+
 class Movenet(object):
   """A wrapper class for a Movenet TFLite pose estimation model."""
 
@@ -44,11 +64,15 @@ class Movenet(object):
   _TORSO_EXPANSION_RATIO = 1.9
   _BODY_EXPANSION_RATIO = 1.2
 
-  def __init__(self, model_name: str) -> None:
+  def __init__(self, model_name: str, tracer=None, num_threads: int = 4) -> None:
     """Initialize a MoveNet pose estimation model.
 
     Args:
       model_name: Name of the TFLite MoveNet model.
+      tracer: Optional profiling.Tracer receiving the timing spans of
+        detect().
+      num_threads: Threads of the TFLite interpreter. Lower it when several
+        processes run a Movenet each.
     """
 
     # Append TFLITE extension to model_name if there's no extension
@@ -57,7 +81,7 @@ class Movenet(object):
       model_name += '.tflite'
 
     # Initialize model
-    interpreter = Interpreter(model_path=model_name, num_threads=4)
+    interpreter = Interpreter(model_path=model_name, num_threads=num_threads)
     interpreter.allocate_tensors()
 
     self._input_index = interpreter.get_input_details()[0]['index']
@@ -67,7 +91,11 @@ class Movenet(object):
     self._input_width = interpreter.get_input_details()[0]['shape'][2]
 
     self._interpreter = interpreter
-    self._crop_region = None
+    # The interpreter's tensors are shared, detect() may run on many threads
+    self._lock = threading.Lock()
+    # Tracking state of callers that do not pass their own
+    self._state = TrackerState()
+    self.tracer = tracer or NULL_TRACER
 
   def init_crop_region(self, image_height: int,
                        image_width: int) -> Dict[(str, float)]:
@@ -302,16 +330,25 @@ class Movenet(object):
       and scores.
     """
 
-    input_image = self._crop_and_resize(image, crop_region, crop_size=crop_size)
-    input_image = input_image.astype(dtype=np.uint8)
-
-    self._interpreter.set_tensor(self._input_index,
-                                 np.expand_dims(input_image, axis=0))
-    self._interpreter.invoke()
-
-    keypoints_with_scores = self._interpreter.get_tensor(self._output_index)
-    keypoints_with_scores = np.squeeze(keypoints_with_scores)
-
+    tracer = self.tracer
+    with tracer.span('preprocess'):
+      input_image = self._crop_and_resize(image, crop_region, crop_size=crop_size)
+      input_image = input_image.astype(dtype=np.uint8)
+
+    with self._lock:
+      with tracer.span('invoke'):
+        self._interpreter.set_tensor(self._input_index,
+                                     np.expand_dims(input_image, axis=0))
+        self._interpreter.invoke()
+
+        keypoints_with_scores = self._interpreter.get_tensor(self._output_index)
+    with tracer.span('postprocess'):
+      keypoints_with_scores = np.squeeze(keypoints_with_scores)
+      return self._remap_keypoints(keypoints_with_scores, crop_region)
+
+  def _remap_keypoints(self, keypoints_with_scores: np.ndarray,
+                       crop_region: Dict[(str, float)]) -> np.ndarray:
+    """Maps keypoints from crop coordinates to image coordinates in place."""
     # Update the coordinates.
     for idx in range(len(BodyPart)):
       keypoints_with_scores[idx, 0] = crop_region[
@@ -323,7 +360,8 @@ class Movenet(object):
 
   def detect(self,
              input_image: np.ndarray,
-             reset_crop_region: bool = False) -> Person:
+             reset_crop_region: bool = False,
+             state: Optional[TrackerState] = None) -> Person:
     """Run detection on an input image.
 
     Args:
@@ -334,27 +372,65 @@ class Movenet(object):
         previous detection result to improve accuracy. Set to True if this is a
         frame from a video. Set to False if this is a static image. Default
         value is True.
+      state: The TrackerState of the stream this frame belongs to. Defaults
+        to a state owned by this Movenet, which suits a single stream.
 
     Returns:
       An array of shape [17, 3] representing the keypoint coordinates and
       scores.
     """
+    if state is None:
+      state = self._state
     image_height, image_width, _ = input_image.shape
-    if (self._crop_region is None) or reset_crop_region:
+    if (state.crop_region is None) or reset_crop_region:
       # Set crop region for the first frame.
-      self._crop_region = self.init_crop_region(image_height, image_width)
+      state.crop_region = self.init_crop_region(image_height, image_width)
 
     # Detect pose using the crop region inferred from the detection result in
     # the previous frame
     keypoint_with_scores = self._run_detector(
         input_image,
-        self._crop_region,
+        state.crop_region,
         crop_size=(self._input_height, self._input_width))
     # Calculate the crop region for the next frame
-    self._crop_region = self._determine_crop_region(keypoint_with_scores,
-                                                    image_height, image_width)
+    with self.tracer.span('crop_update'):
+      state.crop_region = self._determine_crop_region(keypoint_with_scores,
+                                                      image_height, image_width)
 
     # Convert the keypoints with scores to a Person data type
+    with self.tracer.span('to_person'):
+      return person_from_keypoints_with_scores(keypoint_with_scores,
+                                               image_height, image_width)
 
-    return person_from_keypoints_with_scores(keypoint_with_scores, image_height,
-                                             image_width)
+
+class MovenetPool(object):
+  """A few Movenet interpreters shared by any number of streams.
+
+  detect() borrows a free interpreter, so up to `size` frames of different
+  streams are processed in parallel while each stream only owns its
+  TrackerState.
+  """
+
+  def __init__(self, model_name: str, size: int = 2, tracer=None) -> None:
+    self.size = size
+    self._free = queue.Queue()
+    for _ in range(size):
+      self._free.put(Movenet(model_name, tracer))
+
+  def detect(self,
+             input_image: np.ndarray,
+             reset_crop_region: bool = False,
+             state: Optional[TrackerState] = None) -> Person:
+    """Movenet.detect() on the next free interpreter.
+
+    Takes the same arguments as Movenet.detect(). The interpreters serve
+    many streams, so without a `state` the image is treated as a still
+    image with a fresh TrackerState instead of the interpreter's own.
+    """
+    if state is None:
+      state = TrackerState()
+    movenet = self._free.get()
+    try:
+      return movenet.detect(input_image, reset_crop_region, state)
+    finally:
+      self._free.put(movenet)
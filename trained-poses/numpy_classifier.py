@@ -0,0 +1,114 @@
+"""
+Pose classifier runtime in plain NumPy
+
+Runs the landmark embedding and the dense layers exported by
+export_numpy.py without importing TensorFlow, for single keypoint rows or
+batches of them.
+
+    classifier = NumpyClassifier.load('model/classifier.npz')
+    category = classifier.classify(keypoints_with_scores)[0]
+"""
+
+import numpy as np
+
+from data import BodyPart, Category
+
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'relu6': lambda x: np.clip(x, 0, 6),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+}
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+_ACTIVATIONS['softmax'] = _softmax
+
+
+def _center_point(landmarks, left_bodypart, right_bodypart):
+    return (landmarks[:, left_bodypart.value] * 0.5 +
+            landmarks[:, right_bodypart.value] * 0.5)
+
+
+def person_to_keypoints(person):
+    """[17, 3] float32 array of (x, y, score), the layout of the keypoint CSVs"""
+    return np.array(
+        [[keypoint.coordinate.x, keypoint.coordinate.y, keypoint.score]
+         for keypoint in person.keypoints], dtype=np.float32)
+
+
+def landmarks_to_embedding(keypoints, torso_size_multiplier=2.5):
+    """Same normalization as pose_training.landmarks_to_embedding, per row.
+
+    Args:
+      keypoints: One pose as 51 floats or a [17, 3] array, or a batch of
+        them with shape [n, 51] or [n, 17, 3]. Rows are (x, y, score).
+
+    Returns:
+      A float32 array of shape [n, 34].
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    landmarks = keypoints.reshape(-1, 17, 3)[:, :, :2]
+
+    # Move landmarks so that the pose center becomes (0,0)
+    pose_center = _center_point(landmarks, BodyPart.LEFT_HIP, BodyPart.RIGHT_HIP)
+    landmarks = landmarks - pose_center[:, np.newaxis, :]
+
+    # Torso size as the minimum body size
+    hips_center = _center_point(landmarks, BodyPart.LEFT_HIP, BodyPart.RIGHT_HIP)
+    shoulders_center = _center_point(landmarks, BodyPart.LEFT_SHOULDER,
+                                     BodyPart.RIGHT_SHOULDER)
+    torso_size = np.linalg.norm(shoulders_center - hips_center, axis=1)
+
+    # Like the TF version, the distance is the norm over all landmarks of
+    # each coordinate, and the larger of the x and y norms is used.
+    d = landmarks - hips_center[:, np.newaxis, :]
+    max_dist = np.linalg.norm(d, axis=1).max(axis=1)
+
+    pose_size = np.maximum(torso_size * torso_size_multiplier, max_dist)
+    landmarks = landmarks / pose_size[:, np.newaxis, np.newaxis]
+    return landmarks.reshape(-1, 34).astype(np.float32)
+
+
+class NumpyClassifier(object):
+    """Forward pass of the exported dense classifier"""
+
+    def __init__(self, kernels, biases, activations, class_names):
+        self._kernels = kernels
+        self._biases = biases
+        self._activations = [_ACTIVATIONS[name] for name in activations]
+        self.class_names = list(class_names)
+
+    @classmethod
+    def load(cls, path):
+        """Loads weights written by export_numpy.export_npz()"""
+        with np.load(path) as weights:
+            activations = [str(name) for name in weights['activations']]
+            kernels = [weights[f'kernel_{i}'] for i in range(len(activations))]
+            biases = [weights[f'bias_{i}'] for i in range(len(activations))]
+            class_names = [str(name) for name in weights['class_names']]
+        return cls(kernels, biases, activations, class_names)
+
+    def predict(self, embeddings):
+        """Class probabilities [n, classes] for embeddings of shape [n, 34]"""
+        x = np.asarray(embeddings, dtype=np.float32).reshape(-1, 34)
+        for kernel, bias, activation in zip(self._kernels, self._biases,
+                                            self._activations):
+            x = activation(x @ kernel + bias)
+        return x
+
+    def predict_keypoints(self, keypoints):
+        """Class probabilities for raw keypoints, see landmarks_to_embedding"""
+        return self.predict(landmarks_to_embedding(keypoints))
+
+    def classify(self, keypoints):
+        """Most likely Category for each pose in keypoints"""
+        probabilities = self.predict_keypoints(keypoints)
+        best = probabilities.argmax(axis=1)
+        return [Category(self.class_names[i], float(probabilities[row, i]))
+                for row, i in enumerate(best)]
@@ -0,0 +1,171 @@
+"""
+Training configuration and the pose class registry
+
+The registry is the single source of truth for class indices. The trainer
+uses it to build the one-hot labels, preprocessing uses it to write the
+class_no column and the frontend CLASS_NO mapping is generated from the
+classes.json file exported next to model/model.json.
+"""
+
+import copy
+import json
+import os
+
+DEFAULT_CONFIG_PATH = 'training_config.json'
+
+# Upper estimate of the bytes one keypoint row takes while a block is parsed
+# by pandas and embedded by TensorFlow
+CHUNK_ROW_BYTES = 4096
+# Block size of the streamed CSV merge without a memory limit
+DEFAULT_CHUNK_ROWS = 50000
+
+DEFAULT_CONFIG = {
+    'classes': [],
+    'data': {
+        'train_csv': 'train_data.csv',
+        'test_csv': 'test_data.csv',
+        'validation_split': 0.15,
+        'seed': None,
+        # Streams the keypoint rows in blocks when set, see chunk_rows()
+        'memory_limit_mb': None,
+    },
+    'model': {
+        'hidden_units': [128, 64],
+        'dropout': 0.5,
+        'activation': 'relu6',
+    },
+    'training': {
+        'epochs': 200,
+        'batch_size': 16,
+        'patience': 20,
+        'checkpoint': 'weights.best.all_poses.hdf5',
+        'incremental': {
+            'epochs': 30,
+            'patience': 5,
+            'learning_rate': 0.0005,
+            'head_only': False,
+            'replay_per_class': 50,
+        },
+    },
+    'export': {
+        'tfjs_dir': 'model',
+        'classes_file': 'classes.json',
+        'numpy_file': 'classifier.npz',
+        'keypoints_dir': 'model_keypoints',
+        'tflite_file': 'classifier.tflite',
+        'tflite_fused': True,
+        'tflite_int8': False,
+    },
+    'cache_dir': '.train_cache',
+}
+
+
+def _merge(base, override):
+    """Recursively merges override into a copy of base"""
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def chunk_rows(config):
+    """Keypoint rows per block that keep the data under data.memory_limit_mb
+
+    The limit covers the keypoint rows in flight, not the fixed memory of
+    TensorFlow and the model.
+    """
+    limit = config['data'].get('memory_limit_mb')
+    if not limit:
+        return DEFAULT_CHUNK_ROWS
+    return max(1024, int(limit * 2**20) // CHUNK_ROW_BYTES)
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
+    """Loads a training config file on top of the defaults"""
+    with open(path, 'r') as f:
+        config = _merge(DEFAULT_CONFIG, json.load(f))
+    if not config['classes']:
+        raise ValueError(f"No classes defined in {path}")
+    return config
+
+
+class ClassRegistry(object):
+    """Ordered list of pose classes, the position of a class is its index"""
+
+    def __init__(self, classes):
+        self._classes = []
+        for entry in classes:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            entry = dict(entry)
+            entry['name'] = entry['name'].lower()
+            entry.setdefault('label', entry['name'])
+            entry.setdefault('aliases', [])
+            self._classes.append(entry)
+
+        self._index = {}
+        for i, entry in enumerate(self._classes):
+            if entry['name'] in self._index:
+                raise ValueError(f"Duplicate class in registry: {entry['name']}")
+            self._index[entry['name']] = i
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['classes'])
+
+    @classmethod
+    def load(cls, path):
+        """Loads a registry previously written by save()"""
+        with open(path, 'r') as f:
+            return cls(json.load(f)['classes'])
+
+    def __len__(self):
+        return len(self._classes)
+
+    def __contains__(self, name):
+        return name.lower() in self._index
+
+    @property
+    def names(self):
+        return [entry['name'] for entry in self._classes]
+
+    @property
+    def labels(self):
+        return [entry['label'] for entry in self._classes]
+
+    def index(self, name):
+        """Returns the class index of a (case insensitive) class name"""
+        try:
+            return self._index[name.lower()]
+        except KeyError:
+            raise KeyError(f"Unknown pose class '{name}', add it to the "
+                           f"classes list of the training config") from None
+
+    def name(self, index):
+        return self._classes[index]['name']
+
+    def label_map(self):
+        """Frontend label (and aliases) to class index, i.e. CLASS_NO"""
+        mapping = {}
+        for i, entry in enumerate(self._classes):
+            mapping[entry['label']] = i
+            for alias in entry['aliases']:
+                mapping[alias] = i
+        return mapping
+
+    def to_dict(self):
+        return {
+            'classes': copy.deepcopy(self._classes),
+            'class_no': self.label_map(),
+        }
+
+    def save(self, path):
+        """Writes the registry as JSON, e.g. next to model/model.json"""
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
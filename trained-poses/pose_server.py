@@ -0,0 +1,444 @@
+"""
+Local pose classification server
+
+Usage:
+    python pose_server.py [--port 8765] [--max-batch 32] [--max-wait-ms 5]
+                          [--classifier numpy|tflite] [--session-timeout 60]
+                          [--trace trace.json] [--trace-summary]
+
+Serves the classifier (and MoveNet, for clients that send images) over HTTP
+on localhost, so thin clients and stream analysis do not need to run the
+models themselves. Every request names a session; a session is one camera
+stream and keeps its own movenet.TrackerState between frames, while all
+sessions share --movenet-workers interpreters.
+
+    POST /classify   {"session": "cam1", "keypoints": [[x, y, score] * 17]}
+                     {"session": "cam1", "image": "<base64 JPEG or PNG>"}
+                     optional "target": "tree", "timestamp": seconds
+                     -> {"label": "tree", "confidence": 0.98,
+                         "probabilities": {...}, "keypoints": [...],
+                         "hold": {"event": "start", "holding": "tree", ...},
+                         "reused": false}
+    POST /summary    {"session": "cam1"}   hold summary, see hold_tracker.py
+    POST /reset      {"session": "cam1"}   end the session, returns its summary
+    GET  /stats      batch sizes, queue wait, session counts and gate skips
+
+Requests are not run one by one. The handler threads put them on a queue
+and a MicroBatcher collects up to --max-batch of them, or whatever arrived
+within --max-wait-ms of the first one, into one call: the classifier runs
+once per batch, and the images of a batch are spread over the MoveNet
+interpreters. Throughput therefore grows with the number of clients.
+While a session's pose holds still, its MotionGate reuses the last result
+and the frame skips the classifier ("reused" in the response).
+"""
+
+import argparse
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from hold_tracker import HoldTracker, add_hold_arguments, hold_options
+from motion_gate import MotionGate, add_gate_arguments, gate_options
+from numpy_classifier import landmarks_to_embedding, person_to_keypoints
+from pose_config import DEFAULT_CONFIG_PATH, load_config
+from profiling import add_trace_arguments, print_summary, tracer_from_args
+
+
+class MicroBatcher(object):
+    """Runs process_batch on groups of submitted items from a single thread.
+
+    A batch closes when it has max_batch items or max_wait seconds after its
+    first item arrived, whichever comes first.
+    """
+
+    def __init__(self, process_batch, max_batch=32, max_wait=0.005, name='batcher'):
+        """
+        Args:
+          process_batch: Function from a list of items to a list of results
+            of the same length.
+          max_batch: Largest number of items processed in one call.
+          max_wait: Seconds a batch waits for more items.
+          name: Name of the worker thread.
+        """
+        self._process_batch = process_batch
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        self.stats = {'batches': 0, 'items': 0, 'max_batch': 0,
+                      'wait_seconds': 0.0, 'process_seconds': 0.0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queues an item, returns a Future of its result"""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        entry = self._queue.get()
+        if entry is None:
+            return None
+        batch = [entry]
+        deadline = time.perf_counter() + self._max_wait
+        while len(batch) < self._max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=timeout) if timeout > 0 \
+                    else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Finish this batch, stop on the next call
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self._process_batch(items)
+            except Exception as e:
+                self.stats['errors'] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, queued), result in zip(batch, results):
+                self.stats['wait_seconds'] += start - queued
+                future.set_result(result)
+            self.stats['batches'] += 1
+            self.stats['items'] += len(batch)
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+            self.stats['process_seconds'] += time.perf_counter() - start
+
+    def report(self):
+        stats = dict(self.stats)
+        items = max(stats['items'], 1)
+        stats['mean_batch'] = stats['items'] / max(stats['batches'], 1)
+        stats['mean_wait_ms'] = 1000 * stats.pop('wait_seconds') / items
+        stats['mean_process_ms'] = 1000 * stats.pop('process_seconds') / items
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+def load_classifier(config, kind='numpy'):
+    """The exported classifier, NumPy or TFLite, without Keras"""
+    export = config['export']
+    if kind == 'tflite':
+        from tflite_classifier import TFLiteClassifier
+        return TFLiteClassifier(os.path.join(export['tfjs_dir'], export['tflite_file']))
+    from numpy_classifier import NumpyClassifier
+    return NumpyClassifier.load(os.path.join(export['tfjs_dir'], export['numpy_file']))
+
+
+class PoseService(object):
+    """Sessions, MoveNet and the classifier behind the two batchers"""
+
+    def __init__(self, classifier, movenet_loader=None, max_batch=32,
+                 max_wait=0.005, session_timeout=60.0, hold_options=None,
+                 gate_options=None):
+        """
+        Args:
+          classifier: Object with predict_keypoints([n, 17, 3]) and class_names.
+          movenet_loader: Function returning a Movenet or MovenetPool, called
+            on the first image request so keypoint-only servers never load it.
+          max_batch, max_wait: MicroBatcher limits of both batchers.
+          session_timeout: Seconds after which an idle session is forgotten,
+            checked once per timeout, so it goes within twice that.
+          hold_options: Keyword arguments of each session's HoldTracker.
+          gate_options: Keyword arguments of each session's MotionGate, None
+            to classify every frame.
+        """
+        self._classifier = classifier
+        self._movenet_loader = movenet_loader
+        self._movenet = None
+        self._detect_pool = None
+        self._session_timeout = session_timeout
+        self._hold_options = hold_options or {}
+        self._gate_options = gate_options
+        self.gate_stats = {'frames': 0, 'reused': 0}
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._next_sweep = time.monotonic() + session_timeout
+        self.detector = MicroBatcher(self._detect_batch, max_batch, max_wait,
+                                     name='detector')
+        self.classifier = MicroBatcher(self._classify_batch, max_batch, max_wait,
+                                       name='classifier')
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        with self._sessions_lock:
+            # Scanning every session costs O(sessions) under the lock, so
+            # stale ones are dropped at most once per timeout, not per frame
+            if now >= self._next_sweep:
+                self._next_sweep = now + self._session_timeout
+                for stale in [key for key, session in self._sessions.items()
+                              if now - session['last_seen'] > self._session_timeout]:
+                    del self._sessions[stale]
+            session = self._sessions.setdefault(
+                session_id, {'tracker': None, 'hold': None, 'gate': None,
+                             'probabilities': None, 'frames': 0})
+            session['last_seen'] = now
+            session['frames'] += 1
+            return session
+
+    def reset(self, session_id):
+        """Forgets a session, returning its hold summary (None if unknown)"""
+        with self._sessions_lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None or session['hold'] is None:
+            return None
+        return session['hold'].summary()
+
+    def summary(self, session_id):
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            if session is None or session['hold'] is None:
+                return None
+            return session['hold'].summary()
+
+    def _detect_batch(self, items):
+        """MoveNet keypoints [17, 3] of (session, RGB image) items"""
+        from movenet import TrackerState
+
+        if self._movenet is None:
+            if self._movenet_loader is None:
+                raise ValueError('This server only accepts keypoints')
+            self._movenet = self._movenet_loader()
+            if getattr(self._movenet, 'size', 1) > 1:
+                self._detect_pool = ThreadPoolExecutor(self._movenet.size)
+
+        def detect(indices):
+            # Frames of one session run in order, each uses the crop of the last
+            for i in indices:
+                session, image = items[i]
+                if session['tracker'] is None:
+                    session['tracker'] = TrackerState()
+                person = self._movenet.detect(image, state=session['tracker'])
+                results[i] = person_to_keypoints(person)
+
+        results = [None] * len(items)
+        by_session = {}
+        for i, (session, _) in enumerate(items):
+            by_session.setdefault(id(session), []).append(i)
+        if self._detect_pool is None:
+            for indices in by_session.values():
+                detect(indices)
+        else:
+            list(self._detect_pool.map(detect, by_session.values()))
+        return results
+
+    def _classify_batch(self, keypoints):
+        probabilities = self._classifier.predict_keypoints(np.stack(keypoints))
+        return list(probabilities)
+
+    def classify(self, session_id, keypoints=None, image=None, target=None,
+                 timestamp=None):
+        """Label, confidence, class probabilities and hold state of one frame.
+
+        The hold of the session is tracked for target, any pose if None, at
+        timestamp (seconds, default: arrival time).
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        session = self._session(session_id)
+        if image is not None:
+            keypoints = self.detector.submit((session, image)).result()
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(17, 3)
+        reused = self._gate(session, keypoints)
+        if reused:
+            probabilities = session['probabilities']
+        else:
+            probabilities = self.classifier.submit(keypoints).result()
+            session['probabilities'] = probabilities
+        best = int(probabilities.argmax())
+        class_names = self._classifier.class_names
+        label, confidence = class_names[best], float(probabilities[best])
+
+        with self._sessions_lock:
+            hold = session['hold']
+            if hold is None:
+                hold = session['hold'] = HoldTracker(target, **self._hold_options)
+            event = hold.update(label, confidence, float(timestamp))
+            hold_state = {'event': event, 'holding': hold.label,
+                          'duration': hold.duration,
+                          'best_streak': max(hold.best_streak, hold.duration)}
+        return {
+            'label': label,
+            'confidence': confidence,
+            'probabilities': {name: float(p) for name, p in
+                              zip(class_names, probabilities)},
+            'keypoints': keypoints.tolist(),
+            'hold': hold_state,
+            'reused': reused,
+        }
+
+    def _gate(self, session, keypoints):
+        """True when the session's last classification can be reused"""
+        if self._gate_options is None:
+            return False
+        embedding = landmarks_to_embedding(keypoints)[0]
+        with self._sessions_lock:
+            if session['gate'] is None:
+                session['gate'] = MotionGate(**self._gate_options)
+            reused = session['gate'].reuse(embedding) and \
+                session['probabilities'] is not None
+            self.gate_stats['frames'] += 1
+            self.gate_stats['reused'] += reused
+        return reused
+
+    def report(self):
+        with self._sessions_lock:
+            sessions = len(self._sessions)
+        gate = dict(self.gate_stats)
+        gate['reuse_rate'] = gate['reused'] / gate['frames'] if gate['frames'] else 0.0
+        return {'sessions': sessions, 'detector': self.detector.report(),
+                'classifier': self.classifier.report(), 'gate': gate}
+
+    def close(self):
+        self.detector.close()
+        self.classifier.close()
+        if self._detect_pool is not None:
+            self._detect_pool.shutdown()
+
+
+def decode_image(data):
+    """RGB array of a base64 encoded JPEG or PNG"""
+    import cv2
+
+    buffer = np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Cannot decode image')
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class PoseRequestHandler(BaseHTTPRequestHandler):
+    # Set by serve()
+    service = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, self.service.report())
+        else:
+            self._send(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            session_id = str(request.get('session', 'default'))
+            if self.path == '/classify':
+                image = request.get('image')
+                result = self.service.classify(
+                    session_id, keypoints=request.get('keypoints'),
+                    image=decode_image(image) if image else None,
+                    target=request.get('target'),
+                    timestamp=request.get('timestamp'))
+                self._send(200, result)
+            elif self.path == '/summary':
+                self._send(200, {'summary': self.service.summary(session_id)})
+            elif self.path == '/reset':
+                self._send(200, {'summary': self.service.reset(session_id)})
+            else:
+                self._send(404, {'error': f"Unknown path {self.path}"})
+        except (ValueError, TypeError, KeyError) as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            # A failed batch must not drop the connection without a response
+            traceback.print_exc()
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        # One line per frame would drown the console
+        pass
+
+
+class PoseHTTPServer(ThreadingHTTPServer):
+    # Many clients connect at once, the default backlog of 5 resets them
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def serve(service, host='127.0.0.1', port=8765):
+    """PoseHTTPServer for a PoseService, call serve_forever() on it"""
+    handler = type('Handler', (PoseRequestHandler,), {'service': service})
+    return PoseHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the pose classifier over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--classifier', default='numpy', choices=['numpy', 'tflite'])
+    parser.add_argument('--max-batch', type=int, default=32,
+                        help='most requests run in one batch')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help='how long a batch waits for more requests')
+    parser.add_argument('--session-timeout', type=float, default=60.0,
+                        help='seconds after which an idle session is dropped')
+    parser.add_argument('--movenet-workers', type=int, default=1,
+                        help='MoveNet interpreters shared by all sessions')
+    parser.add_argument('--keypoints-only', action='store_true',
+                        help='do not load MoveNet, reject image requests')
+    add_hold_arguments(parser)
+    add_gate_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+
+    tracer = tracer_from_args(args)
+    movenet_loader = None
+    if not args.keypoints_only:
+        from live_keypoints import download_movenet
+
+        def movenet_loader():
+            from movenet import MovenetPool
+            download_movenet()
+            return MovenetPool('movenet_thunder', args.movenet_workers, tracer)
+    service = PoseService(load_classifier(load_config(args.config), args.classifier),
+                          movenet_loader, args.max_batch,
+                          args.max_wait_ms / 1000, args.session_timeout,
+                          hold_options(args), gate_options(args))
+    server = serve(service, args.host, args.port)
+    print(f"Serving pose classification on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        tracer.close()
+        print(json.dumps(service.report(), indent=2))
+        print_summary(tracer)
+
+
+if __name__ == '__main__':
+    main()
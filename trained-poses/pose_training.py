@@ -0,0 +1,701 @@
+"""
+Config driven training of the pose classifier
+
+Usage:
+    python pose_training.py [--config training_config.json] [--force]
+                            [--incremental]
+
+The pipeline runs in four stages: load the keypoint CSVs, embed the
+landmarks, train the classifier and export it for TensorFlow.js. Each stage
+is cached by the hash of its inputs, so only the stages whose inputs changed
+run again. The class registry from the config is exported next to
+model/model.json so the frontend uses the same class indices as the model.
+
+Besides the classifier on 34 float embeddings, the export writes a graph
+model that takes the raw [17, 3] MoveNet keypoints and does the landmark
+normalization itself (PoseEmbedding), so clients only call predict.
+
+With --incremental the train stage warm starts from the existing checkpoint
+and widens its output layer for classes appended to the registry, see the
+"incremental" section of the training config.
+
+With "memory_limit_mb" in the data section the stages stream instead of
+loading whole datasets: the CSVs are read and embedded in blocks sized to
+the limit into .npy files, and training and evaluation read their batches
+from those files, so memory stays flat as the dataset grows. The one array
+that grows with the rows is the shuffled training order, 4 bytes a row.
+"""
+
+import argparse
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow import keras
+from sklearn.model_selection import train_test_split
+
+from data import BodyPart
+from dataset_stats import DatasetStats
+from pose_config import ClassRegistry, DEFAULT_CONFIG_PATH, chunk_rows, load_config
+from stage_cache import StageCache, digest, file_digest
+
+# Bump when the embedding math changes so cached embeddings are rebuilt
+EMBEDDING_VERSION = 2
+
+
+# loading final csv file
+def load_csv(csv_path, registry):
+    """Loads a keypoint CSV, labels come from the registry not the CSV order"""
+    df = pd.read_csv(csv_path)
+    df.drop(['filename'], axis=1, inplace=True)
+
+    # Convert class names to lowercase for consistency
+    df['class_name'] = df['class_name'].str.lower()
+
+    classes = df.pop('class_name')
+    df.pop('class_no')
+    y = np.array([registry.index(name) for name in classes], dtype=np.int64)
+
+    X = df.astype('float64')
+    return X, y, classes.unique()
+
+
+def iter_keypoint_chunks(csv_path, registry, rows):
+    """Yields the rows of a keypoint CSV as ([n, 51] float32, labels) blocks"""
+    for df in pd.read_csv(csv_path, chunksize=rows):
+        df.drop(['filename', 'class_no'], axis=1, inplace=True)
+        classes = df.pop('class_name').str.lower()
+        y = np.array([registry.index(name) for name in classes], dtype=np.int64)
+        yield df.to_numpy(dtype=np.float32), y
+
+
+def _write_npy_header(f, dtype, shape):
+    np.lib.format.write_array_header_1_0(
+        f, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            'fortran_order': False, 'shape': shape})
+
+
+def stream_embed_csv(csv_path, registry, output_dir, rows):
+    """Embeds a keypoint CSV block by block into X.npy and y.npy.
+
+    Only one block of `rows` rows is in memory at a time. The arrays are
+    written with plain file writes, a memory map would keep every written
+    page resident.
+
+    Returns:
+      The number of rows.
+    """
+    count = sum(len(df) for df in pd.read_csv(csv_path, usecols=['class_name'],
+                                               chunksize=rows))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'X.npy'), 'wb') as X_file, \
+            open(os.path.join(output_dir, 'y.npy'), 'wb') as y_file:
+        _write_npy_header(X_file, np.float32, (count, 34))
+        _write_npy_header(y_file, np.int64, (count,))
+        for X, y in iter_keypoint_chunks(csv_path, registry, rows):
+            X_file.write(np.ascontiguousarray(preprocess_data(X)).tobytes())
+            y_file.write(y.tobytes())
+    return count
+
+
+def split_indices(count, test_size, seed=None):
+    """Shuffled row numbers split into (train, validation) views.
+
+    The one per-row array of the streamed training: 4 bytes a row, 4 MB
+    per million rows. Labels and embeddings stay in their files.
+    """
+    order = np.arange(count, dtype=np.int32 if count < 2**31 else np.int64)
+    np.random.default_rng(seed).shuffle(order)
+    # Rounded up like sklearn's train_test_split
+    validation = math.ceil(count * test_size)
+    return order[validation:], order[:validation]
+
+
+class NpyRows(object):
+    """Rows of a .npy file, read on demand.
+
+    Unlike a memory map, rows that were read do not stay resident, so an
+    epoch over the file does not grow the process by the size of the file.
+    Use it as a context manager, or close() it, to release the file.
+    """
+
+    def __init__(self, path):
+        header = np.load(path, mmap_mode='r')
+        self.shape, self.dtype, self._offset = header.shape, header.dtype, header.offset
+        del header
+        self._row_bytes = self.dtype.itemsize * int(np.prod(self.shape[1:]))
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def take(self, indices):
+        """The rows at indices, in that order"""
+        indices = np.asarray(indices, dtype=np.int64)
+        if not len(indices):
+            return np.empty((0,) + self.shape[1:], dtype=self.dtype)
+        order = np.argsort(indices, kind='stable')
+        ordered = indices[order]
+        # Runs of consecutive rows are read with one call each
+        breaks = np.flatnonzero(np.diff(ordered) != 1) + 1
+        starts = np.concatenate([[0], breaks])
+        stops = np.concatenate([breaks, [len(ordered)]])
+        buffer = bytearray(len(indices) * self._row_bytes)
+        view = memoryview(buffer)
+        with self._lock:
+            for start, stop in zip(starts, stops):
+                self._file.seek(self._offset + int(ordered[start]) * self._row_bytes)
+                self._file.readinto(view[start * self._row_bytes:stop * self._row_bytes])
+        rows = np.frombuffer(buffer, dtype=self.dtype).reshape((len(indices),) + self.shape[1:])
+        result = np.empty_like(rows)
+        result[order] = rows
+        return result
+
+    def close(self):
+        self._file.close()
+
+
+class EmbeddedBatches(keras.utils.Sequence):
+    """Batches of NpyRows embeddings and one-hot labels for model.fit"""
+
+    def __init__(self, rows, labels, num_classes, batch_size, indices=None,
+                 shuffle=False, seed=None):
+        """
+        Args:
+          rows: NpyRows of the embeddings.
+          labels: NpyRows of their class indices.
+          indices: Rows of the files in this set, all of them in file order
+            when None. With `shuffle` they are shuffled in place every epoch,
+            which needs no second per-row array.
+        """
+        super().__init__()
+        if shuffle and indices is None:
+            raise ValueError("Shuffled batches need the indices of their rows")
+        self._rows = rows
+        self._labels = labels
+        self._indices = indices
+        self._count = len(rows) if indices is None else len(indices)
+        self._num_classes = num_classes
+        self._batch_size = batch_size
+        self._shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+        if shuffle:
+            self._rng.shuffle(self._indices)
+
+    def __len__(self):
+        return math.ceil(self._count / self._batch_size)
+
+    def __getitem__(self, batch):
+        start = batch * self._batch_size
+        stop = min(start + self._batch_size, self._count)
+        if self._indices is None:
+            indices = np.arange(start, stop)
+        else:
+            indices = self._indices[start:stop]
+        return (self._rows.take(indices),
+                keras.utils.to_categorical(self._labels.take(indices), self._num_classes))
+
+    def on_epoch_end(self):
+        if self._shuffle:
+            self._rng.shuffle(self._indices)
+
+
+def load_embedded(embed_path):
+    """X, y, X_test and y_test written by the embed stage, streamed or not.
+
+    The streamed embed stage writes a directory of .npy files instead of one
+    .npz. Both are loaded whole here, for callers such as sweep.py and
+    crossval.py that need every row in memory anyway.
+    """
+    if os.path.isdir(embed_path):
+        return tuple(np.load(os.path.join(embed_path, split, name))
+                     for split in ('train', 'test') for name in ('X.npy', 'y.npy'))
+    with np.load(embed_path) as embedded:
+        return embedded['X'], embedded['y'], embedded['X_test'], embedded['y_test']
+
+
+def get_center_point(landmarks, left_bodypart, right_bodypart):
+    """Calculates the center point of the two given landmarks."""
+    left = tf.gather(landmarks, left_bodypart.value, axis=1)
+    right = tf.gather(landmarks, right_bodypart.value, axis=1)
+    center = left * 0.5 + right * 0.5
+    return center
+
+
+def get_pose_size(landmarks, torso_size_multiplier=2.5):
+    """Calculates pose size.
+
+    It is the maximum of two values:
+    * Torso size multiplied by `torso_size_multiplier`
+    * Maximum distance from pose center to any pose landmark
+
+    Landmarks have shape [n, 17, 2], one size is returned per pose.
+    """
+    # Hips center
+    hips_center = get_center_point(landmarks, BodyPart.LEFT_HIP,
+                                   BodyPart.RIGHT_HIP)
+
+    # Shoulders center
+    shoulders_center = get_center_point(landmarks, BodyPart.LEFT_SHOULDER,
+                                        BodyPart.RIGHT_SHOULDER)
+
+    # Torso size as the minimum body size
+    torso_size = tf.linalg.norm(shoulders_center - hips_center, axis=1)
+
+    # Dist to pose center
+    d = landmarks - tf.expand_dims(hips_center, axis=1)
+    # Max dist to pose center, the norm runs over the landmarks of each
+    # coordinate as in the frontend
+    max_dist = tf.reduce_max(tf.linalg.norm(d, axis=1), axis=1)
+
+    # Normalize scale
+    pose_size = tf.maximum(torso_size * torso_size_multiplier, max_dist)
+    return pose_size
+
+
+def normalize_pose_landmarks(landmarks):
+    """Normalizes the landmarks translation by moving the pose center to (0,0) and
+    scaling it to a constant pose size.
+    """
+    # Move landmarks so that the pose center becomes (0,0)
+    pose_center = get_center_point(landmarks, BodyPart.LEFT_HIP,
+                                   BodyPart.RIGHT_HIP)
+    landmarks = landmarks - tf.expand_dims(pose_center, axis=1)
+
+    # Scale the landmarks to a constant pose size
+    pose_size = get_pose_size(landmarks)
+    landmarks /= tf.reshape(pose_size, [-1, 1, 1])
+    return landmarks
+
+
+def landmarks_to_embedding(landmarks_and_scores):
+    """Converts a batch of [n, 51] or [n, 17, 3] keypoints into pose embeddings."""
+    # Reshape the flat input into a matrix with shape=(17, 3)
+    reshaped_inputs = tf.reshape(landmarks_and_scores, [-1, 17, 3])
+
+    # Normalize landmarks 2D
+    landmarks = normalize_pose_landmarks(reshaped_inputs[:, :, :2])
+    # Flatten the normalized landmark coordinates into a vector
+    embedding = tf.reshape(landmarks, [-1, 34])
+    return embedding
+
+
+class PoseEmbedding(keras.layers.Layer):
+    """landmarks_to_embedding as a layer, so exported models take raw keypoints"""
+
+    def call(self, inputs):
+        return landmarks_to_embedding(inputs)
+
+    def compute_output_shape(self, input_shape):
+        return (input_shape[0], 34)
+
+
+def preprocess_data(X_train, batch_size=8192):
+    """Embeds every keypoint row, returns a float32 array of shape [n, 34]"""
+    X_train = np.asarray(X_train, dtype=np.float64).reshape(-1, 51)
+    processed_X_train = [
+        landmarks_to_embedding(tf.constant(X_train[i:i + batch_size])).numpy()
+        for i in range(0, X_train.shape[0], batch_size)
+    ]
+    if not processed_X_train:
+        return np.zeros((0, 34), dtype=np.float32)
+    return np.concatenate(processed_X_train).astype(np.float32)
+
+
+def _activation(name):
+    # relu6 lives in tf.nn, plain keras activations are passed by name
+    return getattr(tf.nn, name, name)
+
+
+def build_model(num_classes, hidden_units=(128, 64), dropout=0.5,
+                activation='relu6'):
+    """Builds the dense classifier on top of the 34 float pose embedding"""
+    inputs = tf.keras.Input(shape=(34,))
+    layer = inputs
+    for units in hidden_units:
+        layer = keras.layers.Dense(units, activation=_activation(activation))(layer)
+        layer = keras.layers.Dropout(dropout)(layer)
+    outputs = keras.layers.Dense(num_classes, activation="softmax")(layer)
+
+    model = keras.Model(inputs, outputs)
+    model.compile(
+        optimizer='adam',
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    return model
+
+
+def build_keypoint_model(classifier):
+    """Wraps a trained classifier so that it takes [n, 17, 3] raw keypoints"""
+    inputs = tf.keras.Input(shape=(17, 3), name='keypoints')
+    outputs = classifier(PoseEmbedding(name='pose_embedding')(inputs))
+    return keras.Model(inputs, outputs)
+
+
+def export_keypoint_model(classifier, output_dir, saved_model_dir):
+    """Exports the keypoint model as a tfjs graph model.
+
+    Custom layers cannot be loaded by tf.loadLayersModel, so the model goes
+    through a SavedModel and is converted to a graph model that the frontend
+    loads with tf.loadGraphModel and calls once per frame.
+    """
+    import tensorflowjs as tfjs
+
+    model = build_keypoint_model(classifier)
+
+    @tf.function(input_signature=[
+        tf.TensorSpec([None, 17, 3], tf.float32, name='keypoints')])
+    def serve(keypoints):
+        return {'probabilities': model(keypoints, training=False)}
+
+    module = tf.Module()
+    module.model = model
+    tf.saved_model.save(module, saved_model_dir, signatures={'serving_default': serve})
+    tfjs.converters.convert_tf_saved_model(saved_model_dir, output_dir)
+    return model
+
+
+def expand_classifier(model, num_classes):
+    """Copies a classifier with a wider softmax layer for newly added classes.
+
+    The registry only ever appends classes, so the first outputs of the new
+    layer keep the weights of the old classes and only the new columns start
+    from scratch.
+    """
+    old_output = model.layers[-1]
+    old_kernel, old_bias = old_output.get_weights()
+    old_classes = old_kernel.shape[1]
+    if num_classes == old_classes:
+        return model, old_classes
+    if num_classes < old_classes:
+        raise ValueError(f"Checkpoint has {old_classes} classes but the registry "
+                         f"only {num_classes}, classes can only be appended")
+
+    features = model.layers[-2].output
+    outputs = keras.layers.Dense(num_classes, activation="softmax",
+                                 name=f'pose_classes_{num_classes}')(features)
+    expanded = keras.Model(model.inputs, outputs)
+
+    kernel, bias = expanded.layers[-1].get_weights()
+    kernel[:, :old_classes] = old_kernel
+    bias[:old_classes] = old_bias
+    expanded.layers[-1].set_weights([kernel, bias])
+    return expanded, old_classes
+
+
+def replay_sample(y, old_classes, per_class, seed=None):
+    """Indices of every new class row plus a sample of each old class"""
+    rng = np.random.default_rng(seed)
+    keep = [np.flatnonzero(y >= old_classes)]
+    for class_no in range(old_classes):
+        rows = np.flatnonzero(y == class_no)
+        keep.append(rng.choice(rows, min(per_class, len(rows)), replace=False))
+    return np.sort(np.concatenate(keep))
+
+
+def load_model(checkpoint_path):
+    """Loads a checkpoint written by the train stage"""
+    return keras.models.load_model(checkpoint_path,
+                                   custom_objects={'relu6': tf.nn.relu6})
+
+
+class TrainingPipeline(object):
+    """Runs the load, embed, train and export stages for one config"""
+
+    def __init__(self, config, force=False, incremental=False):
+        self.config = config
+        self.registry = ClassRegistry.from_config(config)
+        self.cache = StageCache(config['cache_dir'])
+        self._force = force
+        self._incremental = incremental
+        # Rows per block when data.memory_limit_mb asks for streamed stages
+        self._chunk_rows = None
+        if config['data'].get('memory_limit_mb'):
+            self._chunk_rows = chunk_rows(config)
+
+    def _fresh(self, stage, key, outputs=()):
+        if self._force or not self.cache.is_fresh(stage, key, outputs):
+            return False
+        print(f"[{stage}] up to date, skipping")
+        return True
+
+    def load(self):
+        """Stage 1: keypoint CSVs to float arrays and registry indices"""
+        data = self.config['data']
+        key = digest('load', file_digest(data['train_csv']),
+                     file_digest(data['test_csv']), self.registry.names)
+        if self._chunk_rows:
+            # The streamed embed stage reads the CSVs block by block itself
+            return key, None
+        path = self.cache.artifact('load', key, '.npz')
+
+        if not self._fresh('load', key, [path]):
+            print("Loading training data...")
+            X, y, class_names = load_csv(data['train_csv'], self.registry)
+            print("Loading test data...")
+            X_test, y_test, _ = load_csv(data['test_csv'], self.registry)
+            print(f"Classes found: {class_names}")
+            np.savez(path, X=X.to_numpy(), y=y,
+                     X_test=X_test.to_numpy(), y_test=y_test)
+            self.cache.record('load', key, [path])
+        return key, path
+
+    def calibration_keypoints(self, load_path):
+        """Training keypoints for int8 calibration, the first block when streamed"""
+        if load_path is None:
+            keypoints, _ = next(iter_keypoint_chunks(
+                self.config['data']['train_csv'], self.registry, self._chunk_rows))
+            return keypoints
+        with np.load(load_path) as loaded:
+            return loaded['X']
+
+    def embed(self, load_key, load_path):
+        """Stage 2: landmarks to normalized pose embeddings.
+
+        Returns the key and an .npz, or a directory of .npy files when
+        streamed. load_embedded() reads either.
+        """
+        key = digest('embed', load_key, EMBEDDING_VERSION)
+        if self._chunk_rows:
+            return self._embed_streamed(digest(key, 'streamed'))
+        path = self.cache.artifact('embed', key, '.npz')
+
+        if not self._fresh('embed', key, [path]):
+            print("Embedding landmarks...")
+            with np.load(load_path) as loaded:
+                X = preprocess_data(pd.DataFrame(loaded['X']))
+                X_test = preprocess_data(pd.DataFrame(loaded['X_test']))
+                np.savez(path, X=X, y=loaded['y'],
+                         X_test=X_test, y_test=loaded['y_test'])
+            self.cache.record('embed', key, [path])
+        return key, path
+
+    def _embed_streamed(self, key):
+        """Embed stage in blocks, into train/ and test/ X.npy and y.npy files"""
+        data = self.config['data']
+        path = self.cache.artifact('embed', key)
+
+        if not self._fresh('embed', key, [path]):
+            print(f"Embedding landmarks in blocks of {self._chunk_rows} rows...")
+            for split, csv_path in [('train', data['train_csv']), ('test', data['test_csv'])]:
+                rows = stream_embed_csv(csv_path, self.registry,
+                                        os.path.join(path, split), self._chunk_rows)
+                print(f"{split}: {rows} rows")
+            self.cache.record('embed', key, [path])
+        return key, path
+
+    def train(self, embed_key, embed_path):
+        """Stage 3: fit the classifier, keeping the best validation checkpoint"""
+        data = self.config['data']
+        training = self.config['training']
+        checkpoint_path = training['checkpoint']
+        warm_start = self._incremental and os.path.exists(checkpoint_path)
+        start = None
+        if warm_start:
+            start = file_digest(checkpoint_path)
+            previous = self.cache.entry('train')
+            # The checkpoint is also this stage's output. When it is still the
+            # one the last run wrote, key on what that run started from, or
+            # every incremental run would look new to the next one.
+            if previous and previous['outputs'].get(checkpoint_path) == start:
+                start = previous.get('start')
+        key = digest('train', embed_key, self.config['model'], training,
+                     data['validation_split'], data['seed'], len(self.registry),
+                     start)
+
+        if not self._fresh('train', key, [checkpoint_path]):
+            if self._chunk_rows:
+                # Split row indices, embeddings and labels are read per batch
+                X_path = os.path.join(embed_path, 'train', 'X.npy')
+                y_path = os.path.join(embed_path, 'train', 'y.npy')
+                X_train, X_val = split_indices(len(np.load(y_path, mmap_mode='r')),
+                                               data['validation_split'], data['seed'])
+                y_train = None
+                if warm_start and training['incremental']['head_only']:
+                    # The replay sample picks rows by class
+                    with NpyRows(y_path) as labels:
+                        y_train = labels.take(X_train)
+            else:
+                with np.load(embed_path) as embedded:
+                    X, y = embedded['X'], embedded['y']
+                X_train, X_val, y_train, y_val = train_test_split(
+                    X, y, test_size=data['validation_split'],
+                    random_state=data['seed'])
+
+            print(f"Number of classes: {len(self.registry)}")
+            if warm_start:
+                model, X_train, y_train = self._warm_start(checkpoint_path,
+                                                           X_train, y_train)
+                epochs = training['incremental']['epochs']
+                patience = training['incremental']['patience']
+            else:
+                model = build_model(len(self.registry), **self.config['model'])
+                epochs = training['epochs']
+                patience = training['patience']
+
+            # Add a checkpoint callback to store the checkpoint that has the highest
+            # validation accuracy.
+            checkpoint = keras.callbacks.ModelCheckpoint(checkpoint_path,
+                                         monitor='val_accuracy',
+                                         verbose=1,
+                                         save_best_only=True,
+                                         mode='max')
+            earlystopping = keras.callbacks.EarlyStopping(monitor='val_accuracy',
+                                                          patience=patience)
+
+            # Start training
+            print('--------------TRAINING----------------')
+            num_classes = len(self.registry)
+            if self._chunk_rows:
+                batch_size = training['batch_size']
+                with NpyRows(X_path) as rows, NpyRows(y_path) as labels:
+                    model.fit(EmbeddedBatches(rows, labels, num_classes, batch_size, X_train,
+                                              shuffle=True, seed=data['seed']),
+                              epochs=epochs,
+                              validation_data=EmbeddedBatches(rows, labels, num_classes,
+                                                              batch_size, X_val),
+                              callbacks=[checkpoint, earlystopping])
+            else:
+                model.fit(X_train, keras.utils.to_categorical(y_train, num_classes),
+                          epochs=epochs,
+                          batch_size=training['batch_size'],
+                          validation_data=(X_val, keras.utils.to_categorical(y_val, num_classes)),
+                          callbacks=[checkpoint, earlystopping])
+            self.cache.record('train', key, [checkpoint_path], start=start)
+        return key, checkpoint_path
+
+    def _warm_start(self, checkpoint_path, X_train, y_train):
+        """Previous checkpoint with its output widened to the registry"""
+        incremental = self.config['training']['incremental']
+        model, old_classes = expand_classifier(load_model(checkpoint_path),
+                                               len(self.registry))
+        print(f"Warm start from {checkpoint_path}: {old_classes} known classes, "
+              f"{len(self.registry) - old_classes} new")
+
+        # The checkpoint keeps the trainable flags of the last run, a full
+        # fine-tune after a head-only one has to unfreeze the layers again
+        for layer in model.layers[:-1]:
+            layer.trainable = not incremental['head_only']
+        if incremental['head_only']:
+            # Only the softmax layer learns, on the new classes plus a replay
+            # sample of the old ones so they are not forgotten
+            rows = replay_sample(y_train, old_classes,
+                                 incremental['replay_per_class'],
+                                 self.config['data']['seed'])
+            X_train, y_train = X_train[rows], y_train[rows]
+            print(f"Training the output layer on {len(rows)} rows")
+
+        model.compile(
+            optimizer=keras.optimizers.Adam(incremental['learning_rate']),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        return model, X_train, y_train
+
+    def evaluate(self, model, embed_path):
+        """Loss and accuracy of a model on the embedded test set"""
+        if self._chunk_rows:
+            print('-----------------EVALUATION----------------')
+            with NpyRows(os.path.join(embed_path, 'test', 'X.npy')) as rows, \
+                    NpyRows(os.path.join(embed_path, 'test', 'y.npy')) as labels:
+                loss, accuracy = model.evaluate(EmbeddedBatches(
+                    rows, labels, len(self.registry),
+                    self.config['training']['batch_size']))
+            print('LOSS: ', loss)
+            print("ACCURACY: ", accuracy)
+            return loss, accuracy
+
+        with np.load(embed_path) as embedded:
+            X_test, y_test = embedded['X_test'], embedded['y_test']
+        y_test = keras.utils.to_categorical(y_test, num_classes=len(self.registry))
+
+        print('-----------------EVALUATION----------------')
+        loss, accuracy = model.evaluate(X_test, y_test)
+        print('LOSS: ', loss)
+        print("ACCURACY: ", accuracy)
+        return loss, accuracy
+
+    def export(self, train_key, model, load_path):
+        """Stage 4: TensorFlow.js, NumPy and TFLite models plus the class registry"""
+        export = self.config['export']
+        tfjs_dir = export['tfjs_dir']
+        key = digest('export', train_key, export, self.registry.to_dict())
+
+        outputs = [tfjs_dir]
+        if export.get('keypoints_dir'):
+            outputs.append(export['keypoints_dir'])
+
+        if not self._fresh('export', key, outputs):
+            import tensorflowjs as tfjs
+
+            # Save the model in TensorFlow.js format
+            tfjs.converters.save_keras_model(model, tfjs_dir)
+            self.registry.save(os.path.join(tfjs_dir, export['classes_file']))
+            stats = DatasetStats.load(refresh=False)
+            stats.update_model(key[:12], self.registry.names, tfjs_dir)
+            stats.save()
+            if export.get('numpy_file'):
+                from export_numpy import export_npz
+                export_npz(model, os.path.join(tfjs_dir, export['numpy_file']),
+                           self.registry)
+            if export.get('tflite_file'):
+                from export_tflite import calibration_inputs, export_tflite
+                calibration_data = None
+                if export['tflite_int8']:
+                    calibration_data = calibration_inputs(
+                        self.calibration_keypoints(load_path), export['tflite_fused'])
+                export_tflite(model, os.path.join(tfjs_dir, export['tflite_file']),
+                              export['tflite_fused'], calibration_data)
+            print('tfjs model saved at ', tfjs_dir)
+
+            if export.get('keypoints_dir'):
+                keypoints_dir = export['keypoints_dir']
+                export_keypoint_model(model, keypoints_dir,
+                                      self.cache.artifact('saved_model', key))
+                self.registry.save(os.path.join(keypoints_dir, export['classes_file']))
+                print('tfjs keypoint model saved at ', keypoints_dir)
+            self.cache.record('export', key, outputs)
+        return key, tfjs_dir
+
+    def run(self):
+        load_key, load_path = self.load()
+        embed_key, embed_path = self.embed(load_key, load_path)
+        train_key, checkpoint_path = self.train(embed_key, embed_path)
+
+        model = load_model(checkpoint_path)
+        loss, accuracy = self.evaluate(model, embed_path)
+        self.export(train_key, model, load_path)
+        return {'model': model, 'loss': loss, 'accuracy': accuracy}
+
+
+def run(config_path=DEFAULT_CONFIG_PATH, force=False, incremental=False):
+    """Trains and exports the classifier described by a config file"""
+    return TrainingPipeline(load_config(config_path), force=force,
+                            incremental=incremental).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the pose classifier')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH,
+                        help='training config file')
+    parser.add_argument('--force', action='store_true',
+                        help='run every stage even if its inputs are unchanged')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fine-tune the existing checkpoint instead of training from scratch')
+    args = parser.parse_args(argv)
+    run(args.config, force=args.force, incremental=args.incremental)
+
+
+if __name__ == '__main__':
+    main()
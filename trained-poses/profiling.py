@@ -0,0 +1,225 @@
+"""
+Timing spans of the detection hot path
+
+Movenet, MovenetPool and Preprocessor take an optional `tracer`. With one
+they time their stages as spans:
+
+    preprocess    crop and resize of the MoveNet input
+    invoke        set_tensor, invoke and get_tensor on the interpreter
+    postprocess   keypoints from crop to image coordinates
+    crop_update   the crop region for the next frame
+    to_person     the keypoints to a data.Person
+    io            reading and decoding images, writing the CSVs
+
+A Tracer hands every span to its sinks:
+
+    tracer = Tracer(HistogramSink(), ChromeTraceSink('trace.json'))
+    movenet = Movenet('movenet_thunder', tracer=tracer)
+    ...
+    tracer.close()      # writes the files
+    print(tracer.sinks[0].summary())
+
+HistogramSink keeps bounded log-scale histograms per span name, JsonlSink
+writes one JSON line per span, ChromeTraceSink writes the trace event format
+read by chrome://tracing and Perfetto. Without a tracer the code uses
+NULL_TRACER, whose span() returns a shared no-op context manager.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer(object):
+    """Tracer that records nothing"""
+
+    enabled = False
+    sinks = ()
+
+    def span(self, name, **args):
+        return _NULL_SPAN
+
+    def record(self, name, start, end, **args):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span(object):
+    __slots__ = ('_tracer', '_name', '_args', '_start')
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._tracer.record(self._name, self._start, time.perf_counter(), **self._args)
+        return False
+
+
+class Tracer(object):
+    """Times spans and passes them to every sink"""
+
+    enabled = True
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def span(self, name, **args):
+        """Context manager timing the code it wraps as one span"""
+        return _Span(self, name, args)
+
+    def record(self, name, start, end, **args):
+        """Adds a span timed by the caller, perf_counter() seconds"""
+        thread = threading.get_ident()
+        for sink in self.sinks:
+            sink.add(name, start, end - start, thread, args)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class HistogramSink(object):
+    """Counts span durations in log-scale buckets, 4 per power of two"""
+
+    BUCKETS_PER_OCTAVE = 4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def add(self, name, start, duration, thread, args):
+        micros = duration * 1e6
+        bucket = int(math.log2(micros) * self.BUCKETS_PER_OCTAVE) if micros > 1 else 0
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                span = self._spans[name] = {'count': 0, 'total': 0.0,
+                                            'max': 0.0, 'buckets': {}}
+            span['count'] += 1
+            span['total'] += micros
+            span['max'] = max(span['max'], micros)
+            span['buckets'][bucket] = span['buckets'].get(bucket, 0) + 1
+
+    def _percentile(self, span, fraction):
+        # Upper bound of the bucket holding the percentile
+        rank = fraction * span['count']
+        seen = 0
+        for bucket in sorted(span['buckets']):
+            seen += span['buckets'][bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / self.BUCKETS_PER_OCTAVE), span['max'])
+        return span['max']
+
+    def summary(self):
+        """Count, mean, p50/p95/p99 and max microseconds per span name"""
+        with self._lock:
+            return {name: {'count': span['count'],
+                           'mean_us': span['total'] / span['count'],
+                           'p50_us': self._percentile(span, 0.5),
+                           'p95_us': self._percentile(span, 0.95),
+                           'p99_us': self._percentile(span, 0.99),
+                           'max_us': span['max']}
+                    for name, span in self._spans.items()}
+
+    def close(self):
+        pass
+
+
+class JsonlSink(object):
+    """Writes one JSON line per span"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'w')
+
+    def add(self, name, start, duration, thread, args):
+        line = json.dumps({'name': name, 'start': start, 'duration_us': duration * 1e6,
+                           'thread': thread, 'args': args})
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ChromeTraceSink(object):
+    """Collects complete events, written as a Chrome trace on close()"""
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._events = []
+        self._pid = os.getpid()
+
+    def add(self, name, start, duration, thread, args):
+        event = {'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6,
+                 'pid': self._pid, 'tid': thread}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def close(self):
+        with self._lock:
+            events, self._events = self._events, []
+        with open(self._path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def add_trace_arguments(parser):
+    """Command line options of the tracer"""
+    parser.add_argument('--trace', default=None,
+                        help='write the timing spans to this file, JSONL for a '
+                             '.jsonl name, otherwise Chrome trace format')
+    parser.add_argument('--trace-summary', action='store_true',
+                        help='print the span percentiles at the end')
+
+
+def tracer_from_args(args):
+    """Tracer for the --trace options, NULL_TRACER without any"""
+    sinks = []
+    if args.trace_summary:
+        sinks.append(HistogramSink())
+    if args.trace:
+        if args.trace.endswith('.jsonl'):
+            sinks.append(JsonlSink(args.trace))
+        else:
+            sinks.append(ChromeTraceSink(args.trace))
+    return Tracer(*sinks) if sinks else NULL_TRACER
+
+
+def print_summary(tracer):
+    """Prints the span percentiles of the tracer's HistogramSinks"""
+    for sink in tracer.sinks:
+        if isinstance(sink, HistogramSink):
+            for name, stats in sorted(sink.summary().items()):
+                print(f"  {name:>12}: {stats['count']:7d} spans  "
+                      f"mean {stats['mean_us']:9.1f}us  p50 {stats['p50_us']:9.1f}us  "
+                      f"p95 {stats['p95_us']:9.1f}us  p99 {stats['p99_us']:9.1f}us")
@@ -1,24 +1,43 @@
+"""
+Extract MoveNet keypoints from yoga_poses/ into train_data.csv and test_data.csv
+
+Importing this module does no work, stage_runner.py calls run() in process
+with a MoveNet it already loaded.
+"""
+
 import tensorflow as tf
 import numpy as np
 import pandas as pd 
 import os
-from movenet import Movenet
-import wget
 import csv
 import tqdm 
 from data import BodyPart
+from dataset_stats import SPLITS, update_dataset_stats
+from live_keypoints import keypoint_header, load_movenet, merge_live_rows
+from movenet import TrackerState
+from pose_config import DEFAULT_CHUNK_ROWS, ClassRegistry, chunk_rows, load_config
+from profiling import NULL_TRACER
 
-if('movenet_thunder.tflite' not in os.listdir()):
-    wget.download('https://tfhub.dev/google/lite-model/movenet/singlepose/thunder/tflite/float16/4?lite-format=tflite', 'movenet_thunder.tflite')
+# Loaded by the first detect() call without an explicit model
+_movenet = None
 
-movenet = Movenet('movenet_thunder')
+def get_movenet():
+    global _movenet
+    if _movenet is None:
+        _movenet = load_movenet('movenet_thunder')
+    return _movenet
 
-def detect(input_tensor, inference_count=3):
-    movenet.detect(input_tensor.numpy(), reset_crop_region=True)
+def detect(input_tensor, inference_count=3, movenet=None):
+    if movenet is None:
+        movenet = get_movenet()
+    image = input_tensor.numpy()
+    # Own crop state, the MoveNet may be shared with other callers
+    state = TrackerState()
+    detection = movenet.detect(image, reset_crop_region=True, state=state)
     
     for _ in range(inference_count - 1):
-        detection = movenet.detect(input_tensor.numpy(), 
-                                reset_crop_region=False)
+        detection = movenet.detect(image, 
+                                reset_crop_region=False, state=state)
     
     return detection
 
@@ -27,8 +46,15 @@ class Preprocessor(object):
 #     and save those keypoints in a csv file for the later use in the classification task 
 
         def __init__(self, images_in_folder,
-                    csvs_out_path):
+                    csvs_out_path, class_registry=None, movenet=None, tracer=None,
+                    chunk_rows=DEFAULT_CHUNK_ROWS):
             self._images_in_folder = images_in_folder
+            # Rows per block when the per class CSVs are merged
+            self._chunk_rows = chunk_rows
+            self._class_registry = class_registry
+            self._movenet = movenet
+            # profiling.Tracer timing the image reads and CSV writes
+            self._tracer = tracer or NULL_TRACER
             self._csvs_out_path = csvs_out_path
             self._csvs_out_folder_per_class = 'csv_per_pose'
             self._message = []
@@ -67,18 +93,19 @@ class Preprocessor(object):
                         image_path = os.path.join(images_in_folder, image_name)
                         
                         try:
-                            image = tf.io.read_file(image_path)
-                            image = tf.io.decode_jpeg(image)
+                            with self._tracer.span('io', op='read_image'):
+                                image = tf.io.read_file(image_path)
+                                image = tf.io.decode_jpeg(image)
                         except:
                             self._message.append('Skipped' + image_path + ' Invalid image')
                             continue
                         
                         # skip images that is not RGB
                         if image.shape[2] != 3:
-                            self.message.append('Skipped' + image_path + ' Image is not in RGB')
+                            self._message.append('Skipped' + image_path + ' Image is not in RGB')
                             continue
                         
-                        person = detect(image)
+                        person = detect(image, movenet=self._movenet)
                         
                         # Save landmarks if all landmarks above than the threshold
                         min_landmark_score = min([keypoint.score for keypoint in person.keypoints])
@@ -96,17 +123,52 @@ class Preprocessor(object):
                                   dtype=np.float32)
                         
                         # writing the landmark coordinates to its csv files
-                        coord = pose_landmarks.flatten().astype(np.str).tolist()
+                        coord = pose_landmarks.flatten().astype(str).tolist()
                         csv_out_writer.writerow([image_name] + coord)
                         
             print(self._message)
 
             # combine all per-csv class CSVs into a sigle csv file
-            all_landmarks_df = self.all_landmarks_as_dataframe()
-            all_landmarks_df.to_csv(self._csvs_out_path, index=False)
+            with self._tracer.span('io', op='write_csv'):
+                self.write_landmarks_csv(self._csvs_out_path)
+
+            # Keypoints recorded live by the collectors without a saved image
+            split = os.path.basename(os.path.normpath(self._images_in_folder))
+            merge_live_rows(split, self._csvs_out_path, self._class_registry)
+            if split in SPLITS:
+                update_dataset_stats([split])
 
         def class_names(self):
-            return self.pose_class_names
+            return self._pose_class_names
+
+        def write_landmarks_csv(self, csvs_out_path):
+            # Same file as all_landmarks_as_dataframe().to_csv(), but only
+            # one block of rows is in memory at a time
+            header_name = keypoint_header()
+            header_written = False
+            with open(csvs_out_path, 'w', newline='') as csv_out_file:
+                for class_index, class_name in enumerate(self._pose_class_names):
+                    csv_out_path = os.path.join(self._csvs_out_folder_per_class,
+                                                   class_name + '.csv'
+                                               )
+                    # No image of the class passed the threshold
+                    if os.path.getsize(csv_out_path) == 0:
+                        continue
+
+                    # The registry owns the class numbers, folder order is only a fallback
+                    if self._class_registry is not None:
+                        class_index = self._class_registry.index(class_name)
+
+                    for block in pd.read_csv(csv_out_path, header=None,
+                                             names=header_name[:-2],
+                                             chunksize=self._chunk_rows):
+                        block['class_no'] = class_index
+                        block['class_name'] = class_name
+                        block['filename'] = class_name + '/' + block['filename']
+                        block.to_csv(csv_out_file, header=not header_written, index=False)
+                        header_written = True
+                if not header_written:
+                    csv_out_file.write(','.join(header_name) + '\n')
         
         def all_landmarks_as_dataframe(self):
             # Merging all csv for each class into a single csv file
@@ -117,6 +179,10 @@ class Preprocessor(object):
                                            )
                 per_class_df = pd.read_csv(csv_out_path, header=None)
                 
+                # The registry owns the class numbers, folder order is only a fallback
+                if self._class_registry is not None:
+                    class_index = self._class_registry.index(class_name)
+                
                 # Add the labels
                 per_class_df['class_no'] = [class_index]*len(per_class_df)
                 per_class_df['class_name'] = [class_name]*len(per_class_df)
@@ -146,23 +212,40 @@ class Preprocessor(object):
 
 
 
-# preprocess training data
-images_in_folder = os.path.join('yoga_poses', 'train')
-csvs_out_path = 'train_data.csv'
-train_preprocessor = Preprocessor(
-    images_in_folder,
-    csvs_out_path
-)
-train_preprocessor.process()   
-
-# preprocessing testing data
-images_in_folder = os.path.join('yoga_poses', 'test')
-csvs_out_path = 'test_data.csv'
-test_preprocessor = Preprocessor(
-    images_in_folder,
-    csvs_out_path
-)
-test_preprocessor.process()
-            
-            
-                        
\ No newline at end of file
+def run(movenet=None, class_registry=None, tracer=None):
+    """Preprocesses the training and the testing images"""
+    config = load_config()
+    if class_registry is None:
+        class_registry = ClassRegistry.from_config(config)
+    rows = chunk_rows(config)
+    
+    # preprocess training data
+    images_in_folder = os.path.join('yoga_poses', 'train')
+    csvs_out_path = 'train_data.csv'
+    train_preprocessor = Preprocessor(
+        images_in_folder,
+        csvs_out_path,
+        class_registry,
+        movenet,
+        tracer,
+        rows
+    )
+    train_preprocessor.process()   
+    
+    # preprocessing testing data
+    images_in_folder = os.path.join('yoga_poses', 'test')
+    csvs_out_path = 'test_data.csv'
+    test_preprocessor = Preprocessor(
+        images_in_folder,
+        csvs_out_path,
+        class_registry,
+        movenet,
+        tracer,
+        rows
+    )
+    test_preprocessor.process()
+    return True
+
+
+if __name__ == '__main__':
+    run()
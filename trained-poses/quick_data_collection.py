@@ -4,10 +4,14 @@ This will help you quickly collect training data for the 5 manual poses
 so they can work with camera detection.
 """
 
+import argparse
 import cv2
 import os
 import time
 
+from capture_engine import (CaptureEngine, add_capture_arguments, capture_options,
+                            capture_samples)
+
 # Manual poses that need training data
 POSES = {
     'mountain': {
@@ -32,7 +36,7 @@ POSES = {
     }
 }
 
-def collect_pose_images(pose_key, pose_info, samples_per_set=50):
+def collect_pose_images(pose_key, pose_info, samples_per_set=50, options=None):
     """Collect training images for a specific pose"""
     print(f"\n=== {pose_info['name']} ===")
     print(f"Instructions: {pose_info['instruction']}")
@@ -54,7 +58,7 @@ def collect_pose_images(pose_key, pose_info, samples_per_set=50):
     print("Hold the pose and move slightly for variation")
     print("Press 'q' to finish early")
     
-    success = collect_images(cap, pose_key, 'train', samples_per_set)
+    success = collect_images(cap, pose_key, 'train', samples_per_set, options)
     if not success:
         cap.release()
         return False
@@ -65,72 +69,31 @@ def collect_pose_images(pose_key, pose_info, samples_per_set=50):
     # Collect test data
     print(f"\n--- TEST DATA ---")
     print("Now collecting test images (fewer samples)")
-    collect_images(cap, pose_key, 'test', samples_per_set//2)
+    collect_images(cap, pose_key, 'test', samples_per_set//2, options)
     
     cap.release()
     cv2.destroyAllWindows()
     return True
 
-def collect_images(cap, pose_key, data_type, num_samples):
+def collect_images(cap, pose_key, data_type, num_samples, options=None):
     """Collect images for training or test"""
     base_dir = f'yoga_poses/{data_type}/{pose_key}'
     
-    # Get existing file count
-    existing_files = []
-    if os.path.exists(base_dir):
-        existing_files = [f for f in os.listdir(base_dir) if f.endswith('.jpg')]
-    start_idx = len(existing_files) // 2  # Divide by 2 for flipped versions
-    
-    collected = 0
-    capturing = False
-    
-    while collected < num_samples:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error reading from camera")
-            return False
-        
-        # Add text overlay
-        display_frame = frame.copy()
-        cv2.putText(display_frame, f"{POSES[pose_key]['name']} - {data_type.upper()}", 
-                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(display_frame, f"Collected: {collected}/{num_samples}", 
-                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        
-        if capturing:
-            cv2.putText(display_frame, "CAPTURING - Hold pose!", 
-                       (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            
-            # Save image
-            filename = f"{pose_key}_{data_type}_{start_idx + collected:04d}.jpg"
-            filepath = os.path.join(base_dir, filename)
-            cv2.imwrite(filepath, frame)
-            
-            # Save flipped version
-            flipped = cv2.flip(frame, 1)
-            flipped_filename = f"{pose_key}_{data_type}_{start_idx + collected:04d}_flipped.jpg"
-            flipped_filepath = os.path.join(base_dir, flipped_filename)
-            cv2.imwrite(flipped_filepath, flipped)
-            
-            collected += 1
-            time.sleep(0.2)  # Small delay between captures
-            
-        else:
-            cv2.putText(display_frame, "Press SPACE to start, 'q' to quit", 
-                       (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-        
-        cv2.imshow('Data Collection', display_frame)
-        
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord(' '):
-            capturing = not capturing
-        elif key == ord('q'):
-            break
+    collected = capture_samples(CaptureEngine(cap, **(options or {})), base_dir,
+                                f"{pose_key}_{data_type}", num_samples,
+                                f"{POSES[pose_key]['name']} - {data_type.upper()}",
+                                interval=0.2)
+    if collected is None:
+        return False
     
     print(f"✓ Collected {collected} samples for {pose_key} {data_type}")
     return True
 
 def main():
+    parser = argparse.ArgumentParser(description='Quick data collection for manual poses')
+    add_capture_arguments(parser)
+    options = capture_options(parser.parse_args())
+    
     print("=== QUICK POSE DATA COLLECTION ===")
     print("This will collect training data for manual poses so they work with camera detection.")
     print(f"\nPoses to collect: {len(POSES)}")
@@ -153,7 +116,7 @@ def main():
             pose_keys = list(POSES.keys())
             if 0 <= selection < len(pose_keys):
                 selected_pose = pose_keys[selection]
-                collect_pose_images(selected_pose, POSES[selected_pose])
+                collect_pose_images(selected_pose, POSES[selected_pose], options=options)
             else:
                 print("Invalid selection")
         except ValueError:
@@ -166,7 +129,7 @@ def main():
         print(f"\n[{i+1}/{total_poses}] Starting {pose_info['name']}")
         input("Press ENTER when ready...")
         
-        success = collect_pose_images(pose_key, pose_info)
+        success = collect_pose_images(pose_key, pose_info, options=options)
         if not success:
             print(f"Failed to collect data for {pose_key}")
             continue
@@ -11,6 +11,8 @@ import os
 import sys
 import subprocess
 
+from stage_runner import StageRunner, pose_pipeline, print_report, succeeded
+
 def run_command(cmd):
     """Run a command and handle errors"""
     print(f"\nRunning: {cmd}")
@@ -21,6 +23,12 @@ def run_command(cmd):
     print(result.stdout)
     return True
 
+def run_stages(*targets):
+    """Brings pipeline stages up to date, skipping unchanged ones"""
+    report = StageRunner(pose_pipeline()).run(list(targets))
+    print_report(report)
+    return succeeded(report)
+
 def check_requirements():
     """Check if all required packages are installed"""
     print("Checking requirements...")
@@ -93,7 +101,7 @@ def main():
     process = input("\nDo you want to process the images now? (y/n): ")
     if process.lower() == 'y':
         print("\nProcessing images... This may take several minutes.")
-        if run_command("python proprocessing.py"):
+        if run_stages('preprocess'):
             print("✓ Image processing complete")
         else:
             print("Error processing images. Please check the error messages above.")
@@ -106,7 +114,7 @@ def main():
     train = input("\nDo you want to train the model now? (y/n): ")
     if train.lower() == 'y':
         print("\nTraining model... This may take 10-30 minutes depending on your hardware.")
-        if run_command("python training_all_poses.py"):
+        if run_stages('train'):
             print("✓ Model training complete")
         else:
             print("Error training model. Please check the error messages above.")
@@ -121,11 +129,11 @@ def main():
     
     copy = input("\nDo you want to copy the model files now? (y/n): ")
     if copy.lower() == 'y':
-        import shutil
         try:
-            shutil.copy('model/model.json', '../frontend/public/model.json')
-            shutil.copy('model/group1-shard1of1.bin', '../frontend/public/group1-shard1of1.bin')
-            print("✓ Model files copied to frontend")
+            if run_stages('copy_model'):
+                print("✓ Model files copied to frontend")
+            else:
+                print("Please copy the files manually")
         except Exception as e:
             print(f"Error copying files: {e}")
             print("Please copy the files manually")
@@ -0,0 +1,65 @@
+"""
+NumPy arrays shared with worker processes through shared memory
+
+sweep.py and crossval.py train many models on the same embeddings. The
+parent copies them once into shared memory blocks and every worker attaches
+read only views instead of receiving its own pickled copy:
+
+    blocks, specs = share_arrays({'X': X, 'y': y})
+    try:
+        with ProcessPoolExecutor(initializer=init_worker,
+                                 initargs=(threads, specs)) as executor:
+            ...     # in the worker: shared['X'], shared['y']
+    finally:
+        release(blocks)
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Arrays attached from shared memory, set once per worker process
+shared = {}
+
+
+def share_arrays(arrays):
+    """Copies arrays into shared memory blocks, returns the blocks and specs"""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """Read only views on arrays shared by share_arrays()"""
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+    return blocks, arrays
+
+
+def init_worker(threads, specs):
+    """Process pool initializer: pins TF threads and fills `shared`"""
+    # Must run before the worker executes any TF op
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    blocks, arrays = attach_arrays(specs)
+    shared['blocks'] = blocks
+    shared.update(arrays)
+
+
+def release(blocks):
+    """Closes and frees the blocks returned by share_arrays()"""
+    for block in blocks:
+        block.close()
+        block.unlink()
@@ -0,0 +1,84 @@
+"""
+Content hashed cache for expensive pipeline stages
+
+A stage is identified by a key derived from the hashes of everything it
+depends on (input files, config values, upstream stage keys). When the key
+and the recorded output hashes still match, the stage can be skipped.
+"""
+
+import hashlib
+import json
+import os
+
+_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """sha256 of a file, or of every file below a directory"""
+    sha = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                sha.update(os.path.relpath(file_path, path).encode())
+                sha.update(file_digest(file_path).encode())
+        return sha.hexdigest()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def digest(*parts):
+    """sha256 of any JSON serialisable values, used to build stage keys"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageCache(object):
+    """Remembers the key and output hashes of the last run of each stage"""
+
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+        self._manifest_path = os.path.join(cache_dir, 'stages.json')
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._manifest = {}
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r') as f:
+                self._manifest = json.load(f)
+
+    def artifact(self, stage, key, extension=''):
+        """Path of a cache-owned artifact, addressed by the stage key"""
+        return os.path.join(self._cache_dir,
+                            f"{stage}-{key[:16]}{extension}")
+
+    def is_fresh(self, stage, key, outputs=()):
+        """True when the stage last ran with this key and its outputs are intact"""
+        entry = self._manifest.get(stage)
+        if entry is None or entry['key'] != key:
+            return False
+        for path in outputs:
+            if not os.path.exists(path):
+                return False
+            if entry['outputs'].get(path) != file_digest(path):
+                return False
+        return True
+
+    def entry(self, stage):
+        """The recorded key, output hashes and extras of a stage, or None"""
+        return self._manifest.get(stage)
+
+    def record(self, stage, key, outputs=(), **extra):
+        """Stores the key and output hashes after a stage ran successfully.
+
+        Keyword arguments are stored with them, see entry().
+        """
+        self._manifest[stage] = dict(extra, key=key, outputs={
+            path: file_digest(path) for path in outputs})
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
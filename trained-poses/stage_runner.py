@@ -0,0 +1,322 @@
+"""
+Content addressed runner for the setup pipeline stages
+
+complete_setup.py, integrate_manual_poses.py and setup_manual_poses.py used
+to rerun preprocessing and training from scratch on every call. Here every
+stage declares its input and output files and the stages it depends on. A
+stage's key hashes its command, the content of its inputs (including every
+local module its scripts import) and the keys of its dependencies; a stage whose key and outputs match the last successful
+run is skipped. Every run reports the wall time of each stage.
+
+The pose pipeline stages are functions run in this process, so TensorFlow
+is imported once and a single MoveNet serves every preprocessing run.
+
+    runner = StageRunner(pose_pipeline())
+    runner.run(['copy_model'])   # runs (or skips) preprocess, train, ...
+"""
+
+import ast
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import traceback
+
+from pose_config import DEFAULT_CONFIG_PATH, load_config
+from stage_cache import StageCache, digest, file_digest
+
+FRONTEND_PUBLIC = os.path.join('..', 'frontend', 'public')
+FRONTEND_PAGES = [
+    os.path.join('..', 'frontend', 'src', 'pages', 'EnhancedYoga', 'EnhancedYoga.js'),
+    os.path.join('..', 'frontend', 'src', 'pages', 'Yoga', 'Yoga.js'),
+]
+
+
+class Stage(object):
+    """One pipeline step, a command line or a Python callable"""
+
+    def __init__(self, name, command, inputs=(), outputs=(), deps=(),
+                 params=None, timeout=None):
+        """
+        Args:
+          name: Unique stage name.
+          command: argv list run as a subprocess, or a callable that returns
+            a truthy value on success.
+          inputs: Files or directories whose content the outputs depend on.
+            Missing inputs are allowed, their absence is part of the key.
+          outputs: Files the stage writes, checked before skipping it.
+          deps: Names of the stages that have to run first.
+          params: JSON serialisable arguments of the command, part of the key.
+          timeout: Seconds after which a subprocess stage fails.
+        """
+        self.name = name
+        self.command = command
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.params = params or {}
+        self.timeout = timeout
+
+    def describe(self):
+        if callable(self.command):
+            return f"{self.command.__module__}.{self.command.__qualname__}"
+        return ' '.join(self.command)
+
+
+class StageRunner(object):
+    """Runs stages in dependency order, skipping the up to date ones"""
+
+    def __init__(self, stages, cache_dir='.train_cache', force=False):
+        self.stages = {stage.name: stage for stage in stages}
+        # Separate from the stages of pose_training.TrainingPipeline
+        cache_dir = os.path.join(cache_dir, 'pipeline')
+        self._cache = StageCache(cache_dir)
+        self._force = force
+        # Content hashes of unchanged files are looked up by size and mtime
+        self._digests_path = os.path.join(cache_dir, 'file_digests.json')
+        self._digests = {}
+        if os.path.exists(self._digests_path):
+            with open(self._digests_path, 'r') as f:
+                self._digests = json.load(f)
+
+    def _file_digest(self, path):
+        stat = os.stat(path)
+        known = self._digests.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        sha = file_digest(path)
+        self._digests[path] = [stat.st_size, stat.st_mtime_ns, sha]
+        return sha
+
+    def input_digest(self, path):
+        """Content hash of a file or directory tree, None if it is missing"""
+        if not os.path.exists(path):
+            return None
+        if not os.path.isdir(path):
+            return self._file_digest(path)
+        entries = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                entries.append((os.path.relpath(file_path, path),
+                                self._file_digest(file_path)))
+        return digest(entries)
+
+    def order(self, targets=None):
+        """Stage names in dependency order, limited to what targets need"""
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependency cycle at {name}")
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in (targets or list(self.stages)):
+            visit(name)
+        return ordered
+
+    def _execute(self, stage):
+        if callable(stage.command):
+            return bool(stage.command())
+        result = subprocess.run(stage.command, timeout=stage.timeout)
+        return result.returncode == 0
+
+    def run(self, targets=None):
+        """Runs the targets and their dependencies.
+
+        Returns:
+          A list of (stage, status, seconds) with status 'ran', 'skipped' or
+          'failed'. Stages after a failure are not run.
+        """
+        keys, report = {}, []
+        try:
+            for name in self.order(targets):
+                stage = self.stages[name]
+                start = time.perf_counter()
+                key = digest(name, stage.describe(), stage.params,
+                             [(path, self.input_digest(path)) for path in stage.inputs],
+                             [keys[dep] for dep in stage.deps])
+                keys[name] = key
+
+                if not self._force and self._cache.is_fresh(name, key, stage.outputs):
+                    status = 'skipped'
+                else:
+                    print(f"\n[{name}] {stage.describe()}")
+                    try:
+                        ok = self._execute(stage)
+                    except subprocess.TimeoutExpired:
+                        print(f"[{name}] timed out after {stage.timeout}s")
+                        ok = False
+                    except Exception:
+                        traceback.print_exc()
+                        ok = False
+                    missing = [path for path in stage.outputs if not os.path.exists(path)]
+                    if ok and missing:
+                        print(f"[{name}] did not write {', '.join(missing)}")
+                        ok = False
+                    status = 'ran' if ok else 'failed'
+                    if ok:
+                        self._cache.record(name, key, stage.outputs)
+
+                seconds = time.perf_counter() - start
+                report.append((name, status, seconds))
+                print(f"[{name}] {status} in {seconds:.1f}s")
+                if status == 'failed':
+                    break
+        finally:
+            self._save_digests()
+        return report
+
+    def _save_digests(self):
+        tmp_path = self._digests_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._digests, f)
+        os.replace(tmp_path, self._digests_path)
+
+
+def succeeded(report):
+    return bool(report) and all(status != 'failed' for _, status, _ in report)
+
+
+def print_report(report):
+    print('\n---------------STAGES---------------')
+    for name, status, seconds in report:
+        print(f"{name:>12}: {status:<8} {seconds:8.1f}s")
+
+
+def copy_model_files(model_dir='model', frontend_public=FRONTEND_PUBLIC):
+    """Copies the tfjs classifier into the frontend"""
+    if not os.path.exists(frontend_public):
+        print(f"Frontend directory not found: {frontend_public}")
+        return False
+    shutil.copy(os.path.join(model_dir, 'model.json'),
+                os.path.join(frontend_public, 'model.json'))
+    shutil.copy(os.path.join(model_dir, 'group1-shard1of1.bin'),
+                os.path.join(frontend_public, 'group1-shard1of1.bin'))
+    return True
+
+
+# MoveNet shared by all preprocessing runs of this process
+_movenet = None
+
+
+def shared_movenet():
+    global _movenet
+    if _movenet is None:
+        from live_keypoints import load_movenet
+        _movenet = load_movenet('movenet_thunder')
+    return _movenet
+
+
+def preprocess():
+    import proprocessing
+    return proprocessing.run(movenet=shared_movenet())
+
+
+def train(config_path, incremental):
+    import pose_training
+    return pose_training.run(config_path, incremental=incremental)
+
+
+def enable_poses():
+    import enable_manual_poses
+    return enable_manual_poses.main()
+
+
+def module_inputs(*scripts):
+    """The scripts and every local module they import, directly or not.
+
+    A stage's behaviour depends on all of the code it runs, so its key
+    hashes the modules next to its entry script that it reaches through
+    import statements, including the lazy ones inside functions.
+    """
+    folder = os.path.dirname(scripts[0]) if scripts else ''
+    pending, found = list(scripts), set()
+    while pending:
+        path = pending.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+        with open(path, 'r') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                pending.append(os.path.join(folder, name.split('.')[0] + '.py'))
+    return sorted(found)
+
+
+def pose_pipeline(config_path=DEFAULT_CONFIG_PATH, incremental=False):
+    """Stages from the collected images to the model in the frontend"""
+    config = load_config(config_path)
+    data = config['data']
+    model_dir = config['export']['tfjs_dir']
+
+    return [
+        Stage('preprocess', preprocess,
+              inputs=module_inputs('proprocessing.py', 'live_keypoints.py') + [
+                  config_path, 'yoga_poses', os.path.join('csv_per_pose', 'live')],
+              outputs=[data['train_csv'], data['test_csv']]),
+        Stage('train', lambda: train(config_path, incremental),
+              inputs=module_inputs('pose_training.py') + [
+                  config_path, data['train_csv'], data['test_csv']],
+              outputs=[config['training']['checkpoint'],
+                       os.path.join(model_dir, 'model.json'),
+                       os.path.join(model_dir, config['export']['classes_file'])],
+              deps=['preprocess'],
+              params={'config': config_path, 'incremental': incremental}),
+        # Before enable, so a frontend page it cannot update does not keep
+        # the new model out of the frontend
+        Stage('copy_model', lambda: copy_model_files(model_dir),
+              inputs=[model_dir],
+              outputs=[os.path.join(FRONTEND_PUBLIC, 'model.json'),
+                       os.path.join(FRONTEND_PUBLIC, 'group1-shard1of1.bin')],
+              deps=['train'],
+              params={'model_dir': model_dir}),
+        Stage('enable', enable_poses,
+              inputs=module_inputs('enable_manual_poses.py') + [
+                  os.path.join(model_dir, config['export']['classes_file'])],
+              outputs=FRONTEND_PAGES,
+              deps=['train']),
+    ]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the pose pipeline stages')
+    parser.add_argument('targets', nargs='*',
+                        help='stages to bring up to date (default: all)')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--incremental', action='store_true',
+                        help='warm start training from the last checkpoint')
+    parser.add_argument('--force', action='store_true',
+                        help='run the stages even if they are up to date')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    runner = StageRunner(pose_pipeline(args.config, args.incremental),
+                         config['cache_dir'], force=args.force)
+    report = runner.run(args.targets or None)
+    print_report(report)
+    return 0 if succeeded(report) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
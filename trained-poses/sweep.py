@@ -0,0 +1,194 @@
+"""
+Parallel hyperparameter sweep for the pose classifier
+
+Usage:
+    python sweep.py [--config training_config.json] [--workers 4]
+                    [--threads-per-worker 1] [--output sweep_results.csv]
+
+Every combination of the values in the "sweep" section of the config is
+trained in its own worker process. The embeddings are computed once through
+the cached pipeline stages and shared with the workers through shared memory,
+each worker is pinned to a small number of TensorFlow threads. The leaderboard
+ranks the configurations by test accuracy, parameter count and latency.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from pose_config import DEFAULT_CONFIG_PATH, load_config
+from shared_arrays import init_worker, release, share_arrays, shared
+
+DEFAULT_SWEEP = {
+    'hidden_units': [[128, 64], [64, 32], [32]],
+    'dropout': [0.5, 0.3],
+    'activation': ['relu6'],
+    'batch_size': [16],
+}
+
+MODEL_PARAMS = ('hidden_units', 'dropout', 'activation')
+TRAINING_PARAMS = ('epochs', 'batch_size', 'patience')
+
+
+def expand_grid(sweep):
+    """Every combination of the sweep values as a list of dicts"""
+    keys = sorted(sweep)
+    return [dict(zip(keys, values))
+            for values in itertools.product(*(sweep[key] for key in keys))]
+
+
+def measure_latency(model, sample, repeats=200):
+    """Median and p95 milliseconds of a single frame forward pass"""
+    model(sample, training=False)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model(sample, training=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 95))
+
+
+def train_trial(trial_id, params, num_classes, training):
+    """Trains one configuration on the shared arrays, returns its metrics"""
+    from tensorflow import keras
+    from pose_training import build_model
+
+    training = dict(training)
+    training.update({k: v for k, v in params.items() if k in TRAINING_PARAMS})
+    model_params = {k: v for k, v in params.items() if k in MODEL_PARAMS}
+
+    y_train = keras.utils.to_categorical(shared['y_train'], num_classes)
+    y_val = keras.utils.to_categorical(shared['y_val'], num_classes)
+    y_test = keras.utils.to_categorical(shared['y_test'], num_classes)
+
+    model = build_model(num_classes, **model_params)
+    earlystopping = keras.callbacks.EarlyStopping(monitor='val_accuracy',
+                                                  patience=training['patience'],
+                                                  restore_best_weights=True)
+    start = time.perf_counter()
+    history = model.fit(shared['X_train'], y_train,
+                        epochs=training['epochs'],
+                        batch_size=training['batch_size'],
+                        validation_data=(shared['X_val'], y_val),
+                        callbacks=[earlystopping],
+                        verbose=0)
+    train_seconds = time.perf_counter() - start
+
+    _, test_accuracy = model.evaluate(shared['X_test'], y_test, verbose=0)
+    latency_p50, latency_p95 = measure_latency(model, shared['X_test'][:1])
+
+    return {
+        'trial': trial_id,
+        **{k: str(v) for k, v in params.items()},
+        'val_accuracy': float(max(history.history['val_accuracy'])),
+        'test_accuracy': float(test_accuracy),
+        'params': int(model.count_params()),
+        'latency_p50_ms': latency_p50,
+        'latency_p95_ms': latency_p95,
+        'epochs_run': len(history.history['val_accuracy']),
+        'train_seconds': train_seconds,
+    }
+
+
+def leaderboard(results):
+    """Ranks by test accuracy, then size and latency, flags the Pareto front"""
+    board = pd.DataFrame(results)
+    if board.empty:
+        return board
+    board = board.sort_values(['test_accuracy', 'params', 'latency_p50_ms'],
+                              ascending=[False, True, True])
+
+    # A trial is on the front when no other trial is at least as accurate
+    # while also being smaller and faster.
+    pareto = []
+    for _, row in board.iterrows():
+        dominated = ((board['test_accuracy'] >= row['test_accuracy']) &
+                     (board['params'] <= row['params']) &
+                     (board['latency_p50_ms'] <= row['latency_p50_ms']) &
+                     (board['trial'] != row['trial']) &
+                     ((board['test_accuracy'] > row['test_accuracy']) |
+                      (board['params'] < row['params']) |
+                      (board['latency_p50_ms'] < row['latency_p50_ms'])))
+        pareto.append(not dominated.any())
+    board['pareto'] = pareto
+    return board.reset_index(drop=True)
+
+
+def run_sweep(config, workers=None, threads_per_worker=1):
+    """Trains every sweep configuration in parallel, returns the leaderboard"""
+    from sklearn.model_selection import train_test_split
+    from pose_training import TrainingPipeline, load_embedded
+
+    pipeline = TrainingPipeline(config)
+    load_key, load_path = pipeline.load()
+    _, embed_path = pipeline.embed(load_key, load_path)
+
+    X, y, X_test, y_test = load_embedded(embed_path)
+    X_train, X_val, y_train, y_val = train_test_split(
+        X, y, test_size=config['data']['validation_split'],
+        random_state=config['data']['seed'])
+
+    trials = expand_grid(config.get('sweep') or DEFAULT_SWEEP)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    workers = min(workers, len(trials))
+    print(f"Sweeping {len(trials)} configurations on {workers} workers "
+          f"x {threads_per_worker} threads")
+
+    blocks, specs = share_arrays({
+        'X_train': X_train, 'y_train': y_train,
+        'X_val': X_val, 'y_val': y_val,
+        'X_test': X_test, 'y_test': y_test,
+    })
+    results = []
+    try:
+        # spawn so that workers do not inherit an initialised TF runtime
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker,
+                                 initargs=(threads_per_worker, specs)) as executor:
+            futures = [executor.submit(train_trial, i, params,
+                                       len(pipeline.registry), config['training'])
+                       for i, params in enumerate(trials)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"  [{len(results)}/{len(trials)}] trial {result['trial']}: "
+                      f"accuracy {result['test_accuracy']:.4f}, "
+                      f"{result['params']} params, "
+                      f"{result['latency_p50_ms']:.3f} ms")
+    finally:
+        release(blocks)
+
+    return leaderboard(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for the pose classifier')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH,
+                        help='training config file with an optional "sweep" section')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: cores / threads per worker)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='TensorFlow threads per worker')
+    parser.add_argument('--output', default='sweep_results.csv',
+                        help='where to write the leaderboard')
+    args = parser.parse_args(argv)
+
+    board = run_sweep(load_config(args.config), args.workers,
+                      args.threads_per_worker)
+    board.to_csv(args.output, index=False)
+
+    print('-----------------LEADERBOARD----------------')
+    print(board.to_string(index=False))
+    print('leaderboard saved at ', args.output)
+
+
+if __name__ == '__main__':
+    main()
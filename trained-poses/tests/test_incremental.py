@@ -0,0 +1,46 @@
+"""
+Incremental training warm starts from the checkpoint of the last run, which
+also carries that run's trainable flags.
+"""
+
+import os
+
+import numpy as np
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def warm_start(config, checkpoint_path, head_only, X, y):
+    """One incremental run: warm start, one epoch, save the checkpoint"""
+    from tensorflow import keras
+    from pose_training import TrainingPipeline
+
+    config['training']['incremental']['head_only'] = head_only
+    pipeline = TrainingPipeline(config, incremental=True)
+    model, X_train, y_train = pipeline._warm_start(checkpoint_path, X, y)
+    model.fit(X_train, keras.utils.to_categorical(y_train, len(pipeline.registry)),
+              epochs=1, verbose=0)
+    model.save(checkpoint_path)
+    return model
+
+
+def test_full_run_after_head_only_trains_every_layer(tmp_path):
+    from pose_config import load_config
+    from pose_training import build_model
+
+    config = load_config(os.path.join(PACKAGE_DIR, 'training_config.json'))
+    config['cache_dir'] = str(tmp_path / 'cache')
+    num_classes = len(config['classes'])
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(num_classes * 4, 34)).astype(np.float32)
+    y = np.repeat(np.arange(num_classes), 4)
+
+    checkpoint_path = str(tmp_path / 'weights.best.hdf5')
+    model = build_model(num_classes, hidden_units=(16, 8))
+    model.save(checkpoint_path)
+
+    head_only = warm_start(config, checkpoint_path, True, X, y)
+    assert len(head_only.trainable_weights) == 2
+
+    full = warm_start(config, checkpoint_path, False, X, y)
+    assert len(full.trainable_weights) == len(full.weights) == 6
@@ -0,0 +1,51 @@
+"""
+numpy_classifier must match pose_training, so the TF-free runtime and the
+exported models classify the same keypoints the same way.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_CSV = os.path.join(PACKAGE_DIR, 'test_data.csv')
+ATOL = 1e-5
+
+
+@pytest.fixture(scope='module')
+def keypoints():
+    """The first rows of test_data.csv as [n, 51] float32"""
+    if not os.path.exists(TEST_CSV):
+        pytest.skip('test_data.csv is missing')
+    from pose_config import ClassRegistry, load_config
+    from pose_training import load_csv
+
+    registry = ClassRegistry.from_config(
+        load_config(os.path.join(PACKAGE_DIR, 'training_config.json')))
+    X, _, _ = load_csv(TEST_CSV, registry)
+    return X.to_numpy(dtype=np.float32)[:64]
+
+
+def test_embedding_matches_training(keypoints):
+    import numpy_classifier
+    import pose_training
+
+    expected = pose_training.preprocess_data(keypoints)
+    actual = numpy_classifier.landmarks_to_embedding(keypoints)
+    np.testing.assert_allclose(actual, expected, atol=ATOL)
+
+
+def test_classifier_matches_keras(keypoints, tmp_path):
+    from export_numpy import export_npz
+    from numpy_classifier import NumpyClassifier
+    from pose_config import ClassRegistry
+    from pose_training import build_model, preprocess_data
+
+    registry = ClassRegistry(['a', 'b', 'c', 'd'])
+    model = build_model(len(registry), hidden_units=(16, 8))
+    path = export_npz(model, str(tmp_path / 'classifier.npz'), registry)
+
+    expected = model.predict(preprocess_data(keypoints), verbose=0)
+    actual = NumpyClassifier.load(path).predict_keypoints(keypoints)
+    np.testing.assert_allclose(actual, expected, atol=ATOL)
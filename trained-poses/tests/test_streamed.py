@@ -0,0 +1,70 @@
+"""
+The streamed training stages (data.memory_limit_mb) read their rows from
+.npy files on demand and must return what loading the files whole would,
+without the process growing with the dataset.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+# Allowed peak RSS growth of a stage between 2k and 200k rows. Everything
+# that scales with the rows amounts to ~1 MB at 200k, the rest is allocator
+# and TensorFlow noise.
+MAX_GROWTH_MB = 16
+
+
+@pytest.fixture
+def npy_file(tmp_path):
+    array = np.arange(40 * 3, dtype=np.float32).reshape(40, 3)
+    path = tmp_path / 'X.npy'
+    np.save(path, array)
+    return str(path), array
+
+
+@pytest.mark.parametrize('indices', [
+    [5, 6, 7, 8],
+    [9, 2, 3, 4, 30, 31, 0],
+    [7, 7, 1, 7],
+    [39, 0],
+    [],
+])
+def test_take_matches_fancy_indexing(npy_file, indices):
+    from pose_training import NpyRows
+
+    path, array = npy_file
+    with NpyRows(path) as rows:
+        np.testing.assert_array_equal(rows.take(indices), array[indices])
+
+
+def test_take_one_dimensional(tmp_path):
+    from pose_training import NpyRows
+
+    labels = np.arange(10, dtype=np.int64) * 3
+    np.save(tmp_path / 'y.npy', labels)
+    with NpyRows(str(tmp_path / 'y.npy')) as rows:
+        np.testing.assert_array_equal(rows.take([4, 1, 2]), labels[[4, 1, 2]])
+
+
+def test_closed_after_with(npy_file):
+    from pose_training import NpyRows
+
+    with NpyRows(npy_file[0]) as rows:
+        pass
+    with pytest.raises(ValueError):
+        rows.take([0])
+
+
+def test_memory_stays_flat(tmp_path):
+    """Peak RSS of every streamed stage barely moves from 1x to 100x the rows"""
+    from bench_training import check_growth, measure_size
+    from pose_config import load_config
+
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = load_config(os.path.join(package_dir, 'training_config.json'))
+    config['data']['train_csv'] = os.path.join(package_dir, 'train_data.csv')
+    config['data']['memory_limit_mb'] = 8
+    results = {str(rows): measure_size(str(tmp_path), rows, config, batch_size=256)
+               for rows in (2000, 200000)}
+    assert check_growth(results, MAX_GROWTH_MB) == [], results
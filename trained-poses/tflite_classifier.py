@@ -0,0 +1,72 @@
+"""Runs the TFLite pose classifier on the same interpreter stack as Movenet."""
+
+import os
+
+import numpy as np
+
+from data import Category
+from movenet import Interpreter
+from numpy_classifier import landmarks_to_embedding, person_to_keypoints
+from pose_config import ClassRegistry
+
+
+class TFLiteClassifier(object):
+    """A wrapper class for the TFLite pose classifier written by export_tflite.py"""
+
+    def __init__(self, model_path, classes_path=None, num_threads=1):
+        """Initialize the classifier.
+
+        Args:
+          model_path: Path of the .tflite classifier.
+          classes_path: Class registry JSON, defaults to classes.json next to
+            the model.
+          num_threads: Interpreter threads, one is plenty for dense layers.
+        """
+        if classes_path is None:
+            classes_path = os.path.join(os.path.dirname(model_path), 'classes.json')
+        self.class_names = ClassRegistry.load(classes_path).names
+
+        interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        interpreter.allocate_tensors()
+        input_details = interpreter.get_input_details()[0]
+
+        self._input_index = input_details['index']
+        self._output_index = interpreter.get_output_details()[0]['index']
+        # Fused models take [n, 17, 3] keypoints, plain ones [n, 34] embeddings
+        self._fused = len(input_details['shape']) == 3
+        self._batch_size = input_details['shape'][0]
+        self._interpreter = interpreter
+
+    def predict_keypoints(self, keypoints):
+        """Class probabilities [n, classes] for one or more [17, 3] keypoint rows"""
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        if self._fused:
+            inputs = keypoints.reshape(-1, 17, 3)
+        else:
+            inputs = landmarks_to_embedding(keypoints)
+
+        if inputs.shape[0] != self._batch_size:
+            self._interpreter.resize_tensor_input(self._input_index, inputs.shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = inputs.shape[0]
+
+        self._interpreter.set_tensor(self._input_index, inputs)
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output_index).copy()
+
+    def classify(self, keypoints):
+        """Most likely Category for each pose in keypoints"""
+        probabilities = self.predict_keypoints(keypoints)
+        best = probabilities.argmax(axis=1)
+        return [Category(self.class_names[i], float(probabilities[row, i]))
+                for row, i in enumerate(best)]
+
+    def classify_person(self, person):
+        """Most likely Category for a Person detected by Movenet"""
+        return self.classify(person_to_keypoints(person))[0]
+
+
+def detect_and_classify(movenet, classifier, image, reset_crop_region=False):
+    """Runs Movenet on an RGB image and classifies the detected pose"""
+    person = movenet.detect(image, reset_crop_region=reset_crop_region)
+    return person, classifier.classify_person(person)